@@ -2,6 +2,17 @@
 from .dataset import M
 from .utils import *
 from . import helpers
+from . import cache
+from . import compression
+from . import sidecar
+from . import side_tables
+from . import catalog
+from . import workers
+from . import manifest
+from . import checkpoint
+from . import jobqueue
+from . import streaming
+from .store import SensorStore
 from .accelerometer.calibrator import Calibrator
 from .accelerometer.static_finder import StaticFinder
 from . import numeric_transformation
\ No newline at end of file
@@ -70,13 +70,10 @@ class Calibrator():
 		self._calibration_chunks = calibration_chunks
 		return self
 
-	def run(self):
-		df = self._data
+	def fit(self):
+		"""Fit the calibration to the static chunks, returns the fitted `Calibraxis` or None if there are no static chunks or the calibration fails"""
 		if len(self._calibration_chunks) == 0:
-			calibrated_df = df.copy(deep=True)
-			self._calibrated_data = calibrated_df
-			return self
-
+			return None
 		# get mean values of each calibration chunks
 		if 'date' in self._calibration_chunks.columns:
 			calibration_points = self._calibration_chunks.groupby(['WINDOW_ID', 'COUNT', 'date', 'hour']).mean()
@@ -90,6 +87,18 @@ class Calibrator():
 		if(calibrator.scale_factor_matrix is None):
 			logger.warn("Calibration fails, provided calibration points cannot converge")
 			logger.warn("Skip calibration and use original data")
+			return None
+		return calibrator
+
+	def run(self):
+		df = self._data
+		if len(self._calibration_chunks) == 0:
+			calibrated_df = df.copy(deep=True)
+			self._calibrated_data = calibrated_df
+			return self
+
+		calibrator = self.fit()
+		if calibrator is None:
 			self._calibrated_data = df
 			return self
 
@@ -116,4 +125,14 @@ class Calibrator():
 			orientation_diff = np.abs(orientation - current_orientation)
 			if(np.all(orientation_diff < self._angle_diff)):
 				return False
-		return True
\ No newline at end of file
+		return True
+
+def calibrate_values(values, calibrator, chunk_rows=65536):
+	"""Apply a fitted `Calibraxis` to an [N x 3] float array in place, rows are transformed in chunks so only a chunk is allocated"""
+	scale_t = np.asarray(calibrator.scale_factor_matrix, dtype=np.float64).T
+	bias = np.asarray(calibrator.bias_vector, dtype=np.float64)
+	for start in range(0, values.shape[0], chunk_rows):
+		chunk = values[start:start + chunk_rows]
+		chunk -= bias
+		chunk[:] = chunk.dot(scale_t)
+	return values
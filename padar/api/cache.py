@@ -0,0 +1,122 @@
+"""
+
+In-process cache of decoded data files
+
+Each process (a pool worker or the main process) keeps one least recently used cache of decoded dataframes keyed by the file path, its size and modification time, so adjacent hourly files loaded as previous/current/next file are only decoded once. Cached dataframes are shared between callers and must be treated as read-only.
+
+"""
+
+import os
+from collections import OrderedDict
+from .helpers import importer
+from .prefetch import Prefetcher
+
+class FrameCache:
+	def __init__(self, max_bytes=0):
+		self.max_bytes = max_bytes
+		self.hits = 0
+		self.misses = 0
+		self.nbytes = 0
+		self._frames = OrderedDict()
+
+	def resize(self, max_bytes):
+		self.max_bytes = max_bytes
+		self._evict()
+
+	def get(self, filepath, loader, variant='full'):
+		"""Return the cached dataframe of `filepath`, load it with `loader(filepath)` when it is not in the cache"""
+		key = _cache_key(filepath, variant)
+		if key in self._frames:
+			self.hits = self.hits + 1
+			self._frames.move_to_end(key)
+			return self._frames[key][0]
+		self.misses = self.misses + 1
+		df = loader(filepath)
+		self.put(key, df)
+		return df
+
+	def peek(self, filepath, variant='full'):
+		"""Return the cached dataframe of `filepath` or None, it does not count as a hit or miss"""
+		key = _cache_key(filepath, variant)
+		if key in self._frames:
+			self._frames.move_to_end(key)
+			return self._frames[key][0]
+		return None
+
+	def put(self, key, df):
+		if self.max_bytes <= 0:
+			return
+		nbytes = int(df.memory_usage(index=True, deep=True).sum())
+		if nbytes > self.max_bytes:
+			return
+		if key in self._frames:
+			self.nbytes = self.nbytes - self._frames.pop(key)[1]
+		self._frames[key] = (df, nbytes)
+		self.nbytes = self.nbytes + nbytes
+		self._evict()
+
+	def clear(self):
+		self._frames.clear()
+		self.nbytes = 0
+
+	def stats(self):
+		return dict(hits=self.hits, misses=self.misses, nbytes=self.nbytes, entries=len(self._frames))
+
+	def _evict(self):
+		while self.nbytes > max(self.max_bytes, 0) and len(self._frames) > 0:
+			_, (_, nbytes) = self._frames.popitem(last=False)
+			self.nbytes = self.nbytes - nbytes
+
+def _cache_key(filepath, variant):
+	filepath = os.path.normpath(os.path.abspath(filepath))
+	stat = os.stat(filepath)
+	return (filepath, stat.st_size, stat.st_mtime, variant)
+
+# the cache is disabled until a byte budget is set with `configure_frame_cache`
+_frame_cache = FrameCache(max_bytes=0)
+
+def frame_cache():
+	return _frame_cache
+
+def configure_frame_cache(max_bytes):
+	_frame_cache.resize(max_bytes)
+	return _frame_cache
+
+# sensor files are read ahead once a depth is set with `configure_prefetcher`
+_prefetcher = Prefetcher(importer.import_sensor_file_mhealth, depth=0)
+
+def prefetcher():
+	return _prefetcher
+
+def configure_prefetcher(depth, max_bytes):
+	_prefetcher.configure(depth, max_bytes)
+	return _prefetcher
+
+def load_sensor_file(filepath, context=None, side=None):
+	"""Load a sensor file through the frame cache
+
+	context: length in seconds to be loaded from the start (`side='head'`) or the end (`side='tail'`) of the file. If the whole file is already cached or prefetched, the boundary is sliced from it instead of reading the file again.
+	"""
+	if context is None or side is None:
+		return _frame_cache.get(filepath, _load_full_sensor_file)
+	full = _frame_cache.peek(filepath)
+	if full is None and _prefetcher.depth > 0:
+		full = _prefetcher.peek(filepath)
+	if full is not None:
+		_frame_cache.hits = _frame_cache.hits + 1
+		return importer._slice_boundary(full, importer._seconds_to_timedelta(context), side)
+	if side == 'head':
+		loader = lambda f: importer.import_sensor_file_mhealth_head(f, context)
+	else:
+		loader = lambda f: importer.import_sensor_file_mhealth_tail(f, context)
+	return _frame_cache.get(filepath, loader, variant=side + str(context))
+
+def _load_full_sensor_file(filepath):
+	if _prefetcher.depth > 0:
+		df = _prefetcher.take(filepath)
+		if df is not None:
+			return df
+	return importer.import_sensor_file_mhealth(filepath)
+
+def load_annotation_file(filepath, loader):
+	return _frame_cache.get(filepath, loader)
@@ -0,0 +1,204 @@
+"""
+
+Catalog of the files of a dataset
+
+The root folder is scanned once with `os.scandir` and every mhealth filename is parsed with one compiled pattern into a table with one row per file (path, pid, sid, sensortype, datatype, file_type, date and hour). The catalog can be saved in a catalog folder outside of the dataset (one file per root folder) together with the modification time of every folder. When it is loaded again, only folders whose modification time changed are scanned again. Hidden files and folders are not included.
+
+"""
+
+import os
+import re
+import pickle
+import hashlib
+import pandas as pd
+from . import utils
+
+CATALOG_VERSION = 1
+CATALOG_COLUMNS = ['path', 'pid', 'sid', 'sensortype', 'datatype', 'file_type', 'date', 'hour']
+
+_MHEALTH_FILENAME = re.compile(
+	'^(?P<sensortype>[^.\\-]+)(?:-(?P<datatype>[^.\\-]+))?[^.]*'
+	'\\.(?P<sid>[^.\\-]+)[^.]*'
+	'\\.(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})-(?P<hour>[0-9]{2})[^.]*'
+	'\\.(?P<file_type>[^.]+)'
+	'\\.[^.]+(?:\\.(?:gz|bz2|xz|zst))?$')
+
+class Catalog:
+	def __init__(self, root, folders=None, path=None):
+		self.root = os.path.normpath(os.path.abspath(root))
+		# file the catalog is saved to, None to keep it in memory only
+		self.path = path
+		# relative folder path -> (modification time, subfolder names, rows of its files)
+		self._folders = folders if folders is not None else {}
+		self._table = None
+
+	@classmethod
+	def load(cls, root, catalog_dir=None, refresh=False):
+		"""Scan `root`, if `catalog_dir` is provided, the catalog saved there is loaded first so that only the folders changed since it was saved are scanned, and the updated catalog is saved again"""
+		catalog = cls(root, path=catalog_path(catalog_dir, root) if catalog_dir is not None else None)
+		path = catalog.path
+		if not refresh and path is not None and os.path.exists(path):
+			try:
+				with open(path, 'rb') as f:
+					saved = pickle.load(f)
+				if saved.get('version') == CATALOG_VERSION and saved.get('root') == catalog.root:
+					catalog._folders = saved['folders']
+			except (OSError, ValueError, EOFError, pickle.UnpicklingError, KeyError, AttributeError):
+				pass
+		if catalog.update():
+			catalog.save()
+		return catalog
+
+	def update(self):
+		"""Scan the folders that are new or changed, returns True if anything changed"""
+		folders = {}
+		changed = self._update_folder('', folders)
+		changed = changed or len(folders) != len(self._folders)
+		self._folders = folders
+		if changed:
+			self._table = None
+		return changed
+
+	def _update_folder(self, rel_path, folders):
+		abs_path = os.path.join(self.root, rel_path) if rel_path != '' else self.root
+		try:
+			mtime = os.stat(abs_path).st_mtime_ns
+		except OSError:
+			return True
+		saved = self._folders.get(rel_path)
+		changed = False
+		if saved is not None and saved[0] == mtime:
+			subfolders, rows = saved[1], saved[2]
+		else:
+			subfolders, rows = self._scan_folder(abs_path)
+			changed = True
+		folders[rel_path] = (mtime, subfolders, rows)
+		for name in subfolders:
+			changed = self._update_folder(os.path.join(rel_path, name), folders) or changed
+		return changed
+
+	def _scan_folder(self, abs_path):
+		subfolders = []
+		rows = []
+		# pid is the same for all files of a folder
+		pid = None
+		for entry in os.scandir(abs_path):
+			if entry.name.startswith('.'):
+				continue
+			if entry.is_dir():
+				subfolders.append(entry.name)
+			elif entry.is_file():
+				if pid is None:
+					pid = utils.extract_pid(entry.path)
+				rows.append(_parse_filename(os.path.normpath(entry.path), entry.name, pid))
+		return sorted(subfolders), rows
+
+	def save(self):
+		if self.path is None:
+			return
+		path = self.path
+		tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			with open(tmp_path, 'wb') as f:
+				pickle.dump({'version': CATALOG_VERSION, 'root': self.root, 'folders': self._folders}, f, protocol=pickle.HIGHEST_PROTOCOL)
+			os.replace(tmp_path, path)
+		except OSError:
+			# the catalog folder could be read only, the catalog is still usable in memory
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+
+	@property
+	def table(self):
+		if self._table is None:
+			rows = [row for _, _, folder_rows in self._folders.values() for row in folder_rows]
+			self._table = pd.DataFrame.from_records(rows, columns=CATALOG_COLUMNS)
+		return self._table
+
+	def subfolders(self, rel_path=''):
+		saved = self._folders.get(rel_path)
+		return [] if saved is None else list(saved[1])
+
+	def query(self, pattern):
+		"""Rows of the files matching a glob pattern (`**` matches any number of folders like `glob.glob(pattern, recursive=True)`)"""
+		pattern = os.path.normpath(os.path.abspath(pattern))
+		table = self.table
+		mask = table['path'].str.match(glob_to_regex(pattern)).values.astype(bool)
+		return table.loc[mask, :]
+
+	def contains(self, pattern):
+		"""Whether all files matching a glob pattern are inside the root folder of the catalog"""
+		pattern = os.path.normpath(os.path.abspath(pattern))
+		return pattern.startswith(self.root + os.sep)
+
+def catalog_path(catalog_dir, root):
+	"""The file in `catalog_dir` where the catalog of `root` is saved"""
+	root = os.path.normpath(os.path.abspath(root))
+	key = hashlib.sha1(root.encode('utf-8')).hexdigest()[:16]
+	return os.path.join(os.path.abspath(catalog_dir), os.path.basename(root) + '-' + key + '.catalog.pkl')
+
+def parse_files(paths):
+	"""Catalog rows of a list of files"""
+	rows = []
+	for path in paths:
+		path = os.path.normpath(os.path.abspath(path))
+		rows.append(_parse_filename(path, os.path.basename(path), utils.extract_pid(path)))
+	return pd.DataFrame.from_records(rows, columns=CATALOG_COLUMNS)
+
+def _parse_filename(path, filename, pid):
+	match = _MHEALTH_FILENAME.match(filename)
+	if match is None:
+		return (path, pid, None, None, None, None, None, None)
+	return (
+		path,
+		pid,
+		match.group('sid').upper().strip(),
+		match.group('sensortype'),
+		match.group('datatype') if match.group('datatype') is not None else "",
+		match.group('file_type').lower().strip(),
+		match.group('date'),
+		match.group('hour')
+	)
+
+def glob_to_regex(pattern):
+	"""Translate a glob pattern into a regular expression that matches whole paths"""
+	sep = re.escape(os.sep)
+	not_sep = '[^' + sep + ']'
+	parts = pattern.split(os.sep)
+	regex = ''
+	for i, part in enumerate(parts):
+		last = i == len(parts) - 1
+		if part == '**':
+			# zero or more folders, or anything when it is the last part
+			regex = regex + ('.*' if last else '(?:' + not_sep + '*' + sep + ')*')
+			continue
+		regex = regex + _translate_part(part, not_sep) + ('' if last else sep)
+	return '^' + regex + '$'
+
+def _translate_part(part, not_sep):
+	regex = ''
+	i = 0
+	while i < len(part):
+		c = part[i]
+		if c == '*':
+			regex = regex + not_sep + '*'
+		elif c == '?':
+			regex = regex + not_sep
+		elif c == '[':
+			# like fnmatch, a `]` right after `[` or `[!` is part of the set
+			start = i + 2 if part[i + 1:i + 2] == '!' else i + 1
+			j = part.find(']', start + 1)
+			if j < 0:
+				regex = regex + '\\['
+			else:
+				chars = part[i + 1:j].replace('\\', '\\\\')
+				if chars.startswith('!'):
+					chars = '^' + chars[1:]
+				elif chars.startswith('^') or chars.startswith('['):
+					chars = '\\' + chars
+				regex = regex + '[' + chars + ']'
+				i = j
+		else:
+			regex = regex + re.escape(c)
+		i = i + 1
+	return regex
@@ -0,0 +1,72 @@
+"""
+
+Checkpoints of `M.process` runs
+
+A checkpointed run keeps a folder `.padar-runs/<run id>` in the root folder of the dataset. `run.json` holds the sorted files of the run with their adjacent files, the script and a hash of its arguments, and the result of every finished file is spilled to the folder as soon as it is ready. A run that was interrupted is resumed with its run id, only the files without a result are processed again and the results are merged as if the run was never interrupted. The folder is removed when the run finishes.
+
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+from . import collector
+
+RUNS_FOLDER = '.padar-runs'
+RUN_FILENAME = 'run.json'
+CHECKPOINT_VERSION = 1
+
+def new_run_id():
+	return time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+
+def run_path(root, run_id):
+	return os.path.join(os.path.abspath(root), RUNS_FOLDER, run_id)
+
+def create(root, run_id, state):
+	"""Create the folder of a run, `state` is saved as `run.json`"""
+	run_dir = run_path(root, run_id)
+	os.makedirs(run_dir, exist_ok=False)
+	state = dict(state, version=CHECKPOINT_VERSION, run_id=run_id)
+	tmp_path = os.path.join(run_dir, RUN_FILENAME + '.tmp')
+	with open(tmp_path, 'w') as f:
+		json.dump(state, f)
+	os.replace(tmp_path, os.path.join(run_dir, RUN_FILENAME))
+	return run_dir
+
+def load(root, run_id):
+	"""Load the state of a run, raises ValueError if the run can not be resumed"""
+	run_dir = run_path(root, run_id)
+	try:
+		with open(os.path.join(run_dir, RUN_FILENAME), 'r') as f:
+			state = json.load(f)
+	except (OSError, ValueError):
+		raise ValueError('Run ' + str(run_id) + ' is not found in ' + os.path.join(os.path.abspath(root), RUNS_FOLDER))
+	if state.get('version') != CHECKPOINT_VERSION:
+		raise ValueError('Run ' + str(run_id) + ' was saved by an incompatible version of padar')
+	return run_dir, state
+
+def result_path(run_dir, entry_index):
+	return os.path.join(run_dir, '%06d.pkl' % entry_index)
+
+def save_result(run_dir, entry_index, result, sort=True):
+	"""Spill the result of a file, returns (path, columns)"""
+	path = result_path(run_dir, entry_index)
+	return path, collector.spill(result, path, sort=sort)
+
+def completed(run_dir):
+	"""Spilled results of a run by the index of their file"""
+	results = {}
+	for name in os.listdir(run_dir):
+		if name.endswith('.pkl'):
+			path = os.path.join(run_dir, name)
+			results[int(name[:-4])] = (path, collector.spill_columns(path))
+	return results
+
+def remove(run_dir):
+	shutil.rmtree(run_dir, ignore_errors=True)
+	try:
+		os.rmdir(os.path.dirname(run_dir))
+	except OSError:
+		# other runs are still kept
+		pass
@@ -0,0 +1,132 @@
+"""
+
+Streaming collection of the results of `M.process`
+
+The result of each file is sorted by its first column and spilled to a run folder as a sequence of pickled chunks, so neither the workers nor the main process keep more than one result in memory. When all files are processed, the spilled results are merged into the output file with a k-way merge on the first column, one batch at a time. Large numbers of spills are merged in passes, so the number of open files is bounded.
+
+"""
+
+import os
+import pickle
+import uuid
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from .helpers import exporter
+
+# spills read at once by `merge`, each holds a file descriptor and a chunk
+MAX_OPEN_SPILLS = 64
+
+def spill(df, path, chunk_rows=10000, sort=True):
+	"""Save a result as pickled chunks sorted by its first column, returns the columns of the result
+
+	The file only appears at `path` when it is complete. If `sort` is False, the rows are kept in their order.
+	"""
+	if df is None or df.shape[1] == 0:
+		df = pd.DataFrame()
+	elif sort and _is_time_column(df) and not df.iloc[:, 0].is_monotonic_increasing:
+		df = df.sort_values(by=df.columns[0], kind='mergesort')
+	# results of the same file can be spilled by two workers at once, see `jobqueue`
+	tmp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+	with open(tmp_path, 'wb') as f:
+		pickle.dump({'columns': list(df.columns)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+		# a result without rows keeps its columns and dtypes
+		for start in range(0, max(df.shape[0], 1 if df.shape[1] > 0 else 0), chunk_rows):
+			pickle.dump(df.iloc[start:start + chunk_rows], f, protocol=pickle.HIGHEST_PROTOCOL)
+	os.replace(tmp_path, path)
+	return list(df.columns)
+
+def spill_columns(path):
+	with open(path, 'rb') as f:
+		return pickle.load(f)['columns']
+
+def iter_spill(path):
+	with open(path, 'rb') as f:
+		pickle.load(f)
+		while True:
+			try:
+				yield pickle.load(f)
+			except EOFError:
+				return
+
+def load(path):
+	"""Load a spilled result as one dataframe"""
+	chunks = list(iter_spill(path))
+	if len(chunks) == 0:
+		return pd.DataFrame()
+	return pd.concat(chunks, axis=0) if len(chunks) > 1 else chunks[0]
+
+def merge(paths, output, columns, float_format='%.9f', max_open=MAX_OPEN_SPILLS):
+	"""Merge spilled results into one csv file in the order of their first column, returns the number of written rows
+
+	Results without timestamps in the first column are written in the order of `paths`. Timestamps are written with millisecond precision. At most `max_open` spills are read at once, more spills are first merged in passes into intermediate spills in a temporary folder next to `output`.
+	"""
+	paths = list(paths)
+	max_open = max(2, int(max_open))
+	tmp_dir = None
+	try:
+		while len(paths) > max_open:
+			if tmp_dir is None:
+				tmp_dir = tempfile.mkdtemp(prefix='.padar-merge-', dir=os.path.dirname(os.path.abspath(output)))
+			merged = []
+			for start in range(0, len(paths), max_open):
+				group = paths[start:start + max_open]
+				if len(group) == 1:
+					merged.append(group[0])
+					continue
+				path = os.path.join(tmp_dir, uuid.uuid4().hex + '.pkl')
+				_spill_batches(_merge_batches(group, columns), path, columns)
+				merged.append(path)
+			# intermediate spills of the previous pass are not needed any more
+			for path in paths:
+				if os.path.dirname(path) == tmp_dir and path not in merged:
+					os.remove(path)
+			paths = merged
+		n_rows = 0
+		mode = 'w'
+		for batch in _merge_batches(paths, columns):
+			exporter.export_csv(batch, output, float_format=float_format, mode=mode, header=mode == 'w', datetime_unit='ms')
+			mode = 'a'
+			n_rows = n_rows + batch.shape[0]
+		if mode == 'w':
+			exporter.export_csv(pd.DataFrame(columns=columns), output, float_format=float_format)
+		return n_rows
+	finally:
+		if tmp_dir is not None:
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def _merge_batches(paths, columns):
+	# k-way merge of the spills, yields batches of rows in the order of the first column
+	runs = [(chunk for chunk in iter_spill(path) if chunk.shape[0] > 0) for path in paths]
+	heads = [next(run, None) for run in runs]
+	while True:
+		active = [i for i in range(len(heads)) if heads[i] is not None]
+		if len(active) == 0:
+			break
+		time_sorted = all([_is_time_column(heads[i]) for i in active])
+		if time_sorted:
+			# rows up to the smallest last timestamp of the current chunks are complete
+			bound = min([heads[i].iloc[:, 0].values[-1] for i in active])
+		else:
+			active = active[:1]
+		pieces = []
+		for i in active:
+			head = heads[i]
+			k = int(np.searchsorted(head.iloc[:, 0].values, bound, side='right')) if time_sorted else head.shape[0]
+			if k > 0:
+				pieces.append(head.iloc[:k])
+			heads[i] = head.iloc[k:] if k < head.shape[0] else next(runs[i], None)
+		batch = pd.concat(pieces, axis=0, ignore_index=True)
+		if time_sorted:
+			batch = batch.sort_values(by=batch.columns[0], kind='mergesort')
+		yield batch.reindex(columns=columns)
+
+def _spill_batches(batches, path, columns):
+	with open(path, 'wb') as f:
+		pickle.dump({'columns': list(columns)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+		for batch in batches:
+			pickle.dump(batch, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _is_time_column(df):
+	return df.shape[1] > 0 and isinstance(df.dtypes.iloc[0], np.dtype) and df.dtypes.iloc[0].kind == 'M'
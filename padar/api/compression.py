@@ -0,0 +1,133 @@
+"""
+
+Transparent reading and writing of compressed data files
+
+Files ending with `.gz`, `.bz2`, `.xz` or `.zst` are decompressed while being read. Decompression runs in a background thread that fills a bounded queue of blocks, so it overlaps with parsing in the reading thread. `.zst` files need the `zstandard` package.
+
+"""
+
+import os
+import io
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+
+COMPRESSION_EXTENSIONS = {
+	'.gz': 'gzip',
+	'.bz2': 'bz2',
+	'.xz': 'xz',
+	'.zst': 'zstd'
+}
+
+def extract_compression(filepath):
+	"""Return the compression name of a file by its extension or None if it is not compressed"""
+	return COMPRESSION_EXTENSIONS.get(os.path.splitext(filepath)[1].lower(), None)
+
+def strip_compression_extension(filepath):
+	if extract_compression(filepath) is None:
+		return filepath
+	return os.path.splitext(filepath)[0]
+
+def open_file(filepath, mode='r', threaded=True, block_size=1024 * 1024, queue_size=8):
+	"""Open a file for reading or writing, compressed files are (de)compressed transparently
+
+	For reading, decompression runs in a background thread when `threaded` is True. At most `queue_size` blocks of `block_size` decompressed bytes are kept in memory ahead of the reader.
+	"""
+	compression = extract_compression(filepath)
+	binary = 'b' in mode
+	if compression is None:
+		if binary:
+			return open(filepath, mode)
+		return open(filepath, mode, newline='' if 'w' in mode or 'a' in mode else None)
+	raw_mode = mode.replace('t', '').replace('b', '') + 'b'
+	if 'r' in raw_mode:
+		stream = _open_compressed(filepath, compression, raw_mode)
+		if threaded:
+			stream = io.BufferedReader(_ThreadedReader(stream, block_size=block_size, queue_size=queue_size), buffer_size=block_size)
+		if binary:
+			return stream
+		return io.TextIOWrapper(stream, encoding='utf-8')
+	else:
+		stream = _open_compressed(filepath, compression, raw_mode)
+		if binary:
+			return stream
+		return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+def _open_compressed(filepath, compression, mode):
+	if compression == 'gzip':
+		return gzip.open(filepath, mode)
+	elif compression == 'bz2':
+		return bz2.open(filepath, mode)
+	elif compression == 'xz':
+		return lzma.open(filepath, mode)
+	elif compression == 'zstd':
+		try:
+			import zstandard
+		except ImportError:
+			raise ImportError('zstandard package is required to read or write .zst files')
+		return zstandard.open(filepath, mode)
+	else:
+		raise ValueError('Unknown compression: ' + str(compression))
+
+class _ThreadedReader(io.RawIOBase):
+	"""Raw binary stream that reads its source in a background thread"""
+
+	def __init__(self, stream, block_size=1024 * 1024, queue_size=8):
+		io.RawIOBase.__init__(self)
+		self._stream = stream
+		self._block_size = block_size
+		self._queue = queue.Queue(maxsize=queue_size)
+		self._block = b''
+		self._pos = 0
+		self._eof = False
+		self._error = None
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target=self._fill, daemon=True)
+		self._thread.start()
+
+	def _fill(self):
+		try:
+			while not self._stopped.is_set():
+				block = self._stream.read(self._block_size)
+				self._put(block)
+				if not block:
+					break
+		except Exception as e:
+			self._error = e
+			self._put(b'')
+
+	def _put(self, block):
+		while not self._stopped.is_set():
+			try:
+				self._queue.put(block, timeout=0.1)
+				return
+			except queue.Full:
+				continue
+
+	def readable(self):
+		return True
+
+	def readinto(self, b):
+		if self._pos >= len(self._block):
+			if self._eof:
+				return 0
+			self._block = self._queue.get()
+			self._pos = 0
+			if self._error is not None:
+				raise self._error
+			if not self._block:
+				self._eof = True
+				return 0
+		n = min(len(b), len(self._block) - self._pos)
+		b[:n] = self._block[self._pos:self._pos + n]
+		self._pos = self._pos + n
+		return n
+
+	def close(self):
+		if not self.closed:
+			self._stopped.set()
+			self._thread.join()
+			self._stream.close()
+		io.RawIOBase.close(self)
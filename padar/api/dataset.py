@@ -1,13 +1,49 @@
 import os
 import glob
 import re
+import shutil
+import tempfile
+import time
+import uuid
 import pandas as pd
 import numpy as np
-from pathos.multiprocessing import ProcessingPool as Pool
 from multiprocessing import cpu_count
 from functools import partial
 from .utils import *
+from . import cache
+from . import sidecar
+from . import collector
+from . import workers
+from . import manifest
+from . import checkpoint as checkpoint_module
+from . import jobqueue
+from .catalog import Catalog, parse_files
+from .helpers import disk_cache
 from ..utility import logger
+from ..utility.package_helper import load_script
+
+# options of `M.process` and their defaults, the other keyword arguments of `process` are passed to the script
+_PROCESS_OPTIONS = dict(
+    violate=False,
+    cache_size=None,
+    schedule='file',
+    cache_dir=None,
+    cache_dir_size=10 * 1024 * 1024 * 1024,
+    block_duration=None,
+    block_overlap=0,
+    output=None,
+    columns=None,
+    float_format='%.9f',
+    chunksize=None,
+    shard_size=None,
+    incremental=False,
+    checkpoint=False,
+    resume=None,
+    prefetch=0,
+    prefetch_size=256 * 1024 * 1024,
+    by_stream=False,
+    stream_dir=None
+)
 
 class M:
     """[summary]
@@ -15,92 +51,617 @@ class M:
     [description]
     """
     
-    def __init__(self, root):
+    def __init__(self, root, initializer=None, initargs=(), chunksize=1, catalog_dir=None):
+        """
+        initializer: function called with `initargs` once in every worker process when the worker pool starts
+        chunksize: default number of items sent to a worker at once by parallel calls
+        catalog_dir: folder to save the catalog of the dataset in between runs, so later runs only scan the folders that changed. If it is None, the catalog is only kept in memory and nothing is written to the dataset.
+        """
         self._root = str.strip(root)
-        self._summary_funcs = {
-            'file_size': lambda x: os.path.getsize(x) / 1024.0,
-            # 'exists': lambda x: os.path.exists(x)
-            'num_of_rows': num_of_rows,
-            'mh_folder_structure': validate_folder_structure,
-            'mh_filename': validate_filename,
-            'csv_header': validate_csv_header,
-            'na_rows': na_rows
-        }
         self._num_of_cpu = cpu_count()
+        self._catalog = None
+        self._catalog_dir = catalog_dir
+        self._utilization = None
+        self._pool = workers.WorkerPool(max(1, self._num_of_cpu - 1), initializer=initializer, initargs=initargs, chunksize=chunksize)
+
+    def __getstate__(self):
+        # the catalog is not needed by the workers and can be large
+        state = self.__dict__.copy()
+        state['_catalog'] = None
+        return state
+
+    def pool(self):
+        """The worker pool used by parallel calls, it is started by the first parallel call and kept until `close` is called"""
+        return self._pool
+
+    def close(self):
+        """Stop the worker processes"""
+        self._pool.close()
 
     def get_root(self):
         return self._root
 
-    def summarize(self, rel_path = "", use_parallel=False, verbose=False):
-        if use_parallel:
-            self._pool = Pool(self._num_of_cpu - 1)
+    def catalog(self, refresh=False):
+        """Table with one row per file of the dataset (path, pid, sid, sensortype, datatype, file_type, date, hour)
+
+        Only folders changed since the last call (or since the catalog was saved in `catalog_dir`) are scanned again, use `refresh` to scan the whole dataset again.
+        """
+        return self._load_catalog(refresh=refresh).table
+
+    def _load_catalog(self, refresh=False):
+        if refresh or self._catalog is None:
+            self._catalog = Catalog.load(self._root, catalog_dir=self._catalog_dir, refresh=refresh)
+        elif self._catalog.update():
+            self._catalog.save()
+        return self._catalog
+
+    def _find_files(self, pattern):
+        """Catalog rows of the files matching a glob pattern, patterns outside of the root folder are searched with glob"""
+        catalog = self._load_catalog()
+        if catalog.contains(pattern):
+            return catalog.query(pattern)
+        return parse_files(glob.glob(pattern, recursive=True))
+
+    def _file_fields(self, files, column, extract):
+        # fields parsed by the catalog, files with names that the catalog could not parse use the extract function
+        return [extract(path) if pd.isnull(value) else value for path, value in zip(files['path'].tolist(), files[column].tolist())]
+
+    def summarize(self, rel_path = "", use_parallel=False, verbose=False, chunksize=None):
         if rel_path == "":
             rel_path = os.path.join(self._root, "*", "MasterSynced")
         else:
             rel_path = os.path.join(self._root, rel_path)
         
-        result = self._summarize(rel_path, self._summary_funcs, use_parallel=use_parallel, verbose=verbose)
-        if use_parallel:
-            self._pool.close()
+        result = self._summarize(rel_path, use_parallel=use_parallel, verbose=verbose, chunksize=chunksize)
         return result
   
-    def _summarize(self, folder, func_dict, use_parallel=False, verbose=False):
-        entry_files = glob.glob(os.path.join(folder,'**', '*.csv*'), recursive=True)
-        # parallel version
+    def _summarize(self, folder, use_parallel=False, verbose=False, chunksize=None):
+        entry_files = self._find_files(os.path.join(folder,'**', '*.csv*'))['path'].tolist()
+        # every file is read once, rows are collected and turned into one table at the end
         if use_parallel:
-            df = pd.concat(self._pool.map(self._summarize_file, entry_files, [func_dict] * len(entry_files), [verbose] * len(entry_files)))
+            rows = list(self._pool.imap_unordered(partial(self._summarize_file, verbose=verbose), entry_files, chunksize=chunksize))
         else:
-            df = pd.DataFrame()
-            for file in entry_files:
-                df = df.append(self._summarize_file(file, func_dict, verbose=verbose), ignore_index=True)
+            rows = [self._summarize_file(file, verbose=verbose) for file in entry_files]
+        columns = ['pid', 'id', 'type', 'date', 'hour', 'sensortype', 'datatype']
+        if len(rows) == 0:
+            return pd.DataFrame(columns=columns)
+        df = pd.DataFrame(rows)
+        df = df[columns + [column for column in df.columns if column not in columns]]
         df = df.sort_values(by = ['pid', 'id', 'type', 'date', 'hour']).reset_index(drop=True)
         return df
 
-    def _summarize_file(self, file, func_dict, verbose=False):
+    def _summarize_file(self, file, verbose=False):
         file = os.path.abspath(file)
         if verbose:
             print('processing ' + file)
         row = {}
-        keys = []
-        extra_dfs = []
-        for name, func in func_dict.items():
-            result = func(file)
-            if type(result) is not pd.DataFrame:
-                row[name] = result
-                keys.append(name)
-            else:
-                extra_dfs.append(result)
+        row['pid'] = extract_pid(file)
+        row['id'] = extract_id(file)
+        row['type'] = extract_file_type(file)
         row['date'] = extract_date(file)
         row['hour'] = extract_hour(file)
-        row['type'] = extract_file_type(file)
-        row['id'] = extract_id(file)
-        row['pid'] = extract_pid(file)
         row['sensortype'] = extract_sensortype(file)
         row['datatype'] = extract_datatype(file)
-        row_df = pd.DataFrame(data=row, index=[0])
-        row_df = row_df[['pid', 'id', 'type', 'date', 'hour', 'sensortype', 'datatype'] + keys]
-        row_df = pd.concat([row_df] + extra_dfs, axis=1)
-        return row_df
+        row.update(file_summary(file))
+        return row
 
-    def process(self, rel_pattern = "", func=None, use_parallel=False, verbose=False, **kwargs):
+    def index(self, rel_path = "", use_parallel=False, force=False, verbose=False, chunksize=None):
+        """Write the metadata sidecar of every data file that has no fresh sidecar yet
+
+        The summary functions answer from the sidecars afterwards instead of reading the files. Returns one row of metadata per file.
+        """
+        if rel_path == "":
+            rel_path = os.path.join(self._root, "*", "MasterSynced")
+        else:
+            rel_path = os.path.join(self._root, rel_path)
+        entry_files = self._find_files(os.path.join(rel_path, '**', '*.csv*'))['path'].tolist()
+        def index_file(file):
+            if verbose:
+                print('indexing ' + file)
+            meta = sidecar.index_file(file, force=force)
+            return dict(meta, file=file)
         if use_parallel:
-            self._pool = Pool(self._num_of_cpu - 1)
+            metas = self._pool.map(index_file, entry_files, chunksize=chunksize)
+        else:
+            metas = list(map(index_file, entry_files))
+        if len(metas) == 0:
+            return pd.DataFrame()
+        result = pd.DataFrame(metas)
+        return result[['file'] + [col for col in result.columns if col != 'file']]
+
+    def process(self, rel_pattern = "", func=None, use_parallel=False, verbose=False, **kwargs):
+        """Apply a script to files matching the pattern
+
+        The options of the run are listed below, other keyword arguments are passed to the script.
+
+        cache_size: byte budget of the decoded frame cache of each worker, if None, the current budget of the cache is kept (disabled by default)
+        schedule: 'file' sends each file to the workers separately, 'contiguous' sends runs of adjacent files of the same pid and sid to the same worker so that previous and next files are served from the frame cache
+        cache_dir: folder of the persistent cache of decoded files shared by all runs, if None, files are decoded from their text every time
+        cache_dir_size: byte budget of `cache_dir`
+        block_duration: if provided, each file is loaded and processed in blocks of `block_duration` seconds that share `block_overlap` seconds with adjacent blocks and files (the default of the script if it is 0 and the script uses the adjacent files), so files longer than an hour are processed in bounded memory
+        output: if provided, results are streamed into this csv file instead of being returned. The result of each file is spilled to a temporary run folder next to `output` as soon as it is ready and the spilled results are merged by their first column at the end, so only one result per worker is kept in memory. Returns `output`.
+        columns: columns of the streamed output, declared by the script. If None, the columns of the widest result are used.
+        float_format: format of the float values in `output`
+        chunksize: number of tasks sent to a worker at once, if None, the chunksize of `M` is used
+        shard_size: if provided, files larger than `shard_size` bytes are split into time shards processed by different workers. Shards are processed in blocks of `block_duration` seconds (one hour if it is None) and the results of all shards of a file are post processed together. Only scripts built on `SensorProcessor` can be sharded.
+
+        incremental: if True, files whose derived file is up to date are skipped, a derived file is up to date while its build manifest matches the script, its arguments, the data file, its adjacent files and the side inputs of the script. Only scripts that declare their derived file with `output_filepath` are run incrementally, skipped files do not add to the returned result.
+
+        checkpoint: if True, the result of every file is saved to a run folder in `.padar-runs` of the root folder as soon as it is ready, so that an interrupted run can be resumed. The run id is logged at the start of the run and the run folder is removed when the run finishes.
+        resume: id of an interrupted checkpointed run, only the files without a saved result are processed and the result is the same as the result of an uninterrupted run. The files and their order are taken from the run, `rel_pattern` is not used.
+
+        prefetch: number of sensor files each worker reads and decodes ahead in a background thread while it computes the current file, the files ahead are the next files of its task and of the tasks in the same chunk. 0 disables the read-ahead.
+        prefetch_size: byte budget of the files read ahead by each worker
+
+        by_stream: if True, the sorted files of each pid and sid are processed as one contiguous stream with `run_on_stream` of the script, in blocks of `block_duration` seconds (one hour if it is None) with `block_overlap` seconds of data around each block (the default of the script if it is 0), instead of file by file. Each pid and sid is a task, the derived files of every hour are written as before and the result of a stream is returned at the position of its first file. Only scripts built on `SensorProcessor` can run on streams.
+        stream_dir: folder of the temporary memory-mapped stores of `by_stream`, if None, each stream is kept in memory
+
+        Parallel tasks are started largest first, the work done by every worker is returned by `utilization`.
+        """
         result = self._process(rel_pattern, func, use_parallel=use_parallel, verbose=verbose, **kwargs)
-        if use_parallel:
-            self._pool.close()
         return result
 
-    def _process(self, pattern, func, use_parallel=False, verbose=False, violate=False, **kwargs):
+    def _process(self, pattern, func, use_parallel=False, verbose=False, **kwargs):
         if func is None:
             raise ValueError("You must provide a function to process files")
-        entry_files = np.array(glob.glob(pattern, recursive=True))
+        # the options of the run, the other keyword arguments are passed to the script
+        options = dict([(name, kwargs.pop(name, default)) for name, default in _PROCESS_OPTIONS.items()])
+        if options['by_stream'] and (options['shard_size'] is not None or options['incremental'] or options['checkpoint'] or options['resume'] is not None):
+            raise ValueError('Streams can not be sharded, processed incrementally or checkpointed')
+        files, run_state = self._plan_files(pattern, options)
+        run, processor, tasks, saved_results = self._start_run(func, files, run_state, options, use_parallel, verbose, kwargs)
+
+        file_sizes = [self._file_size(file) for file in files[0]]
+        if options['shard_size'] is not None and self._can_shard(workers.cached(run['key'], run['build'])):
+            run['shard_duration'] = options['block_duration'] if options['block_duration'] is not None else 3600
+            tasks = self._shard_tasks(tasks, file_sizes, options['shard_size'], run['shard_duration'])
+        task_sizes = [sum([self._entry_size(entry, file_sizes) for entry in task]) for task in tasks]
+        if use_parallel:
+            # the largest tasks are started first so that no worker is left with a large task at the end
+            task_order = sorted(range(len(tasks)), key=lambda i: -task_sizes[i])
+        else:
+            task_order = list(range(len(tasks)))
+        run['run_dir'] = self._open_run(run, files, tasks, run_state, options)
+
+        finished = False
+        try:
+            run_started = time.time()
+            lookahead_chunksize = (options['chunksize'] if options['chunksize'] is not None else self._pool.chunksize) if use_parallel else None
+            indexed_tasks = [(i, tasks[i], self._task_lookahead(tasks, task_order, position, options['prefetch'], lookahead_chunksize), task_sizes[i]) for position, i in enumerate(task_order)]
+            task_func = partial(self._run_task, run, options)
+            if use_parallel:
+                task_results = self._pool.imap_unordered(task_func, indexed_tasks, chunksize=options['chunksize'])
+            else:
+                task_results = map(task_func, indexed_tasks)
+            entry_results = self._gather_results(run, processor, files, task_results, saved_results, run_started, verbose)
+            result = self._collect_results(run, entry_results, options, verbose)
+            finished = True
+        finally:
+            if run['run_dir'] is not None and (options['checkpoint'] or options['resume'] is not None):
+                # the results of an interrupted run are kept so that it can be resumed
+                if finished:
+                    checkpoint_module.remove(run['run_dir'])
+            elif run['run_dir'] is not None:
+                shutil.rmtree(run['run_dir'], ignore_errors=True)
+        return result
+
+    def _plan_files(self, pattern, options):
+        """Files of the run as (entry_files, prev_files, next_files, pids, sids) and the saved state of the run when it is resumed"""
+        resume = options['resume']
+        if resume is None:
+            files = self._plan(pattern, violate=options['violate'])
+            run_state = None
+        else:
+            # the files of the interrupted run are processed in the same order
+            run_dir, run_state = checkpoint_module.load(self._root, resume)
+            files = tuple([run_state[key] for key in ['entry_files', 'prev_files', 'next_files', 'pids', 'sids']])
+            run_state = dict(run_state, run_dir=run_dir)
+            if options['output'] is None:
+                options['output'] = run_state['output']
+            elif run_state['output'] is None:
+                raise ValueError('Run ' + resume + ' must be resumed with the same output')
+        if options['output'] is not None:
+            options['output'] = os.path.abspath(options['output'])
+        return files, run_state
+
+    def _start_run(self, func, files, run_state, options, use_parallel, verbose, kwargs):
+        """Build the processor of the script and the tasks of the run
+
+        Returns the state of the run shared with the workers, the processor, the tasks and the results saved by the interrupted run when it is resumed.
+        """
+        if options['by_stream']:
+            # one task per pid and sid
+            tasks = self._schedule_tasks(*files, schedule='contiguous', n_workers=1)
+        else:
+            tasks = self._schedule_tasks(*files, schedule=options['schedule'], n_workers=self._pool.n_workers if use_parallel else 1)
+
+        # the processor of the script is built once per worker and reused for all files of this run
+        run_key = ('process', uuid.uuid4().hex)
+        violate = options['violate']
+        def build_func():
+            return func(verbose=verbose, violate=violate, **kwargs)
+
+        processor = getattr(workers.cached(run_key, build_func), '__self__', None)
+        if processor is not None:
+            script_name = type(processor).__module__ + '.' + type(processor).__name__
+        else:
+            script_name = getattr(func, '__module__', '') + '.' + getattr(func, '__name__', '')
+        if options['by_stream'] and not hasattr(processor, '_load_stream'):
+            raise ValueError('Script ' + script_name + ' can not run on streams')
+        if options['block_duration'] is not None:
+            run_kwargs = dict(block_duration=options['block_duration'], block_overlap=options['block_overlap'])
+        else:
+            run_kwargs = dict()
+        args_hash = manifest.kwargs_hash(dict(kwargs, violate=violate, block_duration=options['block_duration'], block_overlap=options['block_overlap']))
+        # results are spilled sorted by their first column when they are merged into `output`
+        run = dict(key=run_key, build=build_func, script=script_name, args_hash=args_hash, run_kwargs=run_kwargs, incremental=False, shard_duration=None, run_dir=None, sort_spills=options['output'] is not None)
+
+        saved_results = {}
+        if options['resume'] is not None:
+            if run_state['script'] != script_name or run_state['kwargs_hash'] != args_hash:
+                raise ValueError('Run ' + options['resume'] + ' was started with a different script or different arguments')
+            saved_results = checkpoint_module.completed(run_state['run_dir'])
+            pending = set(run_state['pending']) - set(saved_results.keys())
+            tasks = [[entry for entry in task if entry[0] in pending] for task in tasks]
+            tasks = [task for task in tasks if len(task) > 0]
+            if verbose:
+                logger.info('Resume run ' + options['resume'] + ', ' + str(len(saved_results)) + ' files are done, ' + str(len(pending)) + ' files are left')
+        elif options['incremental'] and processor is not None and hasattr(processor, 'output_filepath'):
+            run['incremental'] = True
+            n_entries = sum([len(task) for task in tasks])
+            tasks = [[entry for entry in task if not self._is_up_to_date(processor, entry, script_name, args_hash)] for task in tasks]
+            tasks = [task for task in tasks if len(task) > 0]
+            if verbose:
+                logger.info('Skip ' + str(n_entries - sum([len(task) for task in tasks])) + ' files with up to date derived files')
+        return run, processor, tasks, saved_results
+
+    def _open_run(self, run, files, tasks, run_state, options):
+        """Folder the results of the run are saved to as soon as they are ready, None if they are kept in memory"""
+        output = options['output']
+        if output is not None:
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        if options['resume'] is not None:
+            return run_state['run_dir']
+        elif options['checkpoint']:
+            run_id = checkpoint_module.new_run_id()
+            entry_files, prev_files, next_files, pids, sids = files
+            run_dir = checkpoint_module.create(self._root, run_id, dict(script=run['script'], kwargs_hash=run['args_hash'], entry_files=list(entry_files), prev_files=list(prev_files), next_files=list(next_files), pids=list(pids), sids=list(sids), output=output, pending=sorted(set([entry[0] for task in tasks for entry in task]))))
+            logger.info('Checkpoint results to run ' + run_id + ', resume an interrupted run with --resume ' + run_id)
+            return run_dir
+        elif output is not None:
+            return tempfile.mkdtemp(prefix='.padar-run-', dir=os.path.dirname(output))
+        return None
+
+    def _run_task(self, run, options, indexed_task):
+        # runs in a worker, a task is a list of (entry index, file, prev_file, next_file, shard) processed in order
+        task_index, task, lookahead, task_size = indexed_task
+        started = time.time()
+        run_func = workers.cached(run['key'], run['build'])
+        frame_cache = cache.frame_cache()
+        if options['cache_size'] is not None:
+            frame_cache.resize(options['cache_size'])
+        disk_cache.configure(options['cache_dir'], max_bytes=options['cache_dir_size'])
+        prefetcher = cache.configure_prefetcher(options['prefetch'], options['prefetch_size'])
+        hits = frame_cache.hits
+        misses = frame_cache.misses
+        if options['by_stream']:
+            task_result = [self._run_streamed(run, options, run_func, task)]
+        else:
+            task_result = []
+            for position, entry in enumerate(task):
+                if options['prefetch'] > 0:
+                    prefetcher.schedule(self._prefetch_files(task[position + 1:]) + lookahead, current=entry[1])
+                if entry[4] is None:
+                    task_result.append((entry[0], None, self._run_file(run, run_func, entry[:4])))
+                else:
+                    task_result.append((entry[0], entry[4], self._run_sharded(run, options, run_func, entry)))
+        stats = (os.getpid(), len(task), task_size, time.time() - started)
+        return task_index, (task_result, frame_cache.hits - hits, frame_cache.misses - misses, stats)
+
+    def _run_file(self, run, run_func, entry):
+        states = manifest.input_states(self._manifest_inputs(run_func.__self__, entry)) if run['incremental'] else None
+        entry_result = run_func(entry[1], prev_file=entry[2], next_file=entry[3], **run['run_kwargs'])
+        self._record_manifest(run, getattr(run_func, '__self__', None), entry, states)
+        return self._save_result(run, entry[0], entry_result)
+
+    def _run_sharded(self, run, options, run_func, entry):
+        # shards are post processed together by `_finish_shards` when all shards of the file are done
+        shard = entry[4]
+        return run_func.__self__.run_on_shard(entry[1], prev_file=entry[2], next_file=entry[3], shard_start=shard[0], shard_stop=shard[1], block_duration=run['shard_duration'], block_overlap=options['block_overlap'])
+
+    def _run_streamed(self, run, options, run_func, task):
+        # the task is the files of one pid and sid, its result is kept at the position of its first file
+        block_duration = options['block_duration'] if options['block_duration'] is not None else 3600
+        block_overlap = options['block_overlap'] if options['block_overlap'] else None
+        entry_result = run_func.__self__.run_on_stream([entry[1] for entry in task], block_duration=block_duration, block_overlap=block_overlap, store_dir=options['stream_dir'])
+        return task[0][0], None, self._save_result(run, task[0][0], entry_result)
+
+    def _finish_shards(self, run, processor, files, entry_index, shards):
+        shards = sorted(shards, key=lambda a_shard: a_shard[0])
+        entry = (entry_index, files[0][entry_index], files[1][entry_index], files[2][entry_index])
+        states = manifest.input_states(self._manifest_inputs(processor, entry)) if run['incremental'] else None
+        entry_result = processor.finish_shards(entry[1], [shard_result for _, shard_result in shards])
+        self._record_manifest(run, processor, entry, states)
+        return self._save_result(run, entry_index, entry_result)
+
+    def _save_result(self, run, entry_index, entry_result):
+        # only the path and the columns of a spilled result are sent back
+        if run['run_dir'] is None:
+            return entry_result
+        return checkpoint_module.save_result(run['run_dir'], entry_index, entry_result, sort=run['sort_spills'])
+
+    def _record_manifest(self, run, processor, entry, states):
+        # the inputs of a derived file are recorded as they were before the file was processed
+        if run['incremental'] and processor.output_filepath(entry[1]) is not None:
+            manifest.record(processor.output_filepath(entry[1]), run['script'], run['args_hash'], self._manifest_inputs(processor, entry), states=states)
+
+    def _gather_results(self, run, processor, files, task_results, saved_results, run_started, verbose):
+        """Results of the run by entry index, the shards of a file are post processed together when all tasks are done"""
+        entry_results = dict(saved_results)
+        shard_results = {}
+        worker_stats = []
+        cache_hits = 0
+        cache_misses = 0
+        for _, (task_result, task_hits, task_misses, stats) in task_results:
+            cache_hits = cache_hits + task_hits
+            cache_misses = cache_misses + task_misses
+            worker_stats.append(stats)
+            for entry_index, shard, entry_result in task_result:
+                if shard is None:
+                    entry_results[entry_index] = entry_result
+                else:
+                    shard_results.setdefault(entry_index, []).append((shard[0], entry_result))
+        self._utilization = self._worker_utilization(worker_stats, time.time() - run_started)
+        if verbose:
+            logger.info('Frame cache hits: ' + str(cache_hits) + ', misses: ' + str(cache_misses))
+            for row in self._utilization.itertuples(index=False):
+                logger.info('Worker ' + str(row.worker) + ': ' + str(row.files) + ' files, ' + str(row.bytes) + ' bytes, busy ' + '%.1f' % row.busy_seconds + ' s (' + '%.0f%%' % (row.utilization * 100) + ')')
+        for entry_index, shards in shard_results.items():
+            entry_results[entry_index] = self._finish_shards(run, processor, files, entry_index, shards)
+        return entry_results
+
+    def _collect_results(self, run, entry_results, options, verbose):
+        """Merge the results in the order of the files into `output` and return `output`, or return the combined result"""
+        result = []
+        col_order = []
+        for entry_index in sorted(entry_results.keys()):
+            entry_result = entry_results[entry_index]
+            result.append(entry_result)
+            entry_columns = entry_result[1] if run['run_dir'] is not None else entry_result.columns
+            if len(entry_columns) > len(col_order):
+                col_order = entry_columns
+        if run['run_dir'] is not None and options['output'] is not None:
+            columns = options['columns']
+            n_rows = collector.merge([spill_path for spill_path, _ in result], options['output'], list(col_order) if columns is None else list(columns), float_format=options['float_format'])
+            if verbose:
+                logger.info('Streamed ' + str(n_rows) + ' rows to ' + options['output'])
+            return options['output']
+        elif run['run_dir'] is not None:
+            result = [collector.load(spill_path) for spill_path, _ in result]
+        return self._combine_results(result, col_order)
+
+    def _prefetch_files(self, entries):
+        # only whole sensor files are read ahead, shards are loaded in blocks
+        return [file for _, file, _, _, shard in entries if shard is None and extract_file_type(file) == 'sensor']
+
+    def _task_lookahead(self, tasks, task_order, position, prefetch, chunksize=None):
+        """Files read ahead at the end of the task at `position` of `task_order`, they are the files of the next tasks the same worker gets
+
+        chunksize: number of tasks sent to a parallel worker at once, None for serial runs
+        """
+        if prefetch <= 0:
+            return []
+        if chunksize is None:
+            # serial runs process all tasks in order
+            stop = len(task_order)
+        else:
+            # a parallel worker gets the tasks of its chunk in order, the next chunk can go to any worker
+            chunksize = max(1, int(chunksize))
+            stop = min(len(task_order), (position // chunksize + 1) * chunksize)
+        files = []
+        for i in task_order[position + 1:stop]:
+            files = files + self._prefetch_files(tasks[i])
+            if len(files) >= prefetch:
+                break
+        return files[:prefetch]
+
+    def _combine_results(self, result, col_order):
+        if len(result) == 0:
+            # e.g. all files are up to date in incremental mode
+            return pd.DataFrame()
+        result = pd.concat(result, ignore_index=True)
+        result = result[col_order]
+        # sort timestamp
+        if result.empty:
+            return result
+        elif isinstance(result.iloc[0,0], pd.Timestamp):
+            result = result.sort_values(by=result.columns[0])
+        return result
+
+    def submit(self, rel_pattern, queue_dir, script, violate=False, schedule='file', n_workers=1, block_duration=None, block_overlap=0, lease=600, max_attempts=3, **kwargs):
+        """Write a job to process the files matching the pattern to a queue folder, the job is processed by workers started with `work` on any host that shares the dataset and the queue folder
+
+        script: name of a built-in script or path of a python script with a `build` function, the other keyword arguments are passed to `build`
+        schedule: 'file' makes one task per file, 'contiguous' makes tasks of adjacent hourly files of the same participant and sensor split for `n_workers` workers
+        lease: seconds after which the task of a worker that stopped renewing its claim is given to another worker
+        max_attempts: number of times a task is tried before it is moved to `failed`
+        """
+        entry_files, prev_files, next_files, pids, sids = self._plan(rel_pattern, violate=violate)
+        tasks = self._schedule_tasks(entry_files, prev_files, next_files, pids, sids, schedule=schedule, n_workers=n_workers)
+        file_sizes = [self._file_size(file) for file in entry_files]
+        # the largest tasks are claimed first
+        tasks = sorted(tasks, key=lambda task: -sum([file_sizes[entry[0]] for entry in task]))
+        job = dict(
+            root=os.path.abspath(self._root),
+            script=os.path.abspath(script) if script.endswith('.py') else script,
+            kwargs=kwargs,
+            violate=violate,
+            block_duration=block_duration,
+            block_overlap=block_overlap,
+            lease=lease,
+            max_attempts=max_attempts,
+            n_files=len(entry_files)
+        )
+        return jobqueue.create(queue_dir, job, [[entry[:4] for entry in task] for task in tasks])
+
+    def work(self, queue_dir, poll=5, wait=True, verbose=False):
+        """Process the tasks of a queue written by `submit`, returns the number of tasks done by this worker
+
+        poll: seconds to wait before checking the queue again when no task is pending
+        wait: if True, the worker waits until the tasks claimed by other workers are done, so that it takes over their tasks if their claims expire
+        """
+        job = jobqueue.load_job(queue_dir)
+        run_func = load_script(job['script']).build(verbose=verbose, violate=job['violate'], **job['kwargs'])
+        if job['block_duration'] is not None:
+            run_kwargs = dict(block_duration=job['block_duration'], block_overlap=job['block_overlap'])
+        else:
+            run_kwargs = dict()
+        worker = jobqueue.worker_id()
+        n_tasks = 0
+        while True:
+            for task_id, state in jobqueue.requeue_stale(queue_dir, job['lease'], job['max_attempts']):
+                logger.warn('Claim of task ' + task_id + ' expired, the task is ' + state)
+            task = jobqueue.claim(queue_dir, worker)
+            if task is None:
+                if not wait or jobqueue.counts(queue_dir)['claimed'] == 0:
+                    break
+                time.sleep(poll)
+                continue
+            started = time.time()
+            try:
+                with jobqueue.Lease(task, interval=job['lease'] / 3.0):
+                    for entry_index, file, prev_file, next_file in task['entries']:
+                        entry_result = run_func(file, prev_file=prev_file, next_file=next_file, **run_kwargs)
+                        collector.spill(entry_result, jobqueue.result_path(queue_dir, entry_index))
+            except Exception as e:
+                state = jobqueue.fail(queue_dir, task, job['max_attempts'], worker=worker, seconds=time.time() - started, error=repr(e))
+                logger.error('Task ' + task['task_id'] + ' failed on ' + worker + ' (attempt ' + str(task['attempts']) + '): ' + repr(e) + ', the task is ' + state)
+                continue
+            if jobqueue.complete(queue_dir, task, worker=worker, seconds=time.time() - started):
+                n_tasks = n_tasks + 1
+                if verbose:
+                    logger.info('Task ' + task['task_id'] + ' is done by ' + worker + ' in ' + '%.1f' % (time.time() - started) + ' s')
+            else:
+                logger.warn('Claim of task ' + task['task_id'] + ' was lost before it was done')
+        return n_tasks
+
+    def collect(self, queue_dir, output=None, columns=None, float_format='%.9f'):
+        """Merge the results of a finished queue in the order of the files, returns the merged result or `output` if it is provided"""
+        task_counts = jobqueue.counts(queue_dir)
+        if task_counts['pending'] > 0 or task_counts['claimed'] > 0:
+            raise ValueError('Queue is not finished: ' + str(task_counts['pending']) + ' tasks are pending and ' + str(task_counts['claimed']) + ' tasks are claimed')
+        if task_counts['failed'] > 0:
+            logger.warn(str(task_counts['failed']) + ' tasks failed, see the status folder of the queue')
+        paths = jobqueue.result_paths(queue_dir)
+        col_order = []
+        for path in paths:
+            path_columns = collector.spill_columns(path)
+            if len(path_columns) > len(col_order):
+                col_order = path_columns
+        if output is not None:
+            output = os.path.abspath(output)
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+            collector.merge(paths, output, col_order if columns is None else list(columns), float_format=float_format)
+            return output
+        return self._combine_results([collector.load(path) for path in paths], col_order)
+
+    def plan(self, rel_pattern = "", func=None, use_parallel=False, violate=False, schedule='file', block_duration=None, block_overlap=0, sample=3, verbose=False, **kwargs):
+        """Describe what `process` would do without running it, returns (tasks, groups, estimate)
+
+        tasks: one row per file with its task, pid, sid, previous and next files and size, in the order the tasks are started
+        groups: files, tasks and bytes of every pid and sid
+        estimate: dict with the measured seconds per byte and peak memory of a worker, the estimated runtime with the workers of `process` and the suggested number of workers
+
+        sample: number of files run through the script in a fresh worker process to measure its cost, they are chosen across the file sizes. Files are run without post processing so that no derived file is written. If 0, or if `func` does not build a processor, only the tasks are described.
+        """
+        entry_files, prev_files, next_files, pids, sids = self._plan(rel_pattern, violate=violate)
+        n_workers = self._pool.n_workers if use_parallel else 1
+        tasks = self._schedule_tasks(entry_files, prev_files, next_files, pids, sids, schedule=schedule, n_workers=n_workers)
+        file_sizes = [self._file_size(file) for file in entry_files]
+        task_sizes = [sum([file_sizes[entry[0]] for entry in task]) for task in tasks]
+        if use_parallel:
+            task_order = sorted(range(len(tasks)), key=lambda i: -task_sizes[i])
+        else:
+            task_order = list(range(len(tasks)))
+        rows = []
+        for rank, i in enumerate(task_order):
+            for entry_index, file, prev_file, next_file, _ in tasks[i]:
+                rows.append((rank, pids[entry_index], sids[entry_index], file, prev_file, next_file, file_sizes[entry_index]))
+        task_table = pd.DataFrame(rows, columns=['task', 'pid', 'sid', 'file', 'prev_file', 'next_file', 'bytes'])
+        groups = task_table.groupby(['pid', 'sid'], sort=True).agg(files=('file', 'count'), tasks=('task', 'nunique'), bytes=('bytes', 'sum')).reset_index()
+
+        estimate = dict(files=len(entry_files), tasks=len(tasks), bytes=int(sum(file_sizes)), workers=n_workers, samples=0, seconds_per_byte=None, peak_rss=None, runtime=None, suggested_workers=None)
+        sample_entries = self._sample_entries(tasks, file_sizes, sample)
+        if func is None or len(sample_entries) == 0:
+            return task_table, groups, estimate
+        if block_duration is not None:
+            run_kwargs = dict(block_duration=block_duration, block_overlap=block_overlap)
+        else:
+            run_kwargs = dict()
+        run_key = ('plan', uuid.uuid4().hex)
+        def build_func():
+            return func(verbose=False, violate=violate, **kwargs)
+        if getattr(workers.cached(run_key, build_func), '__self__', None) is None:
+            if verbose:
+                logger.warn('The script does not build a processor, its cost is not measured')
+            return task_table, groups, estimate
+
+        def calibrate(entry):
+            processor = workers.cached(run_key, build_func).__self__
+            started = time.time()
+            processor.compute_on_file(entry[1], prev_file=entry[2], next_file=entry[3], **run_kwargs)
+            return time.time() - started, workers.peak_rss()
+
+        # a fresh process, so that its peak memory is the memory needed by one worker
+        with workers.WorkerPool(1) as calibration_pool:
+            measures = calibration_pool.map(calibrate, sample_entries)
+        seconds = sum([measure[0] for measure in measures])
+        sample_bytes = sum([file_sizes[entry[0]] for entry in sample_entries])
+        seconds_per_byte = seconds / max(sample_bytes, 1)
+        seconds_per_file = seconds / len(sample_entries)
+        # small files are dominated by the cost per file, large files by their size
+        task_seconds = [max(seconds_per_byte * task_sizes[i], seconds_per_file * len(tasks[i])) for i in task_order]
+        peak_rss = max([measure[1] for measure in measures])
+        memory_workers = int(workers.available_memory() * 0.8 // max(peak_rss, 1))
+        suggested_workers = max(1, min(self._num_of_cpu - 1, memory_workers, len(tasks)))
+        estimate.update(
+            samples=len(sample_entries),
+            seconds_per_byte=seconds_per_byte,
+            peak_rss=int(peak_rss),
+            runtime=self._estimate_runtime(task_seconds, n_workers),
+            suggested_workers=suggested_workers,
+            suggested_runtime=self._estimate_runtime(task_seconds, suggested_workers)
+        )
+        if verbose:
+            logger.info('Measured ' + str(len(sample_entries)) + ' files in ' + '%.1f' % seconds + ' s, peak memory of a worker is ' + '%.0f' % (peak_rss / 1024.0 / 1024.0) + ' MB')
+        return task_table, groups, estimate
+
+    def _sample_entries(self, tasks, file_sizes, sample):
+        # files spread across the file sizes, from the median up to the largest file
+        entries = sorted([entry for task in tasks for entry in task], key=lambda entry: file_sizes[entry[0]])
+        if sample <= 0 or len(entries) == 0:
+            return []
+        positions = np.unique(np.linspace(len(entries) // 2, len(entries) - 1, num=min(sample, len(entries))).astype(int))
+        return [entries[position] for position in positions]
+
+    def _estimate_runtime(self, task_seconds, n_workers):
+        # tasks started largest first, each task goes to the worker that is free first
+        loads = [0.0] * max(1, n_workers)
+        for seconds in sorted(task_seconds, reverse=True):
+            loads[loads.index(min(loads))] += seconds
+        return max(loads)
+
+    def _plan(self, pattern, violate=False):
+        """Files matching the pattern sorted by pid, sid, date and hour with their previous and next files"""
+        files = self._find_files(pattern)
+        entry_files = np.array(files['path'].tolist())
         
         # sort by pid, sid, date, hour
         if violate == False:
-            pids = np.array(list(map(lambda file: extract_pid(file), entry_files)))
-            sids = np.array(list(map(lambda file: extract_id(file), entry_files)))
-            dates = np.array(list(map(lambda file: extract_date(file), entry_files)))
-            hours = np.array(list(map(lambda file: extract_hour(file), entry_files)))
+            pids = np.array(files['pid'].tolist())
+            sids = np.array(self._file_fields(files, 'sid', extract_id))
+            dates = np.array(self._file_fields(files, 'date', extract_date))
+            hours = np.array(self._file_fields(files, 'hour', extract_hour))
             sorted_inds = np.lexsort((hours, dates, sids, pids)).tolist()
             pids = pids[sorted_inds].tolist()
             sids = sids[sorted_inds].tolist()
@@ -113,46 +674,107 @@ class M:
             # file_df.to_csv('file_df.csv', index=False)
             # exit(1)
         else:
+            entry_files = entry_files.tolist()
             prev_files = [None] * len(entry_files)
             next_files = [None] * len(entry_files)
             sids = ["unknown"] * len(entry_files)
-            pids = np.array(list(map(lambda file: extract_pid(file), entry_files)))
+            pids = files['pid'].tolist()
             dates = ['unknown'] * len(entry_files)
             hours = ['unknown'] * len(entry_files)
-        
-        # parallel version
-        if use_parallel:
-            # def zipped_func(a_zip, verbose=False, **kwargs):
-            #     return func(a_zip[0], verbose=verbose, prev_file=a_zip[1], next_file=a_zip[2], **kwargs)
-            
-            def zipped_func(a_zip):
-                return func(verbose=verbose, violate=violate, **kwargs)(a_zip[0], prev_file=a_zip[1], next_file=a_zip[2])
-
-            # func_partial = partial(zipped_func, verbose=verbose, **kwargs)
-            # result = self._pool.map(func_partial, zip(entry_files, prev_files, next_files))
-            result = self._pool.map(zipped_func, zip(entry_files, prev_files, next_files))
-            col_order = []
-            
-            for entry in result:
-                if len(entry.columns) > len(col_order):
-                    col_order = entry.columns
-        else:
-            result = []
-            col_order = []
-            for file, prev_file, next_file in zip(entry_files, prev_files, next_files):
-                # entry_result = func(file, verbose=verbose, prev_file=prev_file, next_file=next_file, **kwargs)
-                entry_result = func(verbose=verbose, violate=violate, **kwargs)(file, prev_file=prev_file, next_file=next_file)
-                result.append(entry_result)
-                if len(entry_result.columns) > len(col_order):
-                    col_order = entry_result.columns
-        result = pd.concat(result, ignore_index=True)
-        result = result[col_order]
-        # sort timestamp
-        if result.empty:
-            return result
-        elif isinstance(result.iloc[0,0], pd.Timestamp):
-            result = result.sort_values(by=result.columns[0])
-            return result
+        return entry_files, prev_files, next_files, pids, sids
+
+    def _schedule_tasks(self, entry_files, prev_files, next_files, pids, sids, schedule='file', n_workers=1):
+        zips = [(i, entry_files[i], prev_files[i], next_files[i], None) for i in range(len(entry_files))]
+        if schedule == 'file':
+            return [[a_zip] for a_zip in zips]
+        elif schedule == 'contiguous':
+            # runs of the same pid and sid, long runs are split so that every worker still gets a share
+            if n_workers > 1:
+                max_run = max(1, int(np.ceil(len(zips) / float(n_workers))))
+            else:
+                max_run = max(1, len(zips))
+            tasks = []
+            for i in range(0, len(zips)):
+                if i == 0 or pids[i] != pids[i - 1] or sids[i] != sids[i - 1] or len(tasks[-1]) >= max_run:
+                    tasks.append([])
+                tasks[-1].append(zips[i])
+            return tasks
+        else:
+            raise ValueError("Unknown schedule: " + str(schedule))
+
+    def _shard_tasks(self, tasks, file_sizes, shard_size, shard_duration):
+        """Split the files larger than `shard_size` bytes into time shards that are processed as separate tasks
+
+        Shards are aligned to blocks of `shard_duration` seconds, each shard processes the blocks that start in [shard start, shard stop).
+        """
+        sharded_tasks = []
+        for task in tasks:
+            kept = []
+            for entry in task:
+                n_shards = int(np.ceil(file_sizes[entry[0]] / float(shard_size)))
+                shards = self._time_shards(entry[1], n_shards, shard_duration) if n_shards > 1 else []
+                if len(shards) > 1:
+                    sharded_tasks = sharded_tasks + [[entry[:4] + (shard,)] for shard in shards]
+                else:
+                    kept.append(entry)
+            if len(kept) > 0:
+                sharded_tasks.append(kept)
+        return sharded_tasks
+
+    def _time_shards(self, file, n_shards, shard_duration):
+        first_time, last_time = sidecar.time_range(file)
+        if pd.isnull(first_time) or pd.isnull(last_time):
+            return []
+        step = np.timedelta64(int(float(shard_duration) * 1000), 'ms')
+        first_block = (first_time - np.datetime64(0, 'ms')) // step
+        last_block = (last_time - np.datetime64(0, 'ms')) // step
+        n_blocks = int(last_block - first_block + 1)
+        edges = np.unique(np.linspace(first_block, last_block + 1, min(n_shards, n_blocks) + 1).round().astype(np.int64))
+        # (start, stop, share of the blocks of the file)
+        return [(np.datetime64(0, 'ms') + edges[i] * step, np.datetime64(0, 'ms') + edges[i + 1] * step, (edges[i + 1] - edges[i]) / float(n_blocks)) for i in range(len(edges) - 1)]
+
+    def _manifest_inputs(self, processor, entry):
+        # the data file, the adjacent files if the processor uses them and the side inputs
+        inputs = [entry[1]]
+        if not processor.independent:
+            inputs = inputs + [path for path in entry[2:4] if path is not None and path != 'None']
+        return inputs + processor.dependencies()
+
+    def _is_up_to_date(self, processor, entry, script_name, args_hash):
+        output_path = processor.output_filepath(entry[1])
+        if output_path is None:
+            return False
+        return manifest.is_up_to_date(output_path, script_name, args_hash, self._manifest_inputs(processor, entry))
+
+    def _can_shard(self, run_func):
+        processor = getattr(run_func, '__self__', None)
+        return processor is not None and hasattr(processor, 'run_on_shard') and processor.can_run_on_blocks()
+
+    def _file_size(self, file):
+        try:
+            return os.stat(file).st_size
+        except OSError:
+            return 0
+
+    def _entry_size(self, entry, file_sizes):
+        # a shard is a share of the file
+        if entry[4] is None:
+            return file_sizes[entry[0]]
+        return int(file_sizes[entry[0]] * entry[4][2])
+
+    def _worker_utilization(self, worker_stats, elapsed):
+        columns = ['worker', 'tasks', 'files', 'bytes', 'busy_seconds', 'utilization']
+        if len(worker_stats) == 0:
+            return pd.DataFrame(columns=columns)
+        stats = pd.DataFrame(worker_stats, columns=['worker', 'files', 'bytes', 'busy_seconds'])
+        stats['tasks'] = 1
+        result = stats.groupby('worker', sort=True).sum().reset_index()
+        result['utilization'] = result['busy_seconds'] / elapsed if elapsed > 0 else 1.0
+        return result[columns]
+
+    def utilization(self):
+        """Tasks, files, bytes and busy time of every worker in the last call of `process`, utilization is the share of the run that the worker was busy"""
+        return self._utilization
 
     def _get_prev_files(self, entry_files, pids, sids):
         entry_files = np.array(entry_files)
@@ -184,17 +806,17 @@ class M:
 
     @property
     def participants(self):
-        return [name for name in os.listdir(self._root) if os.path.isdir(os.path.join(self._root, name)) and not self._excluded_files(name)]
+        return [name for name in self._load_catalog().subfolders() if not self._excluded_files(name)]
     
     def sensors(self, pid):
         pid_folder = self._root + '/' + pid
-        sensor_files = glob.glob(pid_folder + "//**/*.sensor.csv", recursive=True)
-        return set(map(extract_id, sensor_files))
+        sensor_files = self._find_files(pid_folder + "//**/*.sensor.csv*")
+        return set(self._file_fields(sensor_files, 'sid', extract_id))
 
     def annotators(self, pid):
         pid_folder = self._root + '/' + pid
-        annotation_files = glob.glob(pid_folder + "/**/*.annotation.csv", recursive=True)
-        return set(map(extract_id, annotation_files))   
+        annotation_files = self._find_files(pid_folder + "/**/*.annotation.csv*")
+        return set(self._file_fields(annotation_files, 'sid', extract_id))
 
     def folder_size(self, pid):
         total = 0
@@ -1 +1 @@
-from . import importer, summarizer, visualizer
\ No newline at end of file
+from . import disk_cache, importer, exporter, summarizer, visualizer
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+
+Persistent on-disk cache of decoded data files
+
+Decoded sensor files are stored as `.npy` files and memory-mapped when they are loaded again, other dataframes (e.g. annotations) are pickled. Entries are keyed by the absolute path, size and modification time of the original file, so a changed file is decoded again. When the cache directory grows over its size budget, the least recently used entries are removed.
+
+"""
+
+import os
+import hashlib
+import threading
+import pandas as pd
+from . import exporter
+
+class DiskCache:
+	def __init__(self, cache_dir, max_bytes=10 * 1024 * 1024 * 1024):
+		self.cache_dir = os.path.abspath(cache_dir)
+		self.max_bytes = max_bytes
+		self._nbytes = None
+		os.makedirs(self.cache_dir, exist_ok=True)
+
+	def load(self, filepath, loader, kind='sensor', tag=''):
+		"""Return the cached copy of `filepath`, decode it with `loader(filepath)` and store it when it is not cached"""
+		entry = self._entry_path(filepath, kind, tag)
+		if os.path.exists(entry):
+			try:
+				df = self._read(entry)
+				# modification time of an entry is used as its last access time
+				os.utime(entry)
+				return df
+			except (OSError, ValueError, EOFError):
+				pass
+		df = loader(filepath)
+		self._write(df, entry)
+		return df
+
+	def _entry_path(self, filepath, kind, tag):
+		filepath = os.path.normpath(os.path.abspath(filepath))
+		stat = os.stat(filepath)
+		key = '|'.join([filepath, str(stat.st_size), str(stat.st_mtime_ns), kind, tag])
+		name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+		if kind == 'sensor':
+			return os.path.join(self.cache_dir, name + '.npy')
+		else:
+			return os.path.join(self.cache_dir, name + '.pkl')
+
+	def _read(self, entry):
+		if entry.endswith('.npy'):
+			from . import importer
+			return importer._import_sensor_file_npy(entry)
+		else:
+			return pd.read_pickle(entry)
+
+	def _write(self, df, entry):
+		if entry.endswith('.npy') and not _is_numeric_sensor_frame(df):
+			return
+		# files can be decoded by the prefetch threads of a process, see `prefetch`
+		tmp_entry = entry + '.' + str(os.getpid()) + '-' + str(threading.get_ident()) + '.tmp'
+		try:
+			if entry.endswith('.npy'):
+				exporter._export_sensor_file_npy(df, tmp_entry)
+			else:
+				df.to_pickle(tmp_entry)
+			os.replace(tmp_entry, entry)
+		except OSError:
+			if os.path.exists(tmp_entry):
+				os.remove(tmp_entry)
+			return
+		if self._nbytes is None:
+			self._nbytes = self._scan_size()
+		else:
+			self._nbytes = self._nbytes + os.path.getsize(entry)
+		if self._nbytes > self.max_bytes:
+			self.evict()
+
+	def _entries(self):
+		entries = []
+		for entry in os.scandir(self.cache_dir):
+			if entry.is_file() and (entry.name.endswith('.npy') or entry.name.endswith('.pkl')):
+				stat = entry.stat()
+				entries.append((stat.st_mtime, stat.st_size, entry.path))
+		return entries
+
+	def _scan_size(self):
+		return sum([size for _, size, _ in self._entries()])
+
+	def evict(self, max_bytes=None):
+		"""Remove least recently used entries until the cache is under 90% of its budget"""
+		if max_bytes is None:
+			max_bytes = self.max_bytes
+		entries = sorted(self._entries())
+		total = sum([size for _, size, _ in entries])
+		target = max_bytes * 0.9
+		for _, size, path in entries:
+			if total <= target:
+				break
+			try:
+				os.remove(path)
+				total = total - size
+			except OSError:
+				pass
+		self._nbytes = total
+		return total
+
+def _is_numeric_sensor_frame(df):
+	if df.shape[1] < 2 or df.iloc[:, 0].dtype.kind != 'M':
+		return False
+	return all([dtype.kind in 'iuf' for dtype in df.dtypes.values[1:]])
+
+# disabled until a cache directory is set with `configure`
+_disk_cache = None
+
+def configure(cache_dir, max_bytes=10 * 1024 * 1024 * 1024):
+	global _disk_cache
+	if cache_dir is None or cache_dir == "None":
+		_disk_cache = None
+	elif _disk_cache is None or _disk_cache.cache_dir != os.path.abspath(cache_dir):
+		_disk_cache = DiskCache(cache_dir, max_bytes=max_bytes)
+	else:
+		_disk_cache.max_bytes = max_bytes
+	return _disk_cache
+
+def get():
+	return _disk_cache
@@ -0,0 +1,243 @@
+import os
+import re
+import numpy as np
+import pandas as pd
+from .. import compression
+
+def export_sensor_file_mhealth(df, filepath, float_format='%.9f'):
+	"""Save a sensor dataframe, the storage format is chosen by the file extension
+
+	Supported extensions are `.csv` (mhealth text format, also compressed as `.csv.gz`, `.csv.bz2`, `.csv.xz` or `.csv.zst`), `.parquet`, `.feather` and `.npy` (int64 unix milliseconds plus one float field per value column). Parquet and feather need `pyarrow` to be installed.
+	"""
+	ext = os.path.splitext(filepath)[1].lower()
+	if ext in _binary_sensor_writers:
+		_binary_sensor_writers[ext](df, filepath)
+	else:
+		export_csv(df, filepath, float_format=float_format)
+	return filepath
+
+def export_csv(df, filepath, float_format=None, chunk_rows=65536, mode='w', header=True, datetime_unit=None):
+	"""Save a dataframe as csv, the file is identical to `df.to_csv(filepath, index=False, float_format=float_format)`
+
+	Timestamp, integer, boolean, plain string and `%.Nf` formatted float columns are formatted in bulk with numpy, `chunk_rows` rows at a time. Other dataframes are saved with `to_csv`.
+
+	mode: 'w' to overwrite the file or 'a' to append to it
+	datetime_unit: if provided (e.g. 'ms'), timestamps are always written with this precision instead of the finest precision needed by the column, so that appended parts of a file have the same format
+	"""
+	formatters = _column_formatters(df, float_format, datetime_unit)
+	if formatters is None:
+		if datetime_unit is not None:
+			df = df.copy()
+			for i in range(df.shape[1]):
+				if isinstance(df.dtypes.iloc[i], np.dtype) and df.dtypes.iloc[i].kind == 'M':
+					df[df.columns[i]] = _format_datetimes(df.iloc[:, i].values, datetime_unit)
+		if compression.extract_compression(filepath) is not None or mode != 'w':
+			with compression.open_file(filepath, mode) as f:
+				df.to_csv(f, index=False, header=header, float_format=float_format)
+		else:
+			df.to_csv(filepath, index=False, header=header, float_format=float_format)
+		return filepath
+	linesep = os.linesep.encode('ascii')
+	with compression.open_file(filepath, mode + 'b') as f:
+		if header:
+			f.write(','.join([str(name) for name in df.columns]).encode('utf-8') + linesep)
+		for start in range(0, df.shape[0], chunk_rows):
+			stop = min(start + chunk_rows, df.shape[0])
+			f.write(_join_cells([formatter(start, stop) for formatter in formatters], linesep))
+	return filepath
+
+def _export_sensor_file_parquet(df, filepath):
+	df.to_parquet(filepath, index=False)
+
+def _export_sensor_file_feather(df, filepath):
+	df.reset_index(drop=True).to_feather(filepath)
+
+def _export_sensor_file_npy(df, filepath):
+	names = [str(name) for name in df.columns]
+	dtype = [(names[0], '<i8')] + [(name, '<f8') for name in names[1:]]
+	arr = np.empty(df.shape[0], dtype=dtype)
+	arr[names[0]] = df.iloc[:, 0].values.astype('datetime64[ms]').astype(np.int64)
+	for i, name in enumerate(names[1:]):
+		arr[name] = df.iloc[:, i + 1].values.astype(np.float64)
+	# np.save appends .npy when it is missing, so write through a file object
+	with open(filepath, 'wb') as f:
+		np.save(f, arr)
+
+_binary_sensor_writers = {
+	'.parquet': _export_sensor_file_parquet,
+	'.feather': _export_sensor_file_feather,
+	'.npy': _export_sensor_file_npy
+}
+
+def _format_datetimes(values, unit):
+	text = np.datetime_as_string(values.astype('datetime64[' + unit + ']'), unit=unit).astype(object)
+	text[np.isnat(values)] = np.nan
+	return [value.replace('T', ' ') if isinstance(value, str) else value for value in text]
+
+_FIXED_FLOAT_FORMAT = re.compile('^%\\.([0-9]+)f$')
+# characters that need quoting, zeros are used as padding by the bulk writer
+_QUOTED_CHARS = re.compile('[,"\\r\\n\\x00]')
+_NS_PER_DAY = 24 * 3600 * 1000000000
+
+def _column_formatters(df, float_format, datetime_unit=None):
+	# one formatter per column or None when the dataframe is not supported by the bulk writer
+	if df.shape[1] < 2 or isinstance(df.columns, pd.MultiIndex):
+		return None
+	if any([_QUOTED_CHARS.search(str(name)) is not None for name in df.columns]):
+		return None
+	decimals = None
+	if float_format is not None:
+		match = _FIXED_FLOAT_FORMAT.match(float_format) if isinstance(float_format, str) else None
+		if match is None or int(match.group(1)) > 15:
+			return None
+		decimals = int(match.group(1))
+	formatters = []
+	for i in range(df.shape[1]):
+		col = df.iloc[:, i]
+		kind = col.dtype.kind if isinstance(col.dtype, np.dtype) else None
+		if kind == 'M':
+			formatter = _datetime_formatter(col.values, datetime_unit)
+		elif kind == 'f' and decimals is not None:
+			formatter = _float_formatter(col.values, decimals, float_format)
+		elif kind in ('i', 'u'):
+			formatter = _int_formatter(col.values)
+		elif kind == 'b':
+			formatter = _bool_formatter(col.values)
+		elif pd.api.types.is_string_dtype(col.dtype) and not isinstance(col.dtype, pd.CategoricalDtype):
+			formatter = _string_formatter(col.to_numpy(dtype=object))
+		else:
+			formatter = None
+		if formatter is None:
+			return None
+		formatters.append(formatter)
+	return formatters
+
+# a formatter returns the cells of rows [start, stop) as a uint8 matrix with one row of characters per cell,
+# unused characters are zeros and are dropped when the cells are joined
+
+_DATETIME_WIDTHS = {'D': 10, 's': 19, 'ms': 23, 'us': 26}
+
+def _datetime_formatter(values, unit=None):
+	# the same precision is used for the whole column, chosen like pandas does
+	values = values.astype('datetime64[ns]')
+	valid = ~np.isnat(values)
+	ns = values.view(np.int64)[valid]
+	if unit is not None:
+		if unit not in _DATETIME_WIDTHS:
+			return None
+		width = _DATETIME_WIDTHS[unit]
+	elif ns.size > 0 and np.all(ns % _NS_PER_DAY == 0):
+		unit, width = 'D', 10
+	elif np.any(ns % 1000 != 0):
+		return None
+	elif np.any(ns % 1000000 != 0):
+		unit, width = 'us', 26
+	elif np.any(ns % 1000000000 != 0):
+		unit, width = 'ms', 23
+	else:
+		unit, width = 's', 19
+	def format_cells(start, stop):
+		text = np.datetime_as_string(values[start:stop].astype('datetime64[' + unit + ']'), unit=unit)
+		cells = np.ascontiguousarray(text.astype('S' + str(width))).view(np.uint8).reshape(-1, width).copy()
+		if width > 10:
+			cells[:, 10] = ord(' ')
+		cells[~valid[start:stop], :] = 0
+		return cells
+	return format_cells
+
+def _float_formatter(values, decimals, float_format):
+	values = values.astype(np.float64)
+	scale = 10.0 ** decimals
+	def format_cells(start, stop):
+		v = values[start:stop]
+		finite = np.isfinite(v)
+		x = np.abs(np.where(finite, v, 0.0)) * scale
+		q = np.floor(x)
+		frac = x - q
+		# values too close to a rounding tie for the scaled value to decide, too large or infinite ones are formatted one by one
+		slow = (finite & ((np.abs(frac - 0.5) <= x * 5e-16) | (x >= 2.0 ** 52))) | np.isinf(v)
+		q = np.where(slow, 0, q + (frac > 0.5)).astype(np.int64)
+		cells = _digits(q, min_digits=decimals + 1, decimals=decimals, negative=np.signbit(v) & finite)
+		cells[~finite, :] = 0
+		slow_rows = np.nonzero(slow)[0]
+		if slow_rows.size > 0:
+			cells = _patch_cells(cells, slow_rows, [(float_format % value).encode('ascii') for value in v[slow_rows]])
+		return cells
+	return format_cells
+
+def _int_formatter(values):
+	if values.dtype.kind == 'u' and values.dtype.itemsize == 8 and np.any(values >= 2 ** 63):
+		return None
+	values = values.astype(np.int64)
+	if np.any(values == np.iinfo(np.int64).min):
+		return None
+	def format_cells(start, stop):
+		v = values[start:stop]
+		return _digits(np.abs(v), min_digits=1, decimals=0, negative=v < 0)
+	return format_cells
+
+def _bool_formatter(values):
+	def format_cells(start, stop):
+		text = np.where(values[start:stop], b'True', b'False').astype('S5')
+		return text.view(np.uint8).reshape(-1, 5)
+	return format_cells
+
+def _string_formatter(values):
+	if pd.api.types.infer_dtype(values, skipna=False) != 'string':
+		return None
+	if _QUOTED_CHARS.search(''.join(values)) is not None:
+		return None
+	def format_cells(start, stop):
+		text = np.array([value.encode('utf-8') for value in values[start:stop]], dtype='S')
+		if text.itemsize == 0:
+			return np.zeros((text.shape[0], 1), dtype=np.uint8)
+		return text.view(np.uint8).reshape(-1, text.itemsize)
+	return format_cells
+
+def _digits(q, min_digits, decimals, negative):
+	# right aligned decimal digits of non negative integers, with a decimal point before the last `decimals` digits and a minus sign
+	n_digits = np.ones(q.shape[0], dtype=np.int64)
+	for power in range(1, 19):
+		n_digits = n_digits + (q >= 10 ** power)
+	n_digits = np.maximum(n_digits, min_digits)
+	max_digits = int(n_digits.max()) if q.shape[0] > 0 else min_digits
+	point = 1 if decimals > 0 else 0
+	width = max_digits + point + 1
+	cells = np.zeros((q.shape[0], width), dtype=np.uint8)
+	rest = q.copy()
+	col = width - 1
+	for k in range(max_digits):
+		if point and k == decimals:
+			cells[:, col] = ord('.')
+			col = col - 1
+		if k < min_digits:
+			cells[:, col] = rest % 10 + ord('0')
+		else:
+			cells[:, col] = np.where(k < n_digits, rest % 10 + ord('0'), 0)
+		rest = rest // 10
+		col = col - 1
+	rows = np.nonzero(negative)[0]
+	cells[rows, width - 1 - point - n_digits[rows]] = ord('-')
+	return cells
+
+def _patch_cells(cells, rows, texts):
+	width = max(cells.shape[1], max([len(text) for text in texts]))
+	if width > cells.shape[1]:
+		cells = np.hstack((np.zeros((cells.shape[0], width - cells.shape[1]), dtype=np.uint8), cells))
+	for row, text in zip(rows, texts):
+		cells[row, :] = 0
+		if len(text) > 0:
+			cells[row, width - len(text):] = np.frombuffer(text, dtype=np.uint8)
+	return cells
+
+def _join_cells(columns, linesep):
+	# cells are separated by commas, rows end with `linesep` and the unused zero characters are dropped
+	n_rows = columns[0].shape[0]
+	comma = np.full((n_rows, 1), ord(','), dtype=np.uint8)
+	parts = []
+	for cells in columns:
+		parts.append(cells)
+		parts.append(comma)
+	parts[-1] = np.tile(np.frombuffer(linesep, dtype=np.uint8), (n_rows, 1))
+	chars = np.hstack(parts).ravel()
+	return chars[chars != 0].tobytes()
@@ -1,28 +1,307 @@
+import os
+import io
+import contextlib
+import numpy as np
 import pandas as pd
+from . import disk_cache
+from .. import compression
 
-def import_sensor_file_mhealth(filepath, verbose=False):
-	df = pd.read_csv(filepath, 
-		dtype=str,
-		error_bad_lines=False, 
-		warn_bad_lines=False, 
-		skip_blank_lines=True, 
-		low_memory=True,
-		comment='#')
+def import_sensor_file_mhealth(filepath, verbose=False, dtype=np.float64):
+	ext = os.path.splitext(filepath)[1].lower()
+	if ext in _binary_sensor_readers:
+		return _binary_sensor_readers[ext](filepath)
+	def load(filepath):
+		df, dropped_rows = _import_sensor_file_mhealth_csv(filepath, dtype=dtype)
+		if verbose:
+			print('na rows:' + str(dropped_rows))
+		return df
+	cache = disk_cache.get()
+	if cache is not None:
+		# NA rows are reported when the file is parsed, files served from the cache are not parsed
+		return cache.load(filepath, load, kind='sensor', tag=np.dtype(dtype).str)
+	return load(filepath)
+
+def import_sensor_file_mhealth_head(filepath, seconds, dtype=np.float64):
+	"""Import the first `seconds` of a sensor file without parsing the rest of it"""
+	return _import_sensor_file_mhealth_boundary(filepath, seconds, side='head', dtype=dtype)
+
+def import_sensor_file_mhealth_tail(filepath, seconds, dtype=np.float64):
+	"""Import the last `seconds` of a sensor file, csv files are read backwards from the end so the rest of the file is not parsed"""
+	return _import_sensor_file_mhealth_boundary(filepath, seconds, side='tail', dtype=dtype)
+
+_BOUNDARY_BLOCK_SIZE = 64 * 1024
+
+def _import_sensor_file_mhealth_boundary(filepath, seconds, side='head', dtype=np.float64):
+	duration = _seconds_to_timedelta(seconds)
+	ext = os.path.splitext(filepath)[1].lower()
+	if ext in _binary_sensor_readers:
+		df = _binary_sensor_readers[ext](filepath)
+		return _slice_boundary(df, duration, side)
+	if compression.extract_compression(filepath) is not None:
+		# compressed streams cannot be read from an offset
+		df = import_sensor_file_mhealth(filepath, dtype=dtype)
+		return _slice_boundary(df, duration, side)
+	file_size = os.path.getsize(filepath)
+	block_size = _BOUNDARY_BLOCK_SIZE
+	with open(filepath, 'rb') as f:
+		header = f.readline()
+		body_start = f.tell()
+		while True:
+			whole_file = block_size >= file_size - body_start
+			if whole_file:
+				f.seek(body_start)
+				body = f.read()
+			elif side == 'head':
+				f.seek(body_start)
+				body = f.read(block_size)
+				# drop the last partial line
+				body = body[:body.rfind(b'\n') + 1]
+			else:
+				f.seek(file_size - block_size)
+				body = f.read(block_size)
+				# drop the first partial line
+				body = body[body.find(b'\n') + 1:]
+			df, _ = _import_sensor_file_mhealth_csv(io.BytesIO(header + body), dtype=dtype)
+			if whole_file or _covers_boundary(df, duration, side):
+				return _slice_boundary(df, duration, side)
+			block_size = block_size * 4
+
+def iter_sensor_file_mhealth(filepath, block_duration=3600, overlap=0, dtype=np.float64, chunk_rows=100000):
+	"""Import a sensor file block by block so that files of any length can be processed in bounded memory
+
+	Yields (df, block_start, block_stop) for every block of `block_duration` seconds, blocks are aligned to multiples of `block_duration` since the unix epoch and blocks without data are skipped. df contains the samples in [block_start - overlap, block_stop + overlap), so adjacent blocks share `overlap` seconds of data on each side. block_start and block_stop are numpy datetime64[ms].
+	"""
+	duration = _seconds_to_timedelta(block_duration)
+	margin = _seconds_to_timedelta(overlap)
+	ext = os.path.splitext(filepath)[1].lower()
+	if ext in _binary_sensor_readers:
+		chunks = [_binary_sensor_readers[ext](filepath)]
+	else:
+		chunks = _iter_sensor_file_mhealth_csv(filepath, dtype=dtype, chunk_rows=chunk_rows)
+	buf = None
+	block_start = None
+	for chunk in chunks:
+		if chunk.shape[0] == 0:
+			continue
+		buf = chunk if buf is None else pd.concat([buf, chunk], axis=0)
+		if block_start is None:
+			block_start = _floor_timestamp(buf.iloc[0, 0], duration)
+		# a block is complete when the data passed its stop time plus the overlap
+		while buf.shape[0] > 0 and buf.iloc[-1, 0] >= block_start + duration + margin:
+			yield _block(buf, block_start, duration, margin)
+			block_start = _next_block_start(buf, block_start, duration)
+			buf = buf.loc[buf.iloc[:, 0].values >= block_start - margin, :]
+	if buf is None:
+		return
+	while buf.shape[0] > 0 and buf.iloc[-1, 0] >= block_start:
+		yield _block(buf, block_start, duration, margin)
+		block_start = _next_block_start(buf, block_start, duration)
+
+def _iter_sensor_file_mhealth_csv(filepath, dtype=np.float64, chunk_rows=100000):
+	with _open_csv(filepath) as f:
+		reader = pd.read_csv(f,
+			dtype=str,
+			error_bad_lines=False,
+			warn_bad_lines=False,
+			skip_blank_lines=True,
+			comment='#',
+			chunksize=chunk_rows)
+		for chunk in reader:
+			yield _validate_sensor_frame(chunk.iloc[:, 0:4], dtype=dtype)[0]
+
+def _floor_timestamp(ts, duration):
+	ms = np.datetime64(ts, 'ms').astype(np.int64)
+	step = duration.astype(np.int64)
+	return np.datetime64(int(ms - ms % step), 'ms')
+
+def _next_block_start(buf, block_start, duration):
+	next_start = block_start + duration
+	ts = buf.iloc[:, 0].values
+	later = ts[ts >= next_start]
+	if len(later) > 0 and later[0] >= next_start + duration:
+		# skip blocks without data
+		return _floor_timestamp(later[0], duration)
+	return next_start
+
+def _block(buf, block_start, duration, margin):
+	ts = buf.iloc[:, 0].values
+	mask = (ts >= block_start - margin) & (ts < block_start + duration + margin)
+	return buf.loc[mask, :], block_start, block_start + duration
+
+def _seconds_to_timedelta(seconds):
+	return np.timedelta64(int(float(seconds) * 1000), 'ms')
+
+def _covers_boundary(df, duration, side):
+	if df.shape[0] == 0:
+		return False
+	ts = df.iloc[:, 0].values
+	return ts[-1] - ts[0] >= duration
+
+def _slice_boundary(df, duration, side):
+	if df.shape[0] == 0:
+		return df
+	ts = df.iloc[:, 0].values
+	if side == 'head':
+		mask = ts <= ts[0] + duration
+	else:
+		mask = ts >= ts[-1] - duration
+	return df.loc[mask, :]
+
+def _import_sensor_file_mhealth_csv(filepath, dtype=np.float64):
+	"""Parse a mhealth sensor csv, returns the parsed dataframe and the number of dropped rows
+
+	Well formed files are parsed in a single typed pass, timestamps in the fixed `YYYY-MM-DD HH:MM:SS.fff` format are decoded directly into int64 milliseconds. Files that the typed pass cannot handle are parsed with the tolerant string based parser and only rows that fail validation go through `pd.to_datetime` and `pd.to_numeric`.
+	"""
+	try:
+		with _open_csv(filepath) as f:
+			df = pd.read_csv(f,
+				dtype={0: str},
+				skip_blank_lines=True,
+				comment='#')
+	except (pd.errors.ParserError, ValueError):
+		return _import_sensor_file_mhealth_tolerant(_rewind(filepath))
+	if df.shape[1] != 4:
+		return _import_sensor_file_mhealth_tolerant(_rewind(filepath))
+	return _validate_sensor_frame(df, dtype=dtype)
+
+def _validate_sensor_frame(df, dtype=np.float64):
+	# timestamps are decoded with the fast path, values that are not typed yet are converted with pd.to_numeric, rows failing either are dropped
+	n_rows = df.shape[0]
+	for col in df.columns[1:]:
+		if df[col].dtype.kind in 'iuf':
+			df[col] = df[col].astype(dtype, copy=False)
+		else:
+			df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype, copy=False)
+	ts, valid = mhealth_timestamps_to_milliseconds(df.iloc[:, 0].values)
+	if not np.all(valid):
+		fixed = pd.to_datetime(df.iloc[:, 0].values[~valid], errors='coerce', format='%Y-%m-%d %H:%M:%S.%f', exact=True)
+		fixed = fixed.values.astype('datetime64[ms]')
+		ts[~valid] = fixed.astype(np.int64)
+		valid[~valid] = ~np.isnat(fixed)
+	# same rows as `dropna`, infinite values are kept
+	valid &= ~np.any(np.isnan(df.iloc[:, 1:].values), axis=1)
+	df[df.columns[0]] = ts.view('datetime64[ms]')
+	if not np.all(valid):
+		df = df.loc[valid, :]
+	return df, n_rows - df.shape[0]
+
+def _import_sensor_file_mhealth_tolerant(filepath):
+	with _open_csv(filepath) as f:
+		df = pd.read_csv(f, 
+			dtype=str,
+			error_bad_lines=False, 
+			warn_bad_lines=False, 
+			skip_blank_lines=True, 
+			low_memory=True,
+			comment='#')
 	df.iloc[:,0] = pd.to_datetime(df.iloc[:,0], infer_datetime_format=True, errors='coerce', format='%Y-%m-%d %H:%M:%S.%f', exact=True).values.astype('datetime64[ms]')
 	df.iloc[:,1:4] = df.iloc[:,1:4].apply(pd.to_numeric, errors='coerce')
-	if verbose:
-		print('na rows:' + str(df.shape[0] - df.dropna().shape[0]))
+	n_rows = df.shape[0]
 	df = df.dropna()
-	return df
+	return df, n_rows - df.shape[0]
+
+@contextlib.contextmanager
+def _open_csv(filepath_or_buffer):
+	# compressed files are decompressed in a background thread while pandas parses them
+	if isinstance(filepath_or_buffer, str) and compression.extract_compression(filepath_or_buffer) is not None:
+		with compression.open_file(filepath_or_buffer, 'r') as f:
+			yield f
+	else:
+		yield filepath_or_buffer
+
+def _rewind(filepath_or_buffer):
+	if hasattr(filepath_or_buffer, 'seek'):
+		filepath_or_buffer.seek(0)
+	return filepath_or_buffer
+
+# positions of separators and digits in `YYYY-MM-DD HH:MM:SS.fff`
+_TIMESTAMP_SEPARATORS = {4: '-', 7: '-', 10: ' ', 13: ':', 16: ':', 19: '.'}
+_TIMESTAMP_DIGITS = [i for i in range(23) if i not in _TIMESTAMP_SEPARATORS]
+_DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def mhealth_timestamps_to_milliseconds(values):
+	"""Vectorized decoding of mhealth timestamp strings into unix milliseconds
+
+	Returns an int64 array of milliseconds and a boolean mask of rows that are in the exact `YYYY-MM-DD HH:MM:SS.fff` format. Invalid rows are set to 0 in the returned milliseconds.
+	"""
+	n = len(values)
+	if n == 0:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+	# one extra character so that longer strings are not silently truncated
+	codes = np.asarray(values, dtype='U24').view(np.uint32).reshape(n, 24)
+	valid = codes[:, 23] == 0
+	for pos, sep in _TIMESTAMP_SEPARATORS.items():
+		valid &= codes[:, pos] == ord(sep)
+	digits = codes[:, _TIMESTAMP_DIGITS].astype(np.int32) - ord('0')
+	valid &= np.all((digits >= 0) & (digits <= 9), axis=1)
+	digits[~valid] = 0
+
+	def number(start, stop):
+		result = np.zeros(n, dtype=np.int64)
+		for i in range(start, stop):
+			result = result * 10 + digits[:, i]
+		return result
+
+	year = number(0, 4)
+	month = number(4, 6)
+	day = number(6, 8)
+	hour = number(8, 10)
+	minute = number(10, 12)
+	second = number(12, 14)
+	millisecond = number(14, 17)
+	valid &= (month >= 1) & (month <= 12) & (hour < 24) & (minute < 60) & (second < 60)
+	leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+	days_in_month = _DAYS_IN_MONTH[np.clip(month, 1, 12) - 1] + (leap & (month == 2))
+	valid &= (day >= 1) & (day <= days_in_month)
+
+	# days from civil, http://howardhinnant.github.io/date_algorithms.html
+	y = year - (month <= 2)
+	era = np.floor_divide(y, 400)
+	yoe = y - era * 400
+	doy = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+	doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+	days = era * 146097 + doe - 719468
+	ms = ((days * 24 + hour) * 60 + minute) * 60000 + second * 1000 + millisecond
+	ms[~valid] = 0
+	return ms, valid
+
+def _import_sensor_file_parquet(filepath):
+	return pd.read_parquet(filepath)
+
+def _import_sensor_file_feather(filepath):
+	return pd.read_feather(filepath)
+
+def _import_sensor_file_npy(filepath):
+	# structured array with int64 unix milliseconds in the first field and
+	# one float field per value column, see exporter._export_sensor_file_npy
+	arr = np.load(filepath, mmap_mode='r')
+	names = arr.dtype.names
+	data = {names[0]: np.asarray(arr[names[0]]).view('datetime64[ms]')}
+	for name in names[1:]:
+		data[name] = np.asarray(arr[name])
+	return pd.DataFrame(data=data, columns=list(names))
+
+_binary_sensor_readers = {
+	'.parquet': _import_sensor_file_parquet,
+	'.feather': _import_sensor_file_feather,
+	'.npy': _import_sensor_file_npy
+}
 
 def import_annotation_file_mhealth(filepath, verbose=False):
-	df = pd.read_csv(filepath,
-		error_bad_lines=False, 
-		warn_bad_lines=False, 
-		skip_blank_lines=True,
-		low_memory=True,
-		parse_dates=[0,1,2],
-		infer_datetime_format=True,
-		comment='#')
+	cache = disk_cache.get()
+	if cache is not None:
+		return cache.load(filepath, _import_annotation_file_mhealth_csv, kind='annotation')
+	return _import_annotation_file_mhealth_csv(filepath)
+
+def _import_annotation_file_mhealth_csv(filepath):
+	with _open_csv(filepath) as f:
+		df = pd.read_csv(f,
+			error_bad_lines=False, 
+			warn_bad_lines=False, 
+			skip_blank_lines=True,
+			low_memory=True,
+			parse_dates=[0,1,2],
+			infer_datetime_format=True,
+			comment='#')
 	return df
 	
\ No newline at end of file
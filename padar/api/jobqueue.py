@@ -0,0 +1,178 @@
+"""
+
+File based job queue to process a dataset with workers on several hosts that share its storage
+
+`M.submit` writes a job to a queue folder: `job.json` with the script and its arguments, and one task file per group of files in `pending`, each file with its previous and next files. Workers started with `M.work` on any host claim a task by renaming it from `pending` to `claimed`, which only one worker can do, process its files, spill the results of the files to `results` and move the task to `done`. The status of every task (worker, attempts, time, error) is kept in `status`.
+
+A worker renews the modification time of its claim while it works. Claims that were not renewed for longer than the lease of the job are moved back to `pending` by other workers, so tasks of workers that died are processed again. Tasks that failed or whose claim expired `max_attempts` times are moved to `failed`.
+
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+
+JOB_FILENAME = 'job.json'
+QUEUE_VERSION = 1
+QUEUE_FOLDERS = ['pending', 'claimed', 'done', 'failed', 'status', 'results']
+
+def worker_id():
+	return socket.gethostname() + '-' + str(os.getpid())
+
+def create(queue_dir, job, tasks):
+	"""Create a queue with a job and its tasks, each task is a list of (entry index, file, prev_file, next_file)
+
+	Tasks are claimed in the order of `tasks`.
+	"""
+	queue_dir = os.path.abspath(queue_dir)
+	if os.path.exists(os.path.join(queue_dir, JOB_FILENAME)):
+		raise ValueError('Queue ' + queue_dir + ' already has a job')
+	for folder in QUEUE_FOLDERS:
+		os.makedirs(os.path.join(queue_dir, folder), exist_ok=True)
+	for rank, task in enumerate(tasks):
+		task_id = '%06d' % rank
+		_write_json(os.path.join(queue_dir, 'pending', task_id + '.json'), {'task_id': task_id, 'entries': [list(entry) for entry in task]})
+	# the job file is written last, workers only start when the queue is complete
+	_write_json(os.path.join(queue_dir, JOB_FILENAME), dict(job, version=QUEUE_VERSION, n_tasks=len(tasks)))
+	return queue_dir
+
+def load_job(queue_dir):
+	try:
+		job = _read_json(os.path.join(queue_dir, JOB_FILENAME))
+	except (OSError, ValueError):
+		raise ValueError('No job is found in queue ' + os.path.abspath(queue_dir))
+	if job.get('version') != QUEUE_VERSION:
+		raise ValueError('Queue ' + os.path.abspath(queue_dir) + ' was created by an incompatible version of padar')
+	return job
+
+def claim(queue_dir, worker):
+	"""Claim the next pending task, returns None if no task is pending"""
+	pending_dir = os.path.join(queue_dir, 'pending')
+	for name in sorted(os.listdir(pending_dir)):
+		if not name.endswith('.json'):
+			continue
+		task_id = name[:-len('.json')]
+		claim_path = os.path.join(queue_dir, 'claimed', task_id + '@' + worker + '.json')
+		try:
+			# the claim starts with a fresh modification time so that it is not taken as stale
+			os.utime(os.path.join(pending_dir, name), None)
+			os.rename(os.path.join(pending_dir, name), claim_path)
+		except OSError:
+			# claimed by another worker
+			continue
+		task = _read_json(claim_path)
+		task['claim_path'] = claim_path
+		status = read_status(queue_dir, task_id)
+		task['attempts'] = status.get('attempts', 0) + 1
+		write_status(queue_dir, task_id, state='running', worker=worker, attempts=task['attempts'], started=time.time())
+		return task
+	return None
+
+def renew(task):
+	"""Renew the claim of a task, returns False if the claim was lost"""
+	try:
+		os.utime(task['claim_path'], None)
+		return True
+	except OSError:
+		return False
+
+class Lease:
+	"""Renew the claim of a task in the background while it is processed"""
+	def __init__(self, task, interval):
+		self.task = task
+		self.interval = interval
+		self._stopped = threading.Event()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+
+	def _run(self):
+		while not self._stopped.wait(self.interval):
+			if not renew(self.task):
+				return
+
+	def __enter__(self):
+		self._thread.start()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self._stopped.set()
+		self._thread.join()
+
+def complete(queue_dir, task, **status):
+	"""Move a claimed task to `done`, returns False if the claim was lost before"""
+	try:
+		os.rename(task['claim_path'], os.path.join(queue_dir, 'done', task['task_id'] + '.json'))
+	except OSError:
+		return False
+	write_status(queue_dir, task['task_id'], state='done', attempts=task['attempts'], **status)
+	return True
+
+def fail(queue_dir, task, max_attempts, **status):
+	"""Move a claimed task back to `pending`, or to `failed` after `max_attempts` attempts, returns the new state"""
+	state = 'failed' if task['attempts'] >= max_attempts else 'pending'
+	try:
+		os.rename(task['claim_path'], os.path.join(queue_dir, state, task['task_id'] + '.json'))
+	except OSError:
+		return 'lost'
+	write_status(queue_dir, task['task_id'], state=state, attempts=task['attempts'], **status)
+	return state
+
+def requeue_stale(queue_dir, lease, max_attempts):
+	"""Move claims that were not renewed for `lease` seconds back to `pending`, or to `failed` after `max_attempts` attempts, returns their (task id, new state)"""
+	now = _storage_now(queue_dir)
+	claimed_dir = os.path.join(queue_dir, 'claimed')
+	requeued = []
+	for name in os.listdir(claimed_dir):
+		path = os.path.join(claimed_dir, name)
+		task_id = name.split('@')[0]
+		attempts = read_status(queue_dir, task_id).get('attempts', 0)
+		state = 'failed' if attempts >= max_attempts else 'pending'
+		try:
+			if now - os.stat(path).st_mtime <= lease:
+				continue
+			os.rename(path, os.path.join(queue_dir, state, task_id + '.json'))
+		except OSError:
+			continue
+		write_status(queue_dir, task_id, state=state, attempts=attempts, error='lease expired')
+		requeued.append((task_id, state))
+	return requeued
+
+def counts(queue_dir):
+	"""Number of tasks in every state"""
+	return dict([(state, len([name for name in os.listdir(os.path.join(queue_dir, state)) if name.endswith('.json')])) for state in ['pending', 'claimed', 'done', 'failed']])
+
+def result_path(queue_dir, entry_index):
+	return os.path.join(queue_dir, 'results', '%06d.pkl' % entry_index)
+
+def result_paths(queue_dir):
+	"""Spilled results in the order of their files"""
+	results_dir = os.path.join(queue_dir, 'results')
+	return [os.path.join(results_dir, name) for name in sorted(os.listdir(results_dir)) if name.endswith('.pkl')]
+
+def read_status(queue_dir, task_id):
+	try:
+		return _read_json(os.path.join(queue_dir, 'status', task_id + '.json'))
+	except (OSError, ValueError):
+		return {}
+
+def write_status(queue_dir, task_id, **status):
+	_write_json(os.path.join(queue_dir, 'status', task_id + '.json'), dict(status, task_id=task_id, updated=time.time()))
+
+def _storage_now(queue_dir):
+	# hosts may disagree on the time, claims are compared with the clock of the shared storage
+	path = os.path.join(queue_dir, '.clock')
+	with open(path, 'a'):
+		pass
+	os.utime(path, None)
+	return os.stat(path).st_mtime
+
+def _read_json(path):
+	with open(path, 'r') as f:
+		return json.load(f)
+
+def _write_json(path, content):
+	tmp_path = path + '.' + worker_id() + '.tmp'
+	with open(tmp_path, 'w') as f:
+		json.dump(content, f)
+	os.replace(tmp_path, path)
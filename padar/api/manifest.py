@@ -0,0 +1,66 @@
+"""
+
+Build manifests of derived files
+
+When a derived file is written by `M.process` in incremental mode, a hidden `.<filename>.manifest.json` is written next to it with the script, a hash of the script arguments, and the size and modification time of every input it was computed from (the data file, its adjacent files and side inputs such as `sessions.csv`). The derived file is up to date while all of them, and the derived file itself, are unchanged, and later incremental runs skip its data file.
+
+"""
+
+import os
+import json
+import hashlib
+
+MANIFEST_VERSION = 1
+
+def manifest_path(output):
+	folder, filename = os.path.split(os.path.abspath(output))
+	return os.path.join(folder, '.' + filename + '.manifest.json')
+
+def file_state(path):
+	"""Size and modification time of a file, None if it does not exist"""
+	try:
+		stat = os.stat(path)
+	except OSError:
+		return None
+	return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def kwargs_hash(kwargs):
+	content = json.dumps(kwargs, sort_keys=True, default=str)
+	return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+def input_states(inputs):
+	return [[os.path.abspath(path), file_state(path)] for path in inputs]
+
+def record(output, script, args_hash, inputs, states=None):
+	"""Write the manifest of `output` after it was computed from `inputs`
+
+	states: states of `inputs` from `input_states` taken before `output` was computed, so that inputs changed while it was computed make it out of date. If None, the current states are recorded.
+	"""
+	manifest = {
+		'version': MANIFEST_VERSION,
+		'script': script,
+		'kwargs_hash': args_hash,
+		'inputs': input_states(inputs) if states is None else states,
+		# the script may not write an output, e.g. for empty results
+		'output': file_state(output)
+	}
+	path = manifest_path(output)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+	with open(tmp_path, 'w') as f:
+		json.dump(manifest, f)
+	os.replace(tmp_path, path)
+	return path
+
+def is_up_to_date(output, script, args_hash, inputs):
+	"""Whether `output` was computed by `script` with the same arguments from the current versions of `inputs`"""
+	try:
+		with open(manifest_path(output), 'r') as f:
+			manifest = json.load(f)
+	except (OSError, ValueError):
+		return False
+	return manifest.get('version') == MANIFEST_VERSION and \
+		manifest.get('script') == script and \
+		manifest.get('kwargs_hash') == args_hash and \
+		manifest.get('output') == file_state(output) and \
+		manifest.get('inputs') == input_states(inputs)
@@ -0,0 +1,117 @@
+"""
+
+Read-ahead of data files
+
+A prefetcher decodes the next files a process is going to load in background threads while the current file is computed, so reads from slow storage overlap with computation. At most `depth` files are loaded ahead, and the memory they take is bounded by `max_bytes`: a file is counted by its size on disk while it is loaded and by the size of its decoded dataframe when it is ready. Files that do not fit are loaded when they are needed, as without a prefetcher.
+
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class Prefetcher:
+	def __init__(self, loader, depth=2, max_bytes=256 * 1024 * 1024, threads=1):
+		self.loader = loader
+		self.depth = depth
+		self.max_bytes = max_bytes
+		self.threads = threads
+		self.hits = 0
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self._executor = None
+
+	def configure(self, depth, max_bytes):
+		self.depth = depth
+		self.max_bytes = max_bytes
+		if depth <= 0:
+			self.clear()
+
+	def schedule(self, filepaths, current=None):
+		"""Start loading the first `depth` of the upcoming `filepaths` in order, loaded files that are not upcoming any more are dropped
+
+		current: file that is about to be loaded, it is kept if it was loaded ahead before
+		"""
+		if current is not None:
+			current = os.path.normpath(os.path.abspath(current))
+		upcoming = []
+		for filepath in filepaths:
+			filepath = os.path.normpath(os.path.abspath(filepath))
+			if filepath not in upcoming:
+				upcoming.append(filepath)
+			if len(upcoming) >= self.depth:
+				break
+		with self._lock:
+			for filepath in list(self._entries.keys()):
+				if filepath not in upcoming and filepath != current:
+					self._entries.pop(filepath).future.cancel()
+			for filepath in upcoming:
+				if filepath in self._entries:
+					continue
+				try:
+					nbytes = os.path.getsize(filepath)
+				except OSError:
+					continue
+				if self._nbytes() + nbytes > self.max_bytes:
+					# files are loaded in order, later files wait until earlier ones are taken
+					break
+				entry = _Entry(nbytes)
+				entry.future = self._get_executor().submit(self._load, filepath, entry)
+				self._entries[filepath] = entry
+
+	def take(self, filepath):
+		"""Return the dataframe of `filepath` and forget it, None if it was not scheduled or could not be loaded"""
+		filepath = os.path.normpath(os.path.abspath(filepath))
+		with self._lock:
+			entry = self._entries.pop(filepath, None)
+		return self._result(entry)
+
+	def peek(self, filepath):
+		"""Like `take` but the dataframe is kept for a later `take`"""
+		filepath = os.path.normpath(os.path.abspath(filepath))
+		with self._lock:
+			entry = self._entries.get(filepath, None)
+		return self._result(entry)
+
+	def clear(self):
+		with self._lock:
+			for entry in self._entries.values():
+				entry.future.cancel()
+			self._entries.clear()
+
+	def close(self):
+		self.clear()
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
+
+	def _result(self, entry):
+		if entry is None:
+			return None
+		try:
+			df = entry.future.result()
+		except Exception:
+			# the error is raised again when the file is loaded without the prefetcher
+			return None
+		self.hits = self.hits + 1
+		return df
+
+	def _load(self, filepath, entry):
+		df = self.loader(filepath)
+		# the decoded size replaces the size on disk
+		entry.nbytes = int(df.memory_usage(index=True, deep=False).sum())
+		return df
+
+	def _nbytes(self):
+		return sum([entry.nbytes for entry in self._entries.values()])
+
+	def _get_executor(self):
+		if self._executor is None:
+			self._executor = ThreadPoolExecutor(max_workers=max(1, self.threads))
+		return self._executor
+
+class _Entry:
+	def __init__(self, nbytes):
+		self.nbytes = nbytes
+		self.future = None
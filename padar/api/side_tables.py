@@ -0,0 +1,64 @@
+"""
+
+Process-wide cache of side tables
+
+Side tables are the small csv files used for every data file of a run, such as `sessions.csv`, offset mappings, static chunks, location mappings and orientation fixes. Each process parses a side table once while the file is unchanged (same path, size and modification time) and builds a hash index of the rows for every set of key columns it is looked up by, e.g. (pid) or (pid, sid), so the lookup of each data file is a dict access. Tables are shared between callers and must be treated as read-only.
+
+"""
+
+import os
+from collections import OrderedDict
+import pandas as pd
+
+_MAX_TABLES = 32
+_tables = OrderedDict()
+
+class SideTable:
+	def __init__(self, table):
+		self.table = table
+		self._indexes = {}
+
+	def select(self, by):
+		"""Rows whose key columns equal the values of `by`, a dict of column name or position to value
+
+		The rows are a copy in the order of the table, an empty table with the same columns if no row matches.
+		"""
+		columns = tuple([self.table.columns[column] if isinstance(column, int) else column for column in by.keys()])
+		values = tuple(by.values())
+		positions = self._index(columns).get(values[0] if len(values) == 1 else values)
+		if positions is None:
+			return self.table.iloc[0:0, :].copy()
+		return self.table.iloc[positions, :]
+
+	def _index(self, columns):
+		if columns not in self._indexes:
+			groups = self.table.groupby(list(columns) if len(columns) > 1 else columns[0], sort=False)
+			self._indexes[columns] = dict(groups.indices)
+		return self._indexes[columns]
+
+def load(filepath, parse_dates=None):
+	"""Return the `SideTable` of a csv file, it is parsed once per process while the file is unchanged"""
+	filepath = os.path.normpath(os.path.abspath(filepath))
+	stat = os.stat(filepath)
+	key = (filepath, stat.st_size, stat.st_mtime_ns, tuple(parse_dates) if parse_dates is not None else None)
+	if key in _tables:
+		_tables.move_to_end(key)
+		return _tables[key]
+	if parse_dates is None:
+		table = pd.read_csv(filepath)
+	else:
+		table = pd.read_csv(filepath, parse_dates=parse_dates, infer_datetime_format=True)
+	# older versions of the file are dropped
+	for old_key in [old_key for old_key in _tables.keys() if old_key[0] == filepath and old_key[3] == key[3]]:
+		del _tables[old_key]
+	_tables[key] = SideTable(table)
+	while len(_tables) > _MAX_TABLES:
+		_tables.popitem(last=False)
+	return _tables[key]
+
+def select(filepath, by, parse_dates=None):
+	"""Rows of the side table at `filepath` whose key columns equal the values of `by`, see `SideTable.select`"""
+	return load(filepath, parse_dates=parse_dates).select(by)
+
+def clear():
+	_tables.clear()
@@ -0,0 +1,133 @@
+"""
+
+Per-file metadata sidecars
+
+Indexing a data file writes a hidden `.<filename>.meta.json` next to it with statistics that otherwise need the whole file to be read: the number of lines and data rows, rows with missing values, the first and last timestamps, and for sensor files the sampling rate and the min/max values with their counts. The size and modification time of the data file are recorded too, a sidecar is only used while they still match the data file.
+
+"""
+
+import os
+import io
+import json
+import numpy as np
+import pandas as pd
+from . import compression
+from . import utils
+from .helpers import importer
+
+SIDECAR_VERSION = 1
+
+def sidecar_path(filepath):
+	folder, filename = os.path.split(os.path.abspath(filepath))
+	return os.path.join(folder, '.' + filename + '.meta.json')
+
+def read(filepath):
+	"""Return the metadata of `filepath` from its sidecar, or None if there is no fresh sidecar"""
+	try:
+		with open(sidecar_path(filepath), 'r') as f:
+			meta = json.load(f)
+		stat = os.stat(filepath)
+	except (OSError, ValueError):
+		return None
+	if meta.get('version') != SIDECAR_VERSION or meta.get('size') != stat.st_size or meta.get('mtime_ns') != stat.st_mtime_ns:
+		return None
+	return meta
+
+def write(filepath, meta):
+	path = sidecar_path(filepath)
+	tmp_path = path + '.' + str(os.getpid()) + '.tmp'
+	with open(tmp_path, 'w') as f:
+		json.dump(meta, f)
+	os.replace(tmp_path, path)
+	return path
+
+def index_file(filepath, force=False):
+	"""Write the sidecar of `filepath` when it is missing or stale and return its metadata"""
+	if not force:
+		meta = read(filepath)
+		if meta is not None:
+			return meta
+	meta = build(filepath)
+	write(filepath, meta)
+	return meta
+
+def build(filepath, content=None):
+	"""Metadata of `filepath`, `content` is the decompressed content of the file if it was already read"""
+	stat = os.stat(filepath)
+	if content is None:
+		with compression.open_file(filepath, 'rb') as f:
+			content = f.read()
+	file_type = utils.extract_file_type(filepath)
+	meta = {
+		'version': SIDECAR_VERSION,
+		'size': stat.st_size,
+		'mtime_ns': stat.st_mtime_ns,
+		'file_type': file_type,
+		'lines': content.count(b'\n') + (1 if len(content) > 0 and not content.endswith(b'\n') else 0),
+	}
+	raw = pd.read_csv(io.BytesIO(content), dtype=str)
+	meta['rows'] = int(raw.shape[0])
+	meta['na_rows'] = int(raw.isna().any(axis=1).sum())
+	if file_type == 'sensor':
+		meta.update(_sensor_stats(raw))
+	elif file_type == 'annotation' or file_type == 'event':
+		meta.update(_time_bounds(raw, n_time_cols=3))
+	return meta
+
+def _sensor_stats(raw):
+	df, _ = importer._validate_sensor_frame(raw.copy())
+	stats = _time_bounds(df, n_time_cols=1)
+	if df.empty:
+		stats.update(sr=None, max_g=None, min_g=None, max_g_count=None, min_g_count=None)
+		return stats
+	values = df.iloc[:, 1:].values
+	max_value = np.amax(values)
+	min_value = np.amin(values)
+	stats.update(
+		sr=_json_number(utils._sampling_rate(df)),
+		max_g=float(max_value),
+		min_g=float(min_value),
+		max_g_count=int(np.sum(values == max_value)),
+		min_g_count=int(np.sum(values == min_value))
+	)
+	return stats
+
+def _time_bounds(df, n_time_cols=1):
+	# first and last values of the leading timestamp columns
+	first_times = []
+	last_times = []
+	for i in range(min(n_time_cols, df.shape[1])):
+		ts = df.iloc[:, i]
+		if ts.dtype.kind != 'M':
+			ts = pd.to_datetime(ts, errors='coerce', format='%Y-%m-%d %H:%M:%S.%f')
+		first_times.append(_format_time(ts.iloc[0]) if ts.shape[0] > 0 else None)
+		last_times.append(_format_time(ts.iloc[-1]) if ts.shape[0] > 0 else None)
+	return {'first_times': first_times, 'last_times': last_times}
+
+def _format_time(ts):
+	if pd.isnull(ts):
+		return None
+	return pd.Timestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+def _json_number(value):
+	if value is None:
+		return None
+	value = float(value)
+	return int(value) if value.is_integer() else value
+
+def time_range(filepath):
+	"""First and last timestamps of a sensor file as numpy datetime64[ms], from its fresh sidecar or otherwise from the first and last rows of the file"""
+	meta = read(filepath)
+	if meta is not None and len(meta.get('first_times', [])) > 0:
+		return parse_time(meta['first_times'][0]), parse_time(meta['last_times'][0])
+	head = importer.import_sensor_file_mhealth_head(filepath, 0)
+	tail = importer.import_sensor_file_mhealth_tail(filepath, 0)
+	if head.empty or tail.empty:
+		return parse_time(None), parse_time(None)
+	return np.datetime64(head.iloc[0, 0], 'ms'), np.datetime64(tail.iloc[-1, 0], 'ms')
+
+def parse_time(value):
+	"""Convert a timestamp string of a sidecar back to numpy datetime64[ms]"""
+	if value is None:
+		return np.datetime64('NaT', 'ms')
+	return np.datetime64(pd.Timestamp(value).to_datetime64(), 'ms')
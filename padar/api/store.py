@@ -0,0 +1,146 @@
+"""
+
+Memory-mapped time indexed store of the hourly sensor files of one participant and sensor
+
+A store folder contains
+
+	timestamps.bin: int64 unix milliseconds of every sample
+	values.bin: float64 matrix of the sample values (one column per value column)
+	hours.bin: sparse index with the start time (unix milliseconds) of every hour and the row offset of its first sample
+	store.json: column names, the number of rows and the first and last timestamps (unix milliseconds) of every file
+
+Slicing a store by time uses binary search on the hour index and the timestamps and returns views of the memory-mapped arrays, so no data is copied.
+
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from .helpers import importer
+
+_MS_PER_HOUR = 3600 * 1000
+
+class SensorStore:
+	def __init__(self, timestamps, values, columns, hours=None, offsets=None, files=None):
+		self._timestamps = timestamps
+		self._values = values
+		self.columns = list(columns)
+		# (file, first ms, last ms) of the files in the store
+		self.files = files
+		if hours is None:
+			hours, offsets = _build_hour_index(timestamps)
+		self._hours = hours
+		self._offsets = offsets
+
+	@classmethod
+	def build(cls, files, store_dir, dtype=np.float64):
+		"""Combine sorted hourly sensor files into a store folder and open it"""
+		os.makedirs(store_dir, exist_ok=True)
+		columns = None
+		n_rows = 0
+		last_ts = None
+		file_ranges = []
+		with open(os.path.join(store_dir, 'timestamps.bin'), 'wb') as ts_f, open(os.path.join(store_dir, 'values.bin'), 'wb') as values_f:
+			for file in files:
+				df = importer.import_sensor_file_mhealth(file, dtype=dtype)
+				if df.empty:
+					continue
+				if columns is None:
+					columns = [str(col) for col in df.columns]
+				ts = df.iloc[:, 0].values.astype('datetime64[ms]').astype(np.int64)
+				if last_ts is not None and ts[0] < last_ts:
+					raise ValueError('Files should be sorted by time and not overlap: ' + file)
+				last_ts = ts[-1]
+				file_ranges.append((os.path.abspath(file), int(ts[0]), int(ts[-1])))
+				ts_f.write(np.ascontiguousarray(ts).tobytes())
+				values_f.write(np.ascontiguousarray(df.iloc[:, 1:].values, dtype=np.float64).tobytes())
+				n_rows = n_rows + df.shape[0]
+		if columns is None:
+			raise ValueError('No data is found in the provided files')
+		timestamps = np.memmap(os.path.join(store_dir, 'timestamps.bin'), dtype=np.int64, mode='r', shape=(n_rows,))
+		hours, offsets = _build_hour_index(timestamps)
+		np.vstack((hours, offsets)).T.astype(np.int64).tofile(os.path.join(store_dir, 'hours.bin'))
+		with open(os.path.join(store_dir, 'store.json'), 'w') as f:
+			json.dump({'columns': columns, 'rows': n_rows, 'files': file_ranges}, f)
+		return cls.open(store_dir)
+
+	@classmethod
+	def open(cls, store_dir):
+		with open(os.path.join(store_dir, 'store.json'), 'r') as f:
+			meta = json.load(f)
+		n_rows = meta['rows']
+		n_cols = len(meta['columns']) - 1
+		timestamps = np.memmap(os.path.join(store_dir, 'timestamps.bin'), dtype=np.int64, mode='r', shape=(n_rows,))
+		values = np.memmap(os.path.join(store_dir, 'values.bin'), dtype=np.float64, mode='r', shape=(n_rows, n_cols))
+		hour_index = np.fromfile(os.path.join(store_dir, 'hours.bin'), dtype=np.int64).reshape(-1, 2)
+		files = [tuple(file_range) for file_range in meta['files']] if 'files' in meta else None
+		return cls(timestamps, values, meta['columns'], hours=hour_index[:, 0], offsets=hour_index[:, 1], files=files)
+
+	@property
+	def timestamps(self):
+		"""timestamps in numpy datetime64[ms] (a view, not a copy)"""
+		return self._timestamps.view('datetime64[ms]')
+
+	@property
+	def values(self):
+		return self._values
+
+	@property
+	def shape(self):
+		return (self._timestamps.shape[0], len(self.columns))
+
+	@property
+	def empty(self):
+		return self._timestamps.shape[0] == 0
+
+	@property
+	def start_time(self):
+		return self.timestamps[0]
+
+	@property
+	def stop_time(self):
+		return self.timestamps[-1]
+
+	def slice(self, start_time=None, stop_time=None):
+		"""Return a view of the samples in [start_time, stop_time)"""
+		start = 0 if start_time is None else self._search(to_milliseconds(start_time))
+		stop = self._timestamps.shape[0] if stop_time is None else self._search(to_milliseconds(stop_time))
+		stop = max(start, stop)
+		hours, offsets = _slice_hour_index(self._hours, self._offsets, start, stop)
+		return SensorStore(self._timestamps[start:stop], self._values[start:stop], self.columns, hours=hours, offsets=offsets)
+
+	def to_dataframe(self):
+		df = pd.DataFrame(data=np.array(self._values), columns=self.columns[1:])
+		df.insert(0, self.columns[0], np.array(self.timestamps))
+		return df
+
+	def _search(self, ms):
+		# narrow down to one hour with the sparse index, then search inside the hour
+		i = np.searchsorted(self._hours, ms - ms % _MS_PER_HOUR, side='left')
+		if i >= len(self._hours):
+			return self._timestamps.shape[0]
+		lo = self._offsets[i]
+		hi = self._offsets[i + 1] if i + 1 < len(self._offsets) else self._timestamps.shape[0]
+		return lo + int(np.searchsorted(self._timestamps[lo:hi], ms, side='left'))
+
+def to_milliseconds(t):
+	if isinstance(t, (int, np.integer)):
+		return int(t)
+	return int(np.datetime64(pd.Timestamp(t).to_datetime64(), 'ms').astype(np.int64))
+
+def _build_hour_index(timestamps):
+	if len(timestamps) == 0:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	hours = np.asarray(timestamps) // _MS_PER_HOUR * _MS_PER_HOUR
+	starts = np.concatenate(([0], np.nonzero(np.diff(hours))[0] + 1))
+	return hours[starts].astype(np.int64), starts.astype(np.int64)
+
+def _slice_hour_index(hours, offsets, start, stop):
+	if stop <= start:
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	first = np.searchsorted(offsets, start, side='right') - 1
+	last = np.searchsorted(offsets, stop, side='left')
+	new_offsets = offsets[first:last] - start
+	new_offsets[0] = 0
+	return hours[first:last], new_offsets
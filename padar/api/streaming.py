@@ -0,0 +1,92 @@
+"""
+
+Fixed-size buffers of live sensor samples
+
+A ring buffer keeps the latest `capacity` samples of a sensor in preallocated arrays, one int64 array of unix milliseconds and one float64 matrix of values. New samples overwrite the oldest ones, so the memory and the cost of reading a time range (binary search plus a copy of the range) do not grow with the length of the stream.
+
+"""
+
+import numpy as np
+
+class RingBuffer:
+	def __init__(self, capacity, n_cols):
+		self.capacity = int(capacity)
+		self._ts = np.zeros(self.capacity, dtype=np.int64)
+		self._values = np.zeros((self.capacity, n_cols), dtype=np.float64)
+		# physical index of the oldest sample
+		self._head = 0
+		self._size = 0
+
+	def __len__(self):
+		return self._size
+
+	@property
+	def first_ms(self):
+		return int(self._ts[self._head]) if self._size > 0 else None
+
+	@property
+	def last_ms(self):
+		return int(self._ts[(self._head + self._size - 1) % self.capacity]) if self._size > 0 else None
+
+	def push(self, ts, values):
+		"""Append samples sorted by time, returns the timestamps of the samples that were overwritten
+
+		ts: unix milliseconds or datetime64 timestamps
+		values: one row of values per timestamp
+		"""
+		ts = to_milliseconds(ts)
+		values = np.asarray(values, dtype=np.float64).reshape(ts.shape[0], self._values.shape[1])
+		if ts.shape[0] == 0:
+			return ts
+		if self._size > 0 and ts[0] < self.last_ms:
+			raise ValueError('Samples should be pushed in the order of time')
+		overwritten = [ts[:max(0, ts.shape[0] - self.capacity)]]
+		# only the last `capacity` samples are kept
+		ts = ts[-self.capacity:]
+		values = values[-self.capacity:]
+		n = ts.shape[0]
+		n_dropped = max(0, self._size + n - self.capacity)
+		if n_dropped > 0:
+			overwritten.insert(0, self._read_range(0, n_dropped)[0])
+		tail = (self._head + self._size) % self.capacity
+		first = min(n, self.capacity - tail)
+		self._ts[tail:tail + first] = ts[:first]
+		self._values[tail:tail + first] = values[:first]
+		self._ts[:n - first] = ts[first:]
+		self._values[:n - first] = values[first:]
+		self._head = (self._head + n_dropped) % self.capacity
+		self._size = min(self.capacity, self._size + n)
+		return np.concatenate(overwritten)
+
+	def read(self, start_ms=None, stop_ms=None):
+		"""Copy of the timestamps and values of the samples in [start_ms, stop_ms)"""
+		if self._size == 0:
+			return self._ts[:0].copy(), self._values[:0].copy()
+		start = 0 if start_ms is None else self._search(int(start_ms))
+		stop = self._size if stop_ms is None else self._search(int(stop_ms))
+		return self._read_range(start, max(start, stop))
+
+	def clear(self):
+		self._head = 0
+		self._size = 0
+
+	def _search(self, ms):
+		# logical position of the first sample at or after `ms`, the samples are two sorted segments
+		first_size = min(self._size, self.capacity - self._head)
+		i = int(np.searchsorted(self._ts[self._head:self._head + first_size], ms, side='left'))
+		if i < first_size:
+			return i
+		return first_size + int(np.searchsorted(self._ts[:self._size - first_size], ms, side='left'))
+
+	def _read_range(self, start, stop):
+		indices = (self._head + np.arange(start, stop)) % self.capacity
+		return self._ts[indices], self._values[indices]
+
+def to_milliseconds(ts):
+	"""int64 unix milliseconds of an array of timestamps"""
+	ts = np.asarray(ts)
+	if ts.dtype == object:
+		ts = ts.astype('datetime64[ms]')
+	if np.issubdtype(ts.dtype, np.datetime64):
+		return ts.astype('datetime64[ms]').astype(np.int64)
+	return ts.astype(np.int64)
@@ -2,9 +2,20 @@ import os
 import pandas as pd
 import numpy as np
 import re
+from .store import SensorStore
+from . import compression
+from . import sidecar
+from . import side_tables
+
+# csv files can also be compressed, e.g. `.csv.gz`
+SENSOR_FILE_EXTENSIONS = ['.csv', '.parquet', '.feather', '.npy'] + ['.csv' + ext for ext in compression.COMPRESSION_EXTENSIONS]
+
+def extract_file_extension(abspath):
+	stripped = compression.strip_compression_extension(abspath)
+	return (os.path.splitext(stripped)[1] + abspath[len(stripped):]).lower()
 
 def extract_file_type(abspath):
-    return os.path.basename(abspath).split('.')[-2].lower().strip()
+    return os.path.basename(compression.strip_compression_extension(abspath)).split('.')[-2].lower().strip()
 
 def extract_date(abspath):
         return re.search('[0-9]{4}-[0-9]{2}-[0-9]{2}', os.path.basename(abspath).split('.')[2]).group(0)
@@ -65,14 +76,20 @@ def extract_pid(abspath):
 		return os.path.basename(os.path.dirname(abspath))
 
 def sampling_rate(file):
-	df = pd.read_csv(file, parse_dates=[0], infer_datetime_format=True)
+	meta = sidecar.read(file)
+	if meta is not None and 'sr' in meta:
+		return meta['sr']
+	df = _read_csv(file, parse_dates=[0], infer_datetime_format=True)
 	return _sampling_rate(df)
 
 def clip(file, start_time=None, stop_time=None):
-	df = pd.read_csv(file, parse_dates=[0], infer_datetime_format=True)
+	df = _read_csv(file, parse_dates=[0], infer_datetime_format=True)
 	return clip_dataframe(df, start_time, stop_time)
 
 def clip_dataframe(df, start_time=None, stop_time=None):
+	if isinstance(df, SensorStore):
+		# a view of the store, nothing is copied
+		return df.slice(start_time, stop_time)
 	if start_time is None:
 		start_time = df.iloc[0, 0].to_datetime64().astype('datetime64[ms]')
 	if stop_time is None:
@@ -85,16 +102,26 @@ def clip_dataframe(df, start_time=None, stop_time=None):
 	return clipped
 
 def _sampling_rate(df):
-	ts = df.set_index(df.columns[0])
-	minute_counts = ts.groupby(pd.TimeGrouper(freq='1S'))[df.columns[1]].count().values
+	# number of samples with a value in each second
+	ts = df.iloc[:, 0].values.astype('datetime64[ms]')
+	valid = ~np.isnat(ts)
+	seconds = ts[valid].astype(np.int64) // 1000
+	minute_counts = np.bincount(seconds - seconds.min(), weights=df.iloc[:, 1].notnull().values[valid]).astype(np.int64)
 	# drop the first and last window
 	minute_counts = minute_counts[1:-1]
 	# only choose windows that have more than one samples
 	minute_counts = minute_counts[minute_counts > 0]
 	return major_element(minute_counts)
 
+def _read_csv(file, **kwargs):
+	with compression.open_file(file, 'r') as f:
+		return pd.read_csv(f, **kwargs)
+
 def num_of_rows(file):
-	with open(file, 'r') as f:
+	meta = sidecar.read(file)
+	if meta is not None:
+		return meta['lines']
+	with compression.open_file(file, 'r') as f:
 		lines = len(f.readlines())
 	return lines
 
@@ -108,7 +135,7 @@ def validate_folder_structure(file):
 
 def validate_filename(file):
 	filename = os.path.basename(file)
-	pattern = '([A-Za-z0-9]+\-){1,2}[A-Za-z0-9]+\.[A-Za-z0-9]+\-[A-Za-z0-9]+\.[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{3}-[MP]{1}[0-9]{4}\.[a-z]+\.csv'
+	pattern = '([A-Za-z0-9]+\-){1,2}[A-Za-z0-9]+\.[A-Za-z0-9]+\-[A-Za-z0-9]+\.[0-9]{4}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{2}-[0-9]{3}-[MP]{1}[0-9]{4}\.[a-z]+\.(csv|parquet|feather|npy)(\.(gz|bz2|xz|zst))?'
 	if re.search(pattern, file) is not None:
 		return "True"
 	else:
@@ -116,8 +143,11 @@ def validate_filename(file):
 
 def validate_csv_header(file):
 	file_type = extract_file_type(os.path.abspath(file))
-	with open(file, 'r') as f:
+	with compression.open_file(file, 'r') as f:
 		header = f.readline().strip()
+	return _validate_header(header, file_type)
+
+def _validate_header(header, file_type):
 	tokens = header.split(',')
 	if len(tokens) < 2:
 		return "Header has less than 2 columns"
@@ -138,11 +168,14 @@ def validate_csv_header(file):
 		return "True"
 
 def na_rows(file):
+	meta = sidecar.read(file)
+	if meta is not None:
+		return meta['na_rows']
 	file_type = extract_file_type(file)
 	if file_type == 'sensor':
-		df = pd.read_csv(file, parse_dates=[0], infer_datetime_format=True)
+		df = _read_csv(file, parse_dates=[0], infer_datetime_format=True)
 	elif file_type == 'annotation' or file_type == 'event':
-		df = pd.read_csv(file, parse_dates=[0,1,2], infer_datetime_format=True)
+		df = _read_csv(file, parse_dates=[0,1,2], infer_datetime_format=True)
 	return df.shape[0] - df.dropna().shape[0]
 
 def sensor_stat(file):
@@ -157,8 +190,15 @@ def sensor_stat(file):
 		}
 	if file_type != 'sensor':
 		return pd.DataFrame(result, index=[0])
+	meta = sidecar.read(file)
+	if meta is not None:
+		result['lines'] = meta['rows']
+		for key in ['sr', 'max_g', 'min_g', 'max_g_count', 'min_g_count']:
+			if meta[key] is not None:
+				result[key] = meta[key]
+		return pd.DataFrame(result, index=[0])
 	try:
-		df = pd.read_csv(file, parse_dates=[0], infer_datetime_format=True)
+		df = _read_csv(file, parse_dates=[0], infer_datetime_format=True)
 		result['lines'] = int(df.shape[0])
 		result['sr'] = _sampling_rate(df)
 		max_value = np.amax(df.values[:,1:])
@@ -176,12 +216,54 @@ def sensor_stat(file):
 			result[key] = 'ParserError'
 	return pd.DataFrame(result, index=[0])
 
+def file_summary(file):
+	"""Size, rows, header validity, NA rows and for sensor files the sampling rate and min/max g of a file, computed with one read of the file
+
+	Statistics are taken from the sidecar of the file when it is fresh, then only the header is read.
+	"""
+	file_type = extract_file_type(file)
+	result = {
+		'file_size': os.path.getsize(file) / 1024.0,
+		'num_of_rows': np.nan,
+		'mh_folder_structure': validate_folder_structure(file),
+		'mh_filename': validate_filename(file),
+		'csv_header': np.nan,
+		'na_rows': np.nan,
+		'sr': np.nan,
+		'max_g': np.nan,
+		'min_g': np.nan,
+		'max_g_count': np.nan,
+		'min_g_count': np.nan
+	}
+	meta = sidecar.read(file)
+	with compression.open_file(file, 'rb') as f:
+		if meta is None:
+			content = f.read()
+			header = content.split(b'\n', 1)[0]
+		else:
+			header = f.readline()
+	result['csv_header'] = _validate_header(header.decode('utf-8', errors='replace').strip(), file_type)
+	if meta is None:
+		try:
+			meta = sidecar.build(file, content=content)
+		except (pd.errors.ParserError, pd.errors.EmptyDataError, TypeError) as e:
+			for key in ['num_of_rows', 'na_rows', 'sr', 'max_g', 'min_g', 'max_g_count', 'min_g_count']:
+				result[key] = type(e).__name__
+			return result
+	result['num_of_rows'] = meta['lines']
+	result['na_rows'] = meta['na_rows']
+	if file_type == 'sensor':
+		for key in ['sr', 'max_g', 'min_g', 'max_g_count', 'min_g_count']:
+			if meta[key] is not None:
+				result[key] = meta[key]
+	return result
+
 def major_element(ls):
 	(values,counts) = np.unique(ls,return_counts=True)
 	ind=np.argmax(counts)
 	return values[ind]
 
-def generate_output_filepath(file, setname, newtype=None, datatype=None):
+def generate_output_filepath(file, setname, newtype=None, datatype=None, ext=None):
 	file = os.path.normpath(os.path.abspath(file))
 	if "MasterSynced" in file:
 		new_file = file.replace('MasterSynced', 'Derived' + os.path.sep + setname)
@@ -194,6 +276,12 @@ def generate_output_filepath(file, setname, newtype=None, datatype=None):
 		new_file = new_file.replace(extract_file_type(file), newtype)
 	if datatype is not None:
 		new_file = new_file.replace(extract_datatype(file), datatype)
+	if ext is not None and ext != "None":
+		if not ext.startswith('.'):
+			ext = '.' + ext
+		if ext.lower() not in SENSOR_FILE_EXTENSIONS:
+			raise ValueError('Unsupported file extension: ' + ext)
+		new_file = os.path.splitext(compression.strip_compression_extension(new_file))[0] + ext.lower()
 	
 	return new_file
 
@@ -203,8 +291,7 @@ def get_st_et(data, pid, session_file=None, st_col=0, et_col=0):
 		et = np.max(data.iloc[:, et_col])
 	else:
 		session_file = os.path.abspath(session_file)
-		session_df = pd.read_csv(session_file, parse_dates=[0, 1], infer_datetime_format=True)
-		selected_sessions = session_df.loc[session_df['pid'] == pid, :]
+		selected_sessions = side_tables.select(session_file, {'pid': pid}, parse_dates=[0, 1])
 		if selected_sessions.shape[0] == 0:
 			st = np.min(selected_sessions.iloc[:, st_col])
 			et = np.max(selected_sessions.iloc[:, et_col])
@@ -219,8 +306,7 @@ def get_sid_from_location(pid, location, location_mapping_file):
 	if location_mapping_file is None or location is None or pid is None:
 		return None
 	else:
-		location_mapping_df = pd.read_csv(location_mapping_file)
-		selected_mapping = location_mapping_df.loc[(location_mapping_df['PID'] == pid) & (location_mapping_df['LOCATION'] == location), 'SENSOR_ID']
+		selected_mapping = side_tables.select(location_mapping_file, {'PID': pid, 'LOCATION': location})['SENSOR_ID']
 		if selected_mapping.shape[0] == 0:
 			return None
 		return selected_mapping.values[0]
@@ -230,8 +316,7 @@ def get_location_from_sid(pid, sid, location_mapping_file):
 		return None
 	else:
 		location_mapping_file = os.path.abspath(location_mapping_file)
-		location_mapping_df = pd.read_csv(location_mapping_file)
-		selected_mapping = location_mapping_df.loc[(location_mapping_df['PID'] == pid) & (location_mapping_df['SENSOR_ID'] == sid), 'LOCATION']
+		selected_mapping = side_tables.select(location_mapping_file, {'PID': pid, 'SENSOR_ID': sid})['LOCATION']
 		if selected_mapping.shape[0] == 0:
 			return "unknown"
 		return selected_mapping.values[0]
\ No newline at end of file
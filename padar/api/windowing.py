@@ -7,6 +7,7 @@ functions to divide input data into sliding windows and do computation on each o
 import numpy as np
 import pandas as pd
 from .date_time import datetime64_to_milliseconds, datetime_to_milliseconds, milliseconds_to_datetime64, datetime
+from .store import SensorStore
 
 """
 Get start and end time of windows in a 2D numpy array given start and stop time of the whole session
@@ -47,6 +48,8 @@ def get_sliding_window_boundaries(start_time, stop_time, window_duration=1000, s
 
 
 def get_sliding_window_dataframe(df, start_time=None, stop_time=None, start_time_col=0, stop_time_col=None):
+	if isinstance(df, SensorStore):
+		return df.slice(start_time, stop_time).to_dataframe()
 	if stop_time_col == None:
 		stop_time_col = start_time_col
 	if start_time == None:
@@ -70,7 +73,7 @@ def get_sliding_window_dataframe(df, start_time=None, stop_time=None, start_time
 """
 Apply customizable functions to each subset of a dataframe defined by a list of windows' start and end time
 
-df: input dataframe, the first or second column is timestamp to get subset from. E.g., sensor data's dataframe would have the first column to be the start_time_col; annotation data's dataframe would have the second column to be the stop_time_col
+df: input dataframe or SensorStore, the first or second column is timestamp to get subset from. E.g., sensor data's dataframe would have the first column to be the start_time_col; annotation data's dataframe would have the second column to be the stop_time_col
 sliding_windows: a 2D numpy array with the first column being start time and second column being stop time
 window_operations: a list of functions to be applied to the subset of df (in a 2D numpy array)
 operation_names: optional a list of functions' output column names corresponding to window_operations
@@ -85,14 +88,22 @@ def apply_to_sliding_windows(df, sliding_windows, window_operations, operation_n
 	for i in indices:
 		st = sliding_windows[i, 0]
 		et = sliding_windows[i, 1]
-		chunk = get_sliding_window_dataframe(df, start_time=st, stop_time=et, start_time_col=start_time_col, stop_time_col=stop_time_col)
-		if send_time_cols:
-			col_names = chunk.columns
-			chunk = chunk.values
+		if isinstance(df, SensorStore):
+			# views of the memory-mapped arrays, no dataframe is built
+			chunk = df.slice(st, et)
+			if send_time_cols:
+				chunk = np.column_stack((chunk.timestamps.astype(object), chunk.values.astype(object)))
+			else:
+				chunk = chunk.values
 		else:
-			chunk = chunk.drop(chunk.columns[[start_time_col, stop_time_col]], axis=1)
-			col_names = chunk.columns
-			chunk = chunk.values
+			chunk = get_sliding_window_dataframe(df, start_time=st, stop_time=et, start_time_col=start_time_col, stop_time_col=stop_time_col)
+			if send_time_cols:
+				col_names = chunk.columns
+				chunk = chunk.values
+			else:
+				chunk = chunk.drop(chunk.columns[[start_time_col, stop_time_col]], axis=1)
+				col_names = chunk.columns
+				chunk = chunk.values
 		if chunk.shape[0] == 0:
 			output_vector = np.array([])
 		else:
@@ -0,0 +1,119 @@
+"""
+
+Persistent pool of worker processes
+
+The pool is started once and reused by every parallel call of `M`, so the worker processes keep their imported modules, caches and built processors between calls. An optional initializer runs once in every worker when it starts. Objects that are expensive to build, such as the processor of a script, are kept per worker with `cached` and reused for every file the worker processes.
+
+"""
+
+import os
+import sys
+import atexit
+import resource
+import weakref
+from pathos.helpers import mp
+
+# objects kept by the current process, see `cached`
+_cached = {}
+_MAX_CACHED = 8
+# pools that are still running when the interpreter exits are stopped
+_running_pools = weakref.WeakSet()
+
+@atexit.register
+def _stop_running_pools():
+	for pool in list(_running_pools):
+		pool.terminate()
+
+def _initialize(initializer, initargs):
+	_cached.clear()
+	if initializer is not None:
+		initializer(*initargs)
+
+def cached(key, factory):
+	"""Return the object kept under `key` in the current process, build it with `factory()` the first time"""
+	if key not in _cached:
+		if len(_cached) >= _MAX_CACHED:
+			# objects of old runs are dropped first
+			del _cached[next(iter(_cached))]
+		_cached[key] = factory()
+	return _cached[key]
+
+def peak_rss():
+	"""Peak resident memory of the current process in bytes"""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# kilobytes on linux, bytes on macOS
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+def available_memory():
+	"""Memory in bytes that can be used by new processes without swapping"""
+	try:
+		with open('/proc/meminfo', 'r') as f:
+			for line in f:
+				if line.startswith('MemAvailable:'):
+					return int(line.split()[1]) * 1024
+	except OSError:
+		pass
+	return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES')
+
+class WorkerPool:
+	def __init__(self, n_workers, initializer=None, initargs=(), chunksize=1):
+		self.n_workers = max(1, int(n_workers))
+		self.initializer = initializer
+		self.initargs = tuple(initargs)
+		self.chunksize = chunksize
+		self._pool = None
+
+	def _get_pool(self):
+		if self._pool is None:
+			self._pool = mp.Pool(self.n_workers, initializer=_initialize, initargs=(self.initializer, self.initargs))
+			_running_pools.add(self)
+		return self._pool
+
+	def imap_unordered(self, func, iterable, chunksize=None):
+		"""Apply `func` to every item in the workers, results are yielded as soon as they are ready"""
+		if chunksize is None:
+			chunksize = self.chunksize
+		return self._get_pool().imap_unordered(func, iterable, chunksize=max(1, int(chunksize)))
+
+	def map(self, func, iterable, chunksize=None):
+		"""Like `imap_unordered` but returns a list of the results in the order of `iterable`"""
+		indexed_func = _IndexedFunc(func)
+		results = {}
+		for i, result in self.imap_unordered(indexed_func, enumerate(iterable), chunksize=chunksize):
+			results[i] = result
+		return [results[i] for i in range(len(results))]
+
+	def close(self):
+		if self._pool is not None:
+			self._pool.close()
+			self._pool.join()
+			self._pool = None
+
+	def terminate(self):
+		if self._pool is not None:
+			self._pool.terminate()
+			self._pool.join()
+			self._pool = None
+
+	def __getstate__(self):
+		# a pool can not be sent to its own workers
+		state = self.__dict__.copy()
+		state['_pool'] = None
+		return state
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+		else:
+			self.terminate()
+
+class _IndexedFunc:
+	def __init__(self, func):
+		self.func = func
+
+	def __call__(self, indexed_item):
+		i, item = indexed_item
+		return i, self.func(item)
@@ -1,41 +1,105 @@
 import click
 import pandas as pd
 from .api import M
+from .api import jobqueue
+from .api.helpers import exporter
 import os
 import warnings
 import numpy
-import importlib
-import sys
 from .utility import logger
 from .utility.package_helper import *
 
 @click.group()
 @click.option('--pid', '-p', help="The participant ID (folder name) to run the command on. If it is not provided, the command will run against all participants' data")
 @click.option('--root', '-r', help='The root folder for a dataset in mhealth convention. If it is not provided, the default is current folder.', default='.')
+@click.option('--catalog-dir', help='Folder to save the catalog of the files of the dataset in, so later commands only scan the folders that changed. If omit, the dataset is scanned by every command and nothing is written to it.', default=None)
 @click.pass_context
-def main(ctx, root, pid):
+def main(ctx, root, pid, catalog_dir):
     """Command entry to run customized script to process raw accelerometer data and annotations stored in mhealth convention (hourly files).
     """
     ctx.obj={}
     ctx.obj['PID'] = pid
     ctx.obj['root'] = root
+    ctx.obj['catalog_dir'] = catalog_dir
     
 @click.command()
+@click.option('--par', help='If using this flag, files will be summarized in parrallel', is_flag=True)
 @click.pass_context
-def summary(ctx):
-    """[summary]
-    
-    [description]
+def summary(ctx, par):
+    """
+        Summarize the files of the dataset, or of a participant if PID is provided
+
+        Every file is read once to compute its size, rows, header validity, NA rows, and for sensor files the sampling rate and min/max g. Indexed files are not read again.
     """
     rel_path = ""
     if ctx.obj['PID']:
         rel_path = ctx.obj['PID']
     if ctx.obj['root']:
-        m = M(ctx.obj['root'])
+        m = M(ctx.obj['root'], catalog_dir=ctx.obj['catalog_dir'])
     else:
         m = None
-    result = m.summarize(rel_path, use_parallel=False, verbose=False)
-    output(result.to_csv(sep=',', index=False, float_format='%.3f'))
+    result = m.summarize(rel_path, use_parallel=par, verbose=False)
+    logger.output(result.to_csv(sep=',', index=False, float_format='%.3f'))
+
+def _option_group(*options):
+    # applies a group of click options to a command in the order they are listed
+    def decorator(func):
+        for option in reversed(options):
+            func = option(func)
+        return func
+    return decorator
+
+# options of `pad process` grouped by what they configure, they are turned into the options of `M.process` by `_process_options`
+_cache_options = _option_group(
+    click.option('--cache-size', help='Memory budget in MB of the cache of decoded files kept by each worker, so adjacent hourly files are only decoded once. The cache is disabled by default (0), the memory it takes is multiplied by the number of workers with --par.', default=0, type=float),
+    click.option('--schedule', help="'file' sends files to the workers one by one, 'contiguous' sends runs of adjacent hourly files of the same participant and sensor to the same worker so that they are served from the cache (enable it with --cache-size)", type=click.Choice(['file', 'contiguous']), default='file'),
+    click.option('--cache-dir', help='Folder to keep binary decoded copies of the processed files, later runs will memory-map these copies instead of parsing the csv files again. If omit, no persistent cache is used.', default=None),
+    click.option('--cache-dir-size', help='Size budget in MB of the cache folder, least recently used entries are removed when it is exceeded.', default=10240, type=float),
+    click.option('--prefetch', help='Number of sensor files each worker reads and decodes ahead in a background thread while it computes the current file, so reads from slow disks or network storage overlap with computation. Use 0 to disable the read-ahead.', default=0, type=int),
+    click.option('--prefetch-size', help='Memory budget in MB of the files read ahead by each worker.', default=256, type=float)
+)
+
+_block_options = _option_group(
+    click.option('--block-size', help='If provided, each file is processed in blocks of this many seconds, so files longer than an hour are processed in bounded memory.', default=None, type=float),
+    click.option('--block-overlap', help='Seconds of data shared between adjacent blocks and files when --block-size is used. If it is 0, scripts that use the adjacent files use their default margin.', default=0, type=float)
+)
+
+_parallel_options = _option_group(
+    click.option('--chunksize', help='Number of files (or runs of files with --schedule contiguous) sent to a worker at once when --par is used.', default=1, type=int),
+    click.option('--shard-size', help='If provided, files larger than this many MB are split into time shards that are processed by different workers when --par is used. Shards are processed in blocks of --block-size seconds (one hour by default).', default=None, type=float)
+)
+
+_resume_options = _option_group(
+    click.option('--incremental', help='If using this flag, files whose derived files are up to date are skipped. A derived file is up to date when the script, its arguments, the input file, its adjacent files and side inputs such as sessions.csv did not change since it was written.', is_flag=True),
+    click.option('--checkpoint', help='If using this flag, the result of every file is saved in the .padar-runs folder of the dataset as soon as it is ready, so that the run can be resumed with --resume if it is interrupted. The run id is printed at the start of the run.', is_flag=True),
+    click.option('--resume', help='Resume the interrupted checkpointed run with this run id, only the files that were not finished are processed. Use the same script and script arguments as the interrupted run.', default=None)
+)
+
+_stream_options = _option_group(
+    click.option('--stream', help='If using this flag, results are written to the output file (--output is required) while files are processed instead of being collected in memory. Results are merged by their first column at the end.', is_flag=True),
+    click.option('--by-stream', help='If using this flag, the hourly files of each participant and sensor are processed as one contiguous stream in blocks of --block-size seconds (one hour by default) with --block-overlap seconds of data around each block (the default of the script if it is 0), so windows crossing hour boundaries see all of their data. The derived hourly files are written as before. It can not be combined with --shard-size, --incremental, --checkpoint or --resume.', is_flag=True),
+    click.option('--stream-dir', help='Folder to memory-map the streams of --by-stream from temporary stores. If omit, each stream is kept in memory.', default=None)
+)
+
+def _process_options(options):
+    """Keyword arguments of `M.process` for the grouped options of `pad process`, sizes in MB are converted to bytes"""
+    mb = 1024 * 1024
+    return dict(
+        cache_size=int(options['cache_size'] * mb),
+        schedule=options['schedule'],
+        cache_dir=options['cache_dir'],
+        cache_dir_size=int(options['cache_dir_size'] * mb),
+        prefetch=options['prefetch'],
+        prefetch_size=int(options['prefetch_size'] * mb),
+        block_duration=options['block_size'],
+        block_overlap=options['block_overlap'],
+        shard_size=int(options['shard_size'] * mb) if options['shard_size'] is not None else None,
+        incremental=options['incremental'],
+        checkpoint=options['checkpoint'],
+        resume=options['resume'],
+        by_stream=options['by_stream'],
+        stream_dir=options['stream_dir']
+    )
 
 @click.command(context_settings=dict(
     ignore_unknown_options=True,
@@ -46,8 +110,15 @@ def summary(ctx):
 @click.option('--par', help='If using this flag, files will be processed in parrallel', is_flag=True)
 @click.option('--violate', help='If using this flag, the script will not extract meta information from the filenames of raw data and append them as columns in the output csv file.', is_flag=True)
 @click.option('--output', '-o', help='Output file path relative to the PID folder or root folder of the dataset', default=None)
+@_cache_options
+@_block_options
+@_parallel_options
+@_resume_options
+@click.option('--plan', help='If using this flag, nothing is processed. The files with their previous and next files are printed as the tasks of the run, the files and bytes of every participant and sensor are logged, and the runtime and the number of workers are estimated from a few sample files run through the script.', is_flag=True)
+@click.option('--sample', help='Number of files run through the script to estimate the runtime with --plan. Use 0 to skip the estimate.', default=3, type=int)
+@_stream_options
 @click.pass_context
-def process(ctx, script, pattern, par, violate, output):
+def process(ctx, script, pattern, par, violate, output, plan, sample, stream, **options):
     """
         Apply data processing script to selected data
 
@@ -68,9 +139,24 @@ def process(ctx, script, pattern, par, violate, output):
     logger.info('Wild card pattern to select files: ' + str(pattern))
     logger.info('Use parallel: ' + str(par))
     logger.info('Violate mhealth filename convention: ' + str(violate))
+    logger.info('Cache size (MB): ' + str(options['cache_size']))
+    logger.info('Schedule: ' + options['schedule'])
+    logger.info('Decode cache folder: ' + str(options['cache_dir']))
+    logger.info('Block size (seconds): ' + str(options['block_size']))
+    logger.info('Chunksize: ' + str(options['chunksize']))
+    logger.info('Shard size (MB): ' + str(options['shard_size']))
+    logger.info('Incremental: ' + str(options['incremental']))
+    logger.info('Checkpoint: ' + str(options['checkpoint']))
+    logger.info('Resume run: ' + str(options['resume']))
+    logger.info('Prefetch files: ' + str(options['prefetch']))
+    logger.info('Stream results: ' + str(stream))
+    logger.info('Process by stream: ' + str(options['by_stream']))
+    if stream and output is None:
+        logger.error('--stream requires --output')
+        exit(1)
 
     if ctx.obj['root']:
-        m = M(ctx.obj['root'])
+        m = M(ctx.obj['root'], chunksize=options['chunksize'], catalog_dir=ctx.obj['catalog_dir'])
     else:
         m = None
 
@@ -78,15 +164,9 @@ def process(ctx, script, pattern, par, violate, output):
     kwargs = {ctx.args[i][2:]: ctx.args[i+1].strip('"') for i in range(0, len(ctx.args), 2)}
 
     try:
-        if script.endswith('.py'):
-            script_path = os.path.abspath(script)
-            sys.path.insert(0, os.path.dirname(script_path))
-            module_name = os.path.splitext(os.path.basename(script))[0]
-        else:
-            module_name = 'padar.scripts.' + script
-        script_module = importlib.import_module(module_name)
+        script_module = load_script(script)
     except ModuleNotFoundError:
-        logger.error('Script is not found: ' + module_name)
+        logger.error('Script is not found: ' + script)
         exit(1)
     func = script_module.build
 
@@ -115,10 +195,36 @@ def process(ctx, script, pattern, par, violate, output):
 
     # process parallel flag
     use_parallel = par
-    
+
+    if plan:
+        logger.info('Plan run')
+        tasks, groups, estimate = m.plan(rel_pattern, func, use_parallel=use_parallel, violate=violate, schedule=options['schedule'], block_duration=options['block_size'], block_overlap=options['block_overlap'], sample=sample, verbose=True, **kwargs)
+        for row in groups.itertuples(index=False):
+            logger.info('PID ' + str(row.pid) + ', sensor ' + str(row.sid) + ': ' + str(row.files) + ' files in ' + str(row.tasks) + ' tasks, ' + '%.1f' % (row.bytes / 1024.0 / 1024.0) + ' MB')
+        logger.info('Total: ' + str(estimate['files']) + ' files in ' + str(estimate['tasks']) + ' tasks, ' + '%.1f' % (estimate['bytes'] / 1024.0 / 1024.0) + ' MB')
+        if estimate['runtime'] is not None:
+            logger.info('Estimated runtime with ' + str(estimate['workers']) + ' workers: ' + '%.0f' % estimate['runtime'] + ' s')
+            logger.info('Suggested workers: ' + str(estimate['suggested_workers']) + ' (peak memory of a worker ' + '%.0f' % (estimate['peak_rss'] / 1024.0 / 1024.0) + ' MB), estimated runtime: ' + '%.0f' % estimate['suggested_runtime'] + ' s')
+        logger.output(tasks.to_csv(sep=',', index=False))
+        return
+
+    run_kwargs = dict(use_parallel=use_parallel, verbose=True, violate=violate, **_process_options(options))
+
+    if stream:
+        # scripts can declare the columns of their results
+        if hasattr(script_module, 'output_columns'):
+            columns = script_module.output_columns(**kwargs)
+        else:
+            columns = None
+        logger.info('Start processing')
+        m.process(rel_pattern, func, output=output_filepath, columns=columns, float_format='%.9f', **run_kwargs, **kwargs)
+        logger.info('Finish processing')
+        logger.info('Saved results to ' + os.path.abspath(output_filepath))
+        return
+
     # run process engine and return result (result should be a pandas dataframe)
     logger.info('Start processing')
-    result = m.process(rel_pattern, func, use_parallel=use_parallel, verbose=True, violate=violate, **kwargs)
+    result = m.process(rel_pattern, func, **run_kwargs, **kwargs)
     logger.info('Finish processing')
     
     if not result.empty:
@@ -127,11 +233,101 @@ def process(ctx, script, pattern, par, violate, output):
     if output is not None and not result.empty:
         logger.info('Save results to ' + os.path.abspath(output_filepath))
         os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
-        result.to_csv(output_filepath, index=False, float_format='%.9f')
+        exporter.export_csv(result, output_filepath, float_format='%.9f')
 
-     # clear up python search path
-    if script.endswith('.py'):
-        sys.path.remove(os.path.dirname(script_path))
+@click.command()
+@click.option('--pattern', '-p', help="Folder to be indexed that is relative to the participant's folder path if PID is provided, otherwise it is relative to the root folder of the dataset. If omit, the MasterSynced folders of all participants will be indexed.", default="")
+@click.option('--par', help='If using this flag, files will be indexed in parrallel', is_flag=True)
+@click.option('--force', help='If using this flag, sidecars are rewritten even when they are fresh', is_flag=True)
+@click.pass_context
+def index(ctx, pattern, par, force):
+    """
+        Write a metadata sidecar for each data file
+
+        The sidecar is a hidden `.<filename>.meta.json` file next to the data file with its number of rows, first and last timestamps, sampling rate, min/max values and number of rows with missing values. Summary functions answer from fresh sidecars instead of reading the whole files again.
+    """
+    logger.info('Start execute command')
+    logger.info('Selected dataset root folder: ' + os.path.abspath(ctx.obj['root']))
+    logger.info('Selected PID: ' + str(ctx.obj['PID']))
+    if ctx.obj['PID'] is not None:
+        rel_path = os.path.join(ctx.obj['PID'], pattern if pattern != "" else "MasterSynced")
+    else:
+        rel_path = pattern
+    m = M(ctx.obj['root'], catalog_dir=ctx.obj['catalog_dir'])
+    result = m.index(rel_path, use_parallel=par, force=force)
+    logger.info('Indexed ' + str(result.shape[0]) + ' files')
+
+@click.command(context_settings=dict(
+    ignore_unknown_options=True,
+    allow_extra_args=True
+))
+@click.argument('script')
+@click.option('--queue', '-q', help='Queue folder on storage shared by all workers. It must not contain a job yet.', required=True)
+@click.option('--pattern', '-p', help="Glob wild card pattern to select files to be processed that is relative to the participant's folder path if PID is provided, otherwise it is relative to the root folder of the dataset. If omit, will process all csv files recursively in the parent folder.")
+@click.option('--violate', help='If using this flag, the script will not extract meta information from the filenames of raw data and append them as columns in the output csv file.', is_flag=True)
+@click.option('--schedule', help="'file' makes one task per file, 'contiguous' makes tasks of adjacent hourly files of the same participant and sensor", type=click.Choice(['file', 'contiguous']), default='file')
+@click.option('--workers', help='Expected number of workers, used to split the tasks of --schedule contiguous.', default=1, type=int)
+@_block_options
+@click.option('--lease', help='Seconds after which a task claimed by a worker that stopped responding is given to another worker.', default=600, type=float)
+@click.option('--max-attempts', help='Number of times a task is tried before it is given up.', default=3, type=int)
+@click.pass_context
+def submit(ctx, script, queue, pattern, violate, schedule, workers, block_size, block_overlap, lease, max_attempts):
+    """
+        Write a job to process selected data to a queue folder
+
+        The job is processed by `pad worker` processes started on any host that shares the dataset and the queue folder. Use `pad collect` to merge the results when all tasks are done. Script arguments are passed like in `pad process`.
+    """
+    logger.info('Start execute command')
+    logger.info('Selected dataset root folder: ' + os.path.abspath(ctx.obj['root']))
+    logger.info('Selected PID: ' + str(ctx.obj['PID']))
+    logger.info('Selected script: ' + script)
+    kwargs = {ctx.args[i][2:]: ctx.args[i+1].strip('"') for i in range(0, len(ctx.args), 2)}
+    if pattern is None:
+        pattern = "**/*.csv"
+    if ctx.obj['PID']:
+        rel_pattern = os.path.join(ctx.obj['root'], ctx.obj['PID'], pattern)
+    else:
+        rel_pattern = os.path.join(ctx.obj['root'], pattern)
+    logger.info('Processed wild card pattern: ' + os.path.abspath(rel_pattern))
+    m = M(ctx.obj['root'], catalog_dir=ctx.obj['catalog_dir'])
+    queue_dir = m.submit(rel_pattern, queue, script, violate=violate, schedule=schedule, n_workers=workers, block_duration=block_size, block_overlap=block_overlap, lease=lease, max_attempts=max_attempts, **kwargs)
+    logger.info('Submitted job to ' + queue_dir + ', start workers with `pad worker -q ' + queue_dir + '`')
+
+@click.command()
+@click.option('--queue', '-q', help='Queue folder of a job written by `pad submit`.', required=True)
+@click.option('--poll', help='Seconds to wait before checking the queue again when no task is pending.', default=5, type=float)
+@click.option('--no-wait', help='If using this flag, the worker exits when no task is pending instead of waiting for the tasks claimed by other workers to finish.', is_flag=True)
+def worker(queue, poll, no_wait):
+    """
+        Process the tasks of a job in a queue folder
+
+        Any number of workers can be started on any host that shares the dataset and the queue folder. Tasks of workers that stop responding are processed again after the lease of the job.
+    """
+    logger.info('Start execute command')
+    logger.info('Selected queue: ' + os.path.abspath(queue))
+    m = M(jobqueue.load_job(queue)['root'])
+    n_tasks = m.work(queue, poll=poll, wait=not no_wait, verbose=True)
+    logger.info('Worker finished ' + str(n_tasks) + ' tasks')
+
+@click.command()
+@click.option('--queue', '-q', help='Queue folder of a finished job.', required=True)
+@click.option('--output', '-o', help='Output file path relative to the root folder of the dataset. If omit, the results are printed.', default=None)
+def collect(queue, output):
+    """
+        Merge the results of a finished job in a queue folder
+    """
+    logger.info('Start execute command')
+    logger.info('Selected queue: ' + os.path.abspath(queue))
+    job = jobqueue.load_job(queue)
+    m = M(job['root'])
+    logger.info('Task counts: ' + str(jobqueue.counts(queue)))
+    if output is not None:
+        output_filepath = m.collect(queue, output=os.path.join(job['root'], output))
+        logger.info('Saved results to ' + output_filepath)
+    else:
+        result = m.collect(queue)
+        if not result.empty:
+            logger.output(result.to_csv(sep=',', index=False, float_format='%.3f'))
 
 @click.command()
 @click.option('--name', '-n', help="List the usage and examples of the script <name>", default=None)
@@ -153,32 +349,34 @@ def script(name, list):
 
 @click.command()
 @click.pass_context
-@click.argument('content')
+@click.argument('content', type=click.Choice(['participants', 'sensors', 'annotators']))
 def ls(ctx, content):
-    """[summary]
-    
-    [description]
-    
+    """
+        List the participants of the dataset, or the sensors or annotators of the dataset or of a participant if PID is provided
+
+        The files are looked up in the catalog of the dataset.
     """
     rel_path = ""
     if ctx.obj['PID']:
         rel_path = ctx.obj['PID']
     if ctx.obj['root']:
-        m = M(ctx.obj['root'])
+        m = M(ctx.obj['root'], catalog_dir=ctx.obj['catalog_dir'])
     else:
         m = None
     
     if content == 'sensors':
-        result = m.sensors(rel_path)
-        click.echo("\r\n".join(result))
+        result = sorted(m.sensors(rel_path))
     elif content == 'participants':
-        result = m.participants
-        click.echo('\r\n'.join(result))
+        result = sorted(m.participants)
     elif content == 'annotators':
-        result = m.annotators(rel_path)
-        click.echo('\r\n'.join(result))
+        result = sorted(m.annotators(rel_path))
+    logger.output('\n'.join(result))
 
-# main.add_command(summary)
+main.add_command(summary)
 main.add_command(process)
 main.add_command(script)
-# main.add_command(ls)
\ No newline at end of file
+main.add_command(index)
+main.add_command(submit)
+main.add_command(worker)
+main.add_command(collect)
+main.add_command(ls)
\ No newline at end of file
@@ -12,6 +12,8 @@ Usage:
 		--static_chunks <path>: the filepath (relative to root folder or absolute path) that contains the static chunks found by `StaticFinder`. User must provide this information in order to use the script.
 		
 		--output_folder <folder name>: the folder name that the script will save calibrated data to in a participant's Derived folder. User must provide this information in order to use the script.
+
+		--output_format <extension>: the storage format of the saved hourly files, one of `csv`, `parquet`, `feather` or `npy`, csv files can be compressed with `csv.gz`, `csv.bz2`, `csv.xz` or `csv.zst`. If this information is not provided, the format of the input file will be used.
 		
 	output:
 		The command will not print any output to console. The command will save the calibrated hourly files to the <output_folder>
@@ -29,7 +31,9 @@ Examples:
 
 import os
 import pandas as pd
+import numpy as np
 from .. import api as mhapi
+from ..api.accelerometer.calibrator import calibrate_values
 from ..api import utils as mu
 from .BaseProcessor import SensorProcessor
 from ..utility import logger
@@ -38,43 +42,77 @@ def build(**kwargs):
 	return AccelerometerCalibrator(**kwargs).run_on_file
 
 class AccelerometerCalibrator(SensorProcessor):
-	def __init__(self, verbose=True, independent=True, violate=False, static_chunks=None, output_folder=None):
+	def __init__(self, verbose=True, independent=True, violate=False, static_chunks=None, output_folder=None, output_format=None):
 		SensorProcessor.__init__(self, verbose=verbose, independent=independent, violate=violate)
 		self.name = 'AccelerometerCalibrator'
 		self.static_chunks = static_chunks
 		self.output_folder = output_folder
+		self.output_format = output_format
+		self._calibrations = {}
 
-	def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
-		if self.static_chunks is None:
-			logger.warn('static chunks file is not provided, return the original data')
-			return combined_data
+	# calibrated values are written to the arrays of the pipeline, see `Pipeline`
+	IN_PLACE = True
 
+	def _calibration(self):
+		"""The calibration of the current pid and sid fitted to its static chunks, None if it can not be fitted
+
+		Calibrations are fitted once per process and reused for all files of the same pid and sid.
+		"""
 		pid = self.meta['pid']
-		sid = self.meta['sid']
+		sid = None if self.violate else self.meta['sid']
 		static_chunks = os.path.abspath(self.static_chunks)
-		static_chunks = pd.read_csv(self.static_chunks, parse_dates=[0], infer_datetime_format=True)
+		stat = os.stat(static_chunks)
+		key = (static_chunks, stat.st_size, stat.st_mtime_ns, pid, sid)
+		if key in self._calibrations:
+			return self._calibrations[key]
 		if self.violate:
-			selected_static_chunks = static_chunks.loc[static_chunks['pid'] == pid,:]
+			selected_static_chunks = mhapi.side_tables.select(static_chunks, {'pid': pid}, parse_dates=[0])
 		else:
-			selected_static_chunks = static_chunks.loc[(static_chunks['id'] == sid) & (static_chunks['pid'] == pid),:]
+			selected_static_chunks = mhapi.side_tables.select(static_chunks, {'pid': pid, 'id': sid}, parse_dates=[0])
 		chunk_count = selected_static_chunks.groupby(['WINDOW_ID', 'COUNT', 'date', 'hour']).count().shape[0]
 		if self.verbose:
 			logger.info("Found " + str(chunk_count) + " static chunks")
 		if chunk_count < 9:
 			logger.warn("Need at least 9 static chunks for calibration, skip and use original data")
-			calibrated_df = combined_data
+			calibration = None
 		else:
-			calibrated_df = mhapi.Calibrator(combined_data, max_points=100, verbose=self.verbose).set_static(selected_static_chunks).run().calibrated
+			calibration = mhapi.Calibrator(None, max_points=100, verbose=self.verbose).set_static(selected_static_chunks).fit()
+		self._calibrations[key] = calibration
+		return calibration
+
+	def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
+		if self.static_chunks is None:
+			logger.warn('static chunks file is not provided, return the original data')
+			return combined_data
+		calibration = self._calibration()
+		if calibration is None:
+			return combined_data
+		calibrated_df = combined_data.copy(deep=True)
+		calibrated_df.iloc[:, 1:] = calibrate_values(combined_data.iloc[:, 1:].values.astype(np.float64), calibration)
 		return calibrated_df
 
+	def _run_on_arrays(self, ts, values, data_start_indicator, data_stop_indicator):
+		if self.static_chunks is None:
+			logger.warn('static chunks file is not provided, return the original data')
+			return ts, values
+		calibration = self._calibration()
+		if calibration is not None:
+			calibrate_values(values, calibration)
+		return ts, values
+
+	def output_filepath(self, file):
+		if self.output_folder is None:
+			return None
+		return mu.generate_output_filepath(file, setname=self.output_folder, newtype='sensor', ext=self.output_format)
+
 	def _post_process(self, result_data):
 		if self.output_folder is None:
 			logger.warn('output_folder is not provided, no hourly calibrated file will be saved')
 			return pd.DataFrame()
-		output_file = mu.generate_output_filepath(self.file, setname=self.output_folder, newtype='sensor')
+		output_file = self.output_filepath(self.file)
 		if not os.path.exists(os.path.dirname(output_file)):
 			os.makedirs(os.path.dirname(output_file))
-		result_data.to_csv(output_file, index=False, float_format='%.9f')
+		mhapi.helpers.exporter.export_sensor_file_mhealth(result_data, output_file, float_format='%.9f')
 		if self.verbose:
 			logger.info('Saved calibrated data to ' + output_file)
 		return pd.DataFrame()
\ No newline at end of file
@@ -24,10 +24,14 @@
         --sessions <path>: the filepath (relative to root folder or absolute path) that contains the sessions information found by `SessionExtractor`. If this information is not provided, clipping will be skipped.
 		
 		--output_folder <folder name>: the folder name that the script will save the preprocessed data to in a participant's Derived folder. User must provide this information in order to use the script.
+
+		--output_format <extension>: the storage format of the saved hourly files, one of `csv`, `parquet`, `feather` or `npy`, csv files can be compressed with `csv.gz`, `csv.bz2`, `csv.xz` or `csv.zst`. If this information is not provided, the format of the input file will be used.
 		
 	output:
 		The command will not print any output to console. The command will save the preprocessed hourly files to the <output_folder>
 
+	Use `--incremental` to only preprocess the files that are new or changed, or whose static chunks, offsets or sessions changed, since the last run.
+
   Examples:
 
 	1.  Preprocess the Actigraph raw data files for participant SPADES_1 in parallel and save it to a folder named 'preprocessed' in the 'Derived' folder of SPADES_1. Timestamp syncing will be skipped.
@@ -51,61 +55,65 @@ from .TimestampSyncer import TimestampSyncer
 from .BaseProcessor import SensorProcessor
 from .AccelerometerCalibrator import AccelerometerCalibrator
 from .SensorClipper import SensorClipper
+from .Pipeline import Pipeline
 from ..utility import logger
 
 def build(**kwargs):
     return AccelerometerProcessor(**kwargs).run_on_file
 
 class AccelerometerProcessor(SensorProcessor):
-    def __init__(self, verbose=True, independent=False, violate=False, output_folder=None, static_chunks=None, offsets=None, sessions=None):
+    def __init__(self, verbose=True, independent=False, violate=False, output_folder=None, static_chunks=None, offsets=None, sessions=None, output_format=None):
         SensorProcessor.__init__(self, verbose=verbose, independent=independent, violate=violate)
         self.name = 'AccelerometerProcessor'
         self.output_folder = output_folder
         self.static_chunks = static_chunks
         self.offsets = offsets
         self.sessions = sessions
+        self.output_format = output_format
+        # stages are built once and reused for every file of the worker
+        self._build_pipeline()
 
     def _build_pipeline(self):
-        self.pipeline = list()
+        stages = list()
         if self.static_chunks is not None:
             calibrator = AccelerometerCalibrator(verbose=self.verbose, independent=self.independent, violate=self.violate, static_chunks=self.static_chunks)
-            self.pipeline.append(calibrator)
+            stages.append(calibrator)
         else:
             logger.warn('static chunks are not provided, skip calibration')
 
         if self.offsets is not None:
             syncer = TimestampSyncer(verbose=self.verbose, independent=self.independent, violate=self.violate, offsets=self.offsets)
-            self.pipeline.append(syncer)
+            stages.append(syncer)
         else:
             logger.warn('offsets are not provided, skip timestamp syncing')
 
         if self.sessions is not None:
             clipper = SensorClipper(verbose=self.verbose, independent=self.independent, violate=self.violate, sessions=self.sessions)
-            self.pipeline.append(clipper)
+            stages.append(clipper)
         else:
             logger.warn('sessions are not provided, skip clipping')
         
-        if len(self.pipeline) == 0:
+        if len(stages) == 0:
             logger.warn('All preprocessing operations are skipped, return the original data')
+        self.pipeline = Pipeline(stages, verbose=self.verbose)
 
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
-        result_data = combined_data.copy(deep=True)
-        self._build_pipeline()
-        for pipe in self.pipeline:
-            logger.info('Execute ' + str(pipe) + " on file: " + self.file)
-            pipe.set_meta(self.meta)
-            result_data = pipe._run_on_data(result_data, data_start_indicator, data_stop_indicator)
-            logger.debug(result_data.shape)
+        # the stages share one copy of the data, see `Pipeline`
+        result_data = self.pipeline.run(combined_data, self.meta, data_start_indicator, data_stop_indicator, file=self.file)
+        logger.debug(result_data.shape)
         return result_data
 
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.output_folder, 'sensor', ext=self.output_format)
+
     def _post_process(self, result_data):
-        output_file = mu.generate_output_filepath(self.file, self.output_folder, 'sensor')
+        output_file = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_file)):
             os.makedirs(os.path.dirname(output_file))
         if result_data.empty:
             logger.warn("result data is empty, skip saving hourly data")
             return pd.DataFrame()
-        result_data.to_csv(output_file, index=False, float_format='%.9f')
+        mhapi.helpers.exporter.export_sensor_file_mhealth(result_data, output_file, float_format='%.9f')
         if self.verbose:
             logger.info('Saved preprocessed accelerometer data to ' + output_file)
         
@@ -8,26 +8,138 @@ import pandas as pd
 import numpy as np
 from .. import api as mhapi
 import os
+import shutil
+import tempfile
 from ..utility import logger
 
+# attributes of processors that hold paths of side inputs
+SIDE_INPUTS = ('sessions', 'static_chunks', 'offsets', 'class_map', 'orientation_fixes', 'location_mapping')
+
 class Processor:
-	def __init__(self, verbose=True, violate=False, independent=True):
+	# whether `_run_on_arrays` of the processor changes the arrays passed to it, see `Pipeline`
+	IN_PLACE = False
+
+	def __init__(self, verbose=True, violate=False, independent=True, context=None):
 		self.verbose = verbose
 		self.independent = independent
 		self.violate = violate
+		self.context = context
 		self.name = 'BaseProcessor'
 	
-	def run_on_file(self, file, prev_file=None, next_file=None):
+	def run_on_file(self, file, prev_file=None, next_file=None, context=None, block_duration=None, block_overlap=0):
+		"""Run the processor on a file
+
+		context: length in seconds of the data to be loaded from the end of `prev_file` and the start of `next_file`. If it is None, `self.context` will be used, if both are None, the adjacent files are loaded as a whole.
+
+		block_duration: if it is provided, the file is loaded and processed in blocks of `block_duration` seconds with `block_overlap` seconds of data shared with the adjacent blocks and files, and the results of the blocks are concatenated before post processing. If `block_overlap` is 0, processors that are not independent use `stream_overlap`.
+		"""
+		result_data = self.compute_on_file(file, prev_file=prev_file, next_file=next_file, context=context, block_duration=block_duration, block_overlap=block_overlap)
+		result_data = self._post_process(result_data)
+		return result_data
+
+	def compute_on_file(self, file, prev_file=None, next_file=None, context=None, block_duration=None, block_overlap=0):
+		"""Like `run_on_file` but without post processing, so that no derived file is written. It is used to measure the cost of a script."""
 		self.file = file
 		if self.independent:
 			prev_file = None
 			next_file = None
+		if context is None:
+			context = self.context
 		self._extract_meta(file)
-		data, prev_data, next_data = self._load_file(file, prev_file=prev_file, next_file=next_file)
+		if block_duration is not None:
+			return self._run_on_blocks(file, prev_file, next_file, block_duration, block_overlap)
+		if context is None:
+			data, prev_data, next_data = self._load_file(file, prev_file=prev_file, next_file=next_file)
+		else:
+			data, prev_data, next_data = self._load_file(file, prev_file=prev_file, next_file=next_file, context=context)
 		combined_data, data_start_indicator, data_stop_indicator = self._merge_data(data, prev_data=prev_data, next_data=next_data)
-		result_data = self._run_on_data(combined_data, data_start_indicator, data_stop_indicator)
-		result_data = self._post_process(result_data)
-		return result_data
+		return self._run_on_data(combined_data, data_start_indicator, data_stop_indicator)
+
+	def run_on_shard(self, file, prev_file=None, next_file=None, shard_start=None, shard_stop=None, block_duration=3600, block_overlap=0):
+		"""Run the processor on the blocks of a file that start in [shard_start, shard_stop), returns the result before post processing
+
+		Large files are split into shards processed by different workers, the results of all shards of a file are post processed together with `finish_shards`.
+		"""
+		self.file = file
+		if self.independent:
+			prev_file = None
+			next_file = None
+		self._extract_meta(file)
+		return self._run_on_blocks(file, prev_file, next_file, block_duration, block_overlap, shard_start=shard_start, shard_stop=shard_stop)
+
+	def finish_shards(self, file, results):
+		"""Post process the results of the shards of a file in the order of the shards"""
+		self.file = file
+		self._extract_meta(file)
+		results = [result for result in results if result is not None and not result.empty]
+		if len(results) == 0:
+			return self._post_process(pd.DataFrame())
+		return self._post_process(pd.concat(results, axis=0, ignore_index=True))
+
+	def run_on_stream(self, files, block_duration=3600, block_overlap=None, store_dir=None):
+		"""Run the processor on the sorted hourly files of one participant and sensor as one contiguous stream, returns the concatenated results after post processing
+
+		The stream is processed in blocks of `block_duration` seconds inside the hours of each file, each with `block_overlap` seconds of data before and after it taken from the stream, so windows crossing the boundaries of blocks and files see all of their data. If `block_overlap` is None, `stream_overlap` of the processor is used. Independent processors only see the data of the current file. The results of the blocks of a file are post processed together, so the same derived files are written as by `run_on_file`.
+
+		store_dir: if it is provided, the stream is memory-mapped from a temporary store in this folder instead of being kept in memory.
+		"""
+		if block_overlap is None:
+			block_overlap = self.stream_overlap()
+		overlap = np.timedelta64(int(float(block_overlap) * 1000), 'ms')
+		duration = np.timedelta64(int(float(block_duration) * 1000), 'ms')
+		stream, tmp_dir = self._load_stream(files, store_dir=store_dir)
+		results = []
+		try:
+			for file, first_ms, last_ms in stream.files:
+				self.file = file
+				self._extract_meta(file)
+				# the hours of the file, as in `_merge_data`
+				data_start_indicator = np.datetime64(first_ms, 'ms').astype('datetime64[h]')
+				data_stop_indicator = np.datetime64(last_ms, 'ms').astype('datetime64[h]') + np.timedelta64(1, 'h')
+				if self.independent:
+					file_stream = stream.slice(data_start_indicator, data_stop_indicator)
+				else:
+					file_stream = stream
+				self.meta['stream_range'] = (file_stream.start_time, file_stream.stop_time)
+				file_results = []
+				block_start = data_start_indicator.astype('datetime64[ms]')
+				while block_start < data_stop_indicator:
+					block_stop = min(block_start + duration, data_stop_indicator.astype('datetime64[ms]'))
+					combined_data = file_stream.slice(block_start - overlap, block_stop + overlap)
+					if not combined_data.empty:
+						block_result = self._run_on_data(combined_data.to_dataframe(), block_start, block_stop)
+						if self.verbose:
+							logger.info("Processed block " + str(block_start) + " - " + str(block_stop))
+						if block_result is not None and not block_result.empty:
+							file_results.append(block_result)
+					block_start = block_stop
+				result_data = pd.concat(file_results, axis=0, ignore_index=True) if len(file_results) > 0 else pd.DataFrame()
+				result_data = self._post_process(result_data)
+				if result_data is not None and not result_data.empty:
+					results.append(result_data)
+		finally:
+			if tmp_dir is not None:
+				del stream
+				shutil.rmtree(tmp_dir, ignore_errors=True)
+		if len(results) == 0:
+			return pd.DataFrame()
+		return pd.concat(results, axis=0, ignore_index=True)
+
+	def stream_overlap(self):
+		"""Seconds of data around each block of `run_on_stream` by default"""
+		return self.context if self.context is not None else 60
+
+	def output_filepath(self, file):
+		"""The derived file written for `file` by `_post_process`, None if the processor does not write one. Processors with a derived file can be run incrementally."""
+		return None
+
+	def dependencies(self):
+		"""Side input files used for every data file, changing them makes the derived files out of date"""
+		paths = [getattr(self, name, None) for name in SIDE_INPUTS]
+		return [path for path in paths if isinstance(path, str)]
+
+	def can_run_on_blocks(self):
+		return type(self)._load_blocks is not Processor._load_blocks
 
 	def set_meta(self, meta):
 		self.meta = meta
@@ -60,6 +172,38 @@ class Processor:
 	def _load_file(self, file, prev_file=None, next_file=None):
 		raise NotImplementedError("Subclass must implement this method")
 
+	def _load_blocks(self, file, prev_file=None, next_file=None, block_duration=3600, block_overlap=0):
+		raise NotImplementedError("Subclass must implement this method to support block processing")
+
+	def _run_on_blocks(self, file, prev_file, next_file, block_duration, block_overlap, shard_start=None, shard_stop=None):
+		if not self.independent and float(block_overlap) <= 0:
+			# processors that are not independent need the data around each block, as with the adjacent files of `run_on_file`
+			block_overlap = self.stream_overlap()
+		results = []
+		for combined_data, data_start_indicator, data_stop_indicator in self._load_blocks(file, prev_file=prev_file, next_file=next_file, block_duration=block_duration, block_overlap=block_overlap):
+			if shard_stop is not None and data_start_indicator >= shard_stop:
+				break
+			if combined_data.empty or (shard_start is not None and data_start_indicator < shard_start):
+				continue
+			block_result = self._run_on_data(combined_data, data_start_indicator, data_stop_indicator)
+			if self.verbose:
+				logger.info("Processed block " + str(data_start_indicator) + " - " + str(data_stop_indicator))
+			if block_result is not None and not block_result.empty:
+				results.append(block_result)
+		if len(results) == 0:
+			return pd.DataFrame()
+		return pd.concat(results, axis=0, ignore_index=True)
+
+	def _load_stream(self, files, store_dir=None):
+		raise NotImplementedError("Subclass must implement this method to support stream processing")
+
+	def _session_data(self, combined_data):
+		"""Data whose first and last timestamps are used as the session when no sessions are provided, the whole stream with `run_on_stream`, otherwise `combined_data`"""
+		stream_range = getattr(self, 'meta', {}).get('stream_range')
+		if stream_range is None:
+			return combined_data
+		return pd.DataFrame({combined_data.columns[0]: np.array(stream_range, dtype='datetime64[ms]')})
+
 	def _merge_data(self, data, prev_data=None, next_data=None):
 		raise NotImplementedError("Subclass must implement this method")
 
@@ -73,29 +217,89 @@ class Processor:
 		return self.name
 
 class SensorProcessor(Processor):
-	def __init__(self, verbose=True, violate=False, independent=True):
-		Processor.__init__(self, verbose=verbose, violate=violate, independent=independent)
+	def __init__(self, verbose=True, violate=False, independent=True, context=None):
+		Processor.__init__(self, verbose=verbose, violate=violate, independent=independent, context=context)
 		self.name = 'SensorProcessor'
 	
-	def _load_file(self, file, prev_file=None, next_file=None):
+	def _load_file(self, file, prev_file=None, next_file=None, context=None):
 		file = os.path.normpath(os.path.abspath(file))
-		df = mhapi.helpers.importer.import_sensor_file_mhealth(file)
+		df = mhapi.cache.load_sensor_file(file)
 		if self.verbose:
 			logger.info("Current file: " + file)
 			logger.info("Previous file: " + str(prev_file))
 			logger.info("Next file: " + str(next_file))
+			if context is not None:
+				logger.info("Load " + str(context) + " seconds from adjacent files")
 		if prev_file is not None and prev_file != "None":
 			prev_file = os.path.normpath(os.path.abspath(prev_file))
-			prev_df = mhapi.helpers.importer.import_sensor_file_mhealth(prev_file)
+			prev_df = mhapi.cache.load_sensor_file(prev_file, context=context, side='tail')
 		else:
 			prev_df = pd.DataFrame()
 		if next_file is not None and next_file != "None":
 			next_file = os.path.normpath(os.path.abspath(next_file))
-			next_df = mhapi.helpers.importer.import_sensor_file_mhealth(next_file)
+			next_df = mhapi.cache.load_sensor_file(next_file, context=context, side='head')
 		else:
 			next_df = pd.DataFrame()
 		return df, prev_df, next_df
+
+	def _load_blocks(self, file, prev_file=None, next_file=None, block_duration=3600, block_overlap=0):
+		file = os.path.normpath(os.path.abspath(file))
+		if prev_file is not None and prev_file != "None" and float(block_overlap) > 0:
+			prev_df = mhapi.cache.load_sensor_file(prev_file, context=block_overlap, side='tail')
+		else:
+			prev_df = pd.DataFrame()
+		if next_file is not None and next_file != "None" and float(block_overlap) > 0:
+			next_df = mhapi.cache.load_sensor_file(next_file, context=block_overlap, side='head')
+		else:
+			next_df = pd.DataFrame()
+		blocks = mhapi.helpers.importer.iter_sensor_file_mhealth(file, block_duration=block_duration, overlap=block_overlap)
+		# look one block ahead so that the data of the next file is only appended to the last block
+		block = next(blocks, None)
+		is_first = True
+		while block is not None:
+			next_block = next(blocks, None)
+			df, block_start, block_stop = block
+			parts = [df]
+			if is_first and not prev_df.empty:
+				parts = [prev_df] + parts
+			if next_block is None and not next_df.empty:
+				parts = parts + [next_df]
+			combined_data = pd.concat(parts, axis=0, ignore_index=True)[df.columns] if len(parts) > 1 else df
+			yield combined_data, block_start, block_stop
+			is_first = False
+			block = next_block
 	
+	def _load_stream(self, files, store_dir=None):
+		"""Combine sorted sensor files into a `SensorStore`, returns the store and its temporary folder (None if it is in memory)"""
+		files = [os.path.normpath(os.path.abspath(file)) for file in files]
+		if store_dir is not None:
+			os.makedirs(store_dir, exist_ok=True)
+			tmp_dir = tempfile.mkdtemp(prefix='stream_', dir=store_dir)
+			try:
+				return mhapi.SensorStore.build(files, tmp_dir), tmp_dir
+			except Exception:
+				shutil.rmtree(tmp_dir, ignore_errors=True)
+				raise
+		timestamps = []
+		values = []
+		file_ranges = []
+		columns = None
+		for file in files:
+			df = mhapi.cache.load_sensor_file(file)
+			if df.empty:
+				continue
+			if columns is None:
+				columns = [str(col) for col in df.columns]
+			ts = df.iloc[:, 0].values.astype('datetime64[ms]').astype(np.int64)
+			if len(file_ranges) > 0 and ts[0] < file_ranges[-1][2]:
+				raise ValueError('Files should be sorted by time and not overlap: ' + file)
+			file_ranges.append((file, int(ts[0]), int(ts[-1])))
+			timestamps.append(ts)
+			values.append(df.iloc[:, 1:].values.astype(np.float64))
+		if columns is None:
+			raise ValueError('No data is found in the provided files')
+		return mhapi.SensorStore(np.concatenate(timestamps), np.concatenate(values, axis=0), columns, files=file_ranges), None
+
 	def _merge_data(self, data, prev_data=None, next_data=None):
 		if data.empty:
 			return pd.DataFrame(), None, None
@@ -120,19 +324,22 @@ class AnnotationProcessor(Processor):
 	
 	def _load_file(self, file, prev_file=None, next_file=None):
 		file = os.path.normpath(os.path.abspath(file))
-		df = pd.read_csv(file, parse_dates=[0,1,2], infer_datetime_format=True)
+		df = mhapi.cache.load_annotation_file(file, self._read_annotation_file)
 		if prev_file is not None and prev_file != "None":
 			prev_file = os.path.normpath(os.path.abspath(prev_file))
-			prev_df = pd.read_csv(prev_file, parse_dates=[0,1,2], infer_datetime_format=True)
+			prev_df = mhapi.cache.load_annotation_file(prev_file, self._read_annotation_file)
 		else:
 			prev_df = pd.DataFrame()
 		if next_file is not None and next_file != "None":
 			next_file = os.path.normpath(os.path.abspath(next_file))
-			next_df = pd.read_csv(next_file, parse_dates=[0,1,2], infer_datetime_format=True)
+			next_df = mhapi.cache.load_annotation_file(next_file, self._read_annotation_file)
 		else:
 			next_df = pd.DataFrame()
 		return df, prev_df, next_df
 
+	def _read_annotation_file(self, file):
+		return mhapi.helpers.importer.import_annotation_file_mhealth(file)
+
 	def _merge_data(self, data, prev_data=None, next_data=None):
 		columns = data.columns
 		combined_data = pd.concat([prev_data, data, next_data], axis=0, ignore_index=True)
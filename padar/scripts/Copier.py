@@ -31,9 +31,12 @@ class Copier(Processor):
 		# combined_data is actually the filename
 		return combined_data
 
+	def output_filepath(self, file):
+		return mu.generate_output_filepath(file, self.setname)
+
 	def _post_process(self, result_data):
 		# result_data is actually the filename
-		output_file = mu.generate_output_filepath(self.file, self.setname)
+		output_file = self.output_filepath(self.file)
 		if not os.path.exists(os.path.dirname(output_file)):
 			os.makedirs(os.path.dirname(output_file))
 		shutil.copyfile(self.file, output_file)
@@ -0,0 +1,34 @@
+"""
+
+Named intermediate results shared by the steps of a script
+
+A dataflow holds the intermediates of the data of one file, such as the sampling rate, the session bounds, the feature windows or the filtered data, each defined by a function of the dataflow that computes it from other intermediates. An intermediate is computed when it is first used and reused by every later step, so steps that need the same intermediate do not compute it again.
+
+"""
+
+class Dataflow:
+	def __init__(self):
+		self._producers = {}
+		self._values = {}
+
+	def define(self, name, producer):
+		"""Define the intermediate `name` as `producer(dataflow)`"""
+		self._producers[name] = producer
+		self._values.pop(name, None)
+
+	def set(self, name, value):
+		self._values[name] = value
+
+	def __getitem__(self, name):
+		if name not in self._values:
+			if name not in self._producers:
+				raise KeyError('Intermediate ' + name + ' is not defined')
+			self._values[name] = self._producers[name](self)
+		return self._values[name]
+
+	def __contains__(self, name):
+		return name in self._values or name in self._producers
+
+	def computed(self):
+		"""Names of the intermediates computed so far"""
+		return list(self._values.keys())
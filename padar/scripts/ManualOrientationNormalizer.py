@@ -15,6 +15,8 @@ Usage:
 import os
 import pandas as pd
 from ..api import utils as mu
+from ..api import side_tables
+from ..api.helpers import exporter
 from ..api import numeric_transformation as mnt
 from .BaseProcessor import SensorProcessor
 from ..utility import logger
@@ -23,11 +25,12 @@ def build(**kwargs):
     return ManualOrientationNormalizer(**kwargs).run_on_file
 
 class ManualOrientationNormalizer(SensorProcessor):
-    def __init__(self, verbose=True, independent=True, orientation_fixes=None, setname='manual_orientation_normalization'):
+    def __init__(self, verbose=True, independent=True, orientation_fixes=None, setname='manual_orientation_normalization', output_format=None):
         SensorProcessor.__init__(self, verbose=verbose, independent=independent)
         self.name = 'ManualOrientationNormalizer'
         self.orientation_fixes = orientation_fixes
         self.setname = setname
+        self.output_format = output_format
 
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
         orientation_fixes = self.orientation_fixes
@@ -38,9 +41,7 @@ class ManualOrientationNormalizer(SensorProcessor):
             y_axis_change = "Y"
             z_axis_change = "Z"
         else:
-            orientation_fix_map = pd.read_csv(orientation_fixes)
-            selection_mask = (orientation_fix_map.iloc[:,0] == pid) & (orientation_fix_map.iloc[:,1] == sid)
-            selected_fix_map = orientation_fix_map.loc[selection_mask, :]
+            selected_fix_map = side_tables.select(orientation_fixes, {0: pid, 1: sid})
             if selected_fix_map.shape[0] == 1:
                 x_axis_change = selected_fix_map.iloc[0, 3]
                 y_axis_change = selected_fix_map.iloc[0, 4]
@@ -59,11 +60,14 @@ class ManualOrientationNormalizer(SensorProcessor):
         result_df.iloc[:,1:4] = fixed_values
         return result_df
 
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.setname, 'sensor', ext=self.output_format)
+
     def _post_process(self, result_data):
-        output_path = mu.generate_output_filepath(self.file, self.setname, 'sensor')
+        output_path = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_path)):
             os.makedirs(os.path.dirname(output_path))
-        result_data.to_csv(output_path, index=False, float_format='%.3f')
+        exporter.export_sensor_file_mhealth(result_data, output_path, float_format='%.3f')
         if self.verbose:
             logger.info('Saved manually orientation fixed data to ' + output_path)
         return pd.DataFrame()
\ No newline at end of file
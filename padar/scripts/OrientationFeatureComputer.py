@@ -22,11 +22,24 @@ import numpy as np
 from ..api import numeric_feature as mnf
 from ..api import windowing as mw
 from ..api import utils as mu
+from ..api.helpers import exporter
 from .BaseProcessor import SensorProcessor
 
+FEATURE_NAMES = [
+    "MEDIAN_X_ANGLE",
+    "MEDIAN_Y_ANGLE",
+    "MEDIAN_Z_ANGLE",
+    "RANGE_X_ANGLE",
+    "RANGE_Y_ANGLE",
+    "RANGE_Z_ANGLE"
+]
+
 def build(**kwargs):
     return OrientationFeatureComputer(**kwargs).run_on_file
 
+def output_columns(**kwargs):
+    return ['START_TIME', 'STOP_TIME'] + FEATURE_NAMES + ['pid', 'sid']
+
 class OrientationFeatureComputer(SensorProcessor):
     def __init__(self, verbose=True, independent=False, setname='Feature', sessions='DerivedCrossParticipants/sessions.csv', ws=12800, ss=12800, subwins=4):
         SensorProcessor.__init__(self, verbose=verbose, independent=independent)
@@ -38,44 +51,46 @@ class OrientationFeatureComputer(SensorProcessor):
         self.subwins = 4
     
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
-        st, et = mu.get_st_et(combined_data, self.meta['pid'], self.sessions, st_col=0, et_col=0)
-        ws = self.ws
-        ss = self.ss
-        subwins = self.subwins
-
+        st, et = mu.get_st_et(self._session_data(combined_data), self.meta['pid'], self.sessions, st_col=0, et_col=0)
         if self.verbose:
             print('Session start time: ' + str(st))
             print('Session stop time: ' + str(et))
 
         sr = mu._sampling_rate(combined_data)
+        chunk_windows = self._windows(st, et, data_start_indicator, data_stop_indicator)
+        if len(chunk_windows) == 0:
+            return pd.DataFrame()
+        return self._compute_features(combined_data, chunk_windows, sr)
+
+    def _windows(self, st, et, data_start_indicator, data_stop_indicator):
+        """The windows of the session that start in [data_start_indicator, data_stop_indicator)"""
+        windows = mw.get_sliding_window_boundaries(start_time=st, stop_time=et, window_duration=self.ws, step_size=self.ss)
+        chunk_windows_mask = (windows[:,0] >= data_start_indicator) & (windows[:,0] < data_stop_indicator)
+        return windows[chunk_windows_mask,:]
+
+    def _compute_features(self, combined_data, chunk_windows, sr):
+        subwins = self.subwins
 
         features = [
             lambda x: mnf.accelerometer_orientation_features(x, subwins=subwins)
         ]
 
-        feature_names = [
-            "MEDIAN_X_ANGLE",
-            "MEDIAN_Y_ANGLE",
-            "MEDIAN_Z_ANGLE",
-            "RANGE_X_ANGLE",
-            "RANGE_Y_ANGLE",
-            "RANGE_Z_ANGLE"
-        ]
-
-        windows = mw.get_sliding_window_boundaries(start_time=st, stop_time=et, window_duration=ws, step_size=ss)
-        chunk_windows_mask = (windows[:,0] >= data_start_indicator) & (windows[:,0] < data_stop_indicator)
-        chunk_windows = windows[chunk_windows_mask,:]
-        if len(chunk_windows) == 0:
-            return pd.DataFrame()
-        result_data = mw.apply_to_sliding_windows(df=combined_data, sliding_windows=chunk_windows, window_operations=features, operation_names=feature_names, return_dataframe=True)
+        result_data = mw.apply_to_sliding_windows(df=combined_data, sliding_windows=chunk_windows, window_operations=features, operation_names=FEATURE_NAMES, return_dataframe=True)
         return result_data
 
+    def stream_overlap(self):
+        # windows starting in a block need one window of data after it
+        return float(self.ws) / 1000
+
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.setname, 'feature', 'Orientation')
+
     def _post_process(self, result_data):
-        output_path = mu.generate_output_filepath(self.file, self.setname, 'feature', 'Orientation')
+        output_path = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_path)):
             os.makedirs(os.path.dirname(output_path))
             
-        result_data.to_csv(output_path, index=False, float_format='%.6f')
+        exporter.export_csv(result_data, output_path, float_format='%.6f')
         if self.verbose:
             print('Saved feature data to ' + output_path)
         result_data['pid'] = self.meta['pid']
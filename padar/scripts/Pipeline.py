@@ -0,0 +1,48 @@
+"""
+
+Engine to run processors as fused stages over the same data
+
+The data is kept as one timestamp array and one value array instead of a dataframe per stage. Processors run as stages with `_run_on_arrays(ts, values, data_start_indicator, data_stop_indicator)` returning the new arrays. A stage declares with `IN_PLACE` that it changes the arrays passed to it. The arrays are copied once before the first such stage, so the input data (e.g. frames shared by the frame cache) is never changed, and later stages work on the same arrays. Stages that change the number of rows return slices of the arrays where possible, so data is only allocated when rows are actually dropped from the middle. Processors without `_run_on_arrays` run on a dataframe built from the arrays.
+
+"""
+
+import numpy as np
+import pandas as pd
+from ..utility import logger
+
+class Pipeline:
+	def __init__(self, stages, verbose=True):
+		self.stages = list(stages)
+		self.verbose = verbose
+
+	def __len__(self):
+		return len(self.stages)
+
+	def run(self, data, meta, data_start_indicator, data_stop_indicator, file=None):
+		"""Run the stages in order on a sensor dataframe, returns the resulting dataframe"""
+		columns = data.columns
+		input_ts = data.iloc[:, 0].values
+		input_values = data.iloc[:, 1:].values
+		ts, values = input_ts, input_values
+		owned = False
+		for stage in self.stages:
+			if self.verbose:
+				logger.info('Execute ' + str(stage) + ' on file: ' + str(file))
+			stage.set_meta(meta)
+			stage.file = file
+			if hasattr(stage, '_run_on_arrays'):
+				if stage.IN_PLACE and not owned:
+					ts, values = ts.copy(), values.copy()
+					owned = True
+				ts, values = stage._run_on_arrays(ts, values, data_start_indicator, data_stop_indicator)
+			else:
+				result_data = stage._run_on_data(self._to_dataframe(ts, values, columns), data_start_indicator, data_stop_indicator)
+				ts, values = result_data.iloc[:, 0].values, result_data.iloc[:, 1:].values
+			# arrays returned by a stage are ours unless they are (views of) the input data
+			owned = owned or not (np.may_share_memory(ts, input_ts) or np.may_share_memory(values, input_values))
+		return self._to_dataframe(ts, values, columns)
+
+	def _to_dataframe(self, ts, values, columns):
+		df = pd.DataFrame(values, columns=columns[1:], copy=False)
+		df.insert(0, columns[0], ts)
+		return df
@@ -17,15 +17,17 @@ def build(**kwargs):
     return clipper.run_on_file
 
 class SensorClipper(SensorProcessor):
-    def __init__(self, verbose=True, independent=True, violate=False, sessions=None, start_time=None, stop_time=None, output_folder=None):
+    def __init__(self, verbose=True, independent=True, violate=False, sessions=None, start_time=None, stop_time=None, output_folder=None, output_format=None):
         SensorProcessor.__init__(self, verbose=verbose, independent=independent, violate=violate)
         self.name = 'SensorClipper'
         self.sessions = sessions
         self.start_time = start_time
         self.stop_time = stop_time
         self.output_folder = output_folder
+        self.output_format = output_format
 
-    def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
+    def _clip_range(self, data_start_indicator, data_stop_indicator):
+        """Start and stop time of the data to be kept, None for the start or the stop of the data"""
         if self.verbose:
             logger.info("Start clipping data...")
             logger.info("Start time of current file: " + str(data_start_indicator))
@@ -38,8 +40,7 @@ class SensorClipper(SensorProcessor):
         if start_time is None and stop_time is None:
             if sessions is not None and pid is not None:
                 sessions = os.path.normpath(os.path.abspath(sessions))
-                session_df = pd.read_csv(sessions, parse_dates=[0, 1], infer_datetime_format=True)
-                selected_sessions = session_df.loc[session_df['pid'] == pid, :]
+                selected_sessions = mhapi.side_tables.select(sessions, {'pid': pid}, parse_dates=[0, 1])
                 if selected_sessions.shape[0] == 0:
                     start_time = None
                     stop_time = None
@@ -78,7 +79,10 @@ class SensorClipper(SensorProcessor):
                 et = data_stop_indicator
         else:
             et = stop_time
+        return st, et
 
+    def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
+        st, et = self._clip_range(data_start_indicator, data_stop_indicator)
         clipped_df = mhapi.clip_dataframe(combined_data, start_time=st, stop_time=et)
         if self.verbose:
             logger.info("Finish clipping data...")
@@ -86,11 +90,31 @@ class SensorClipper(SensorProcessor):
             logger.info("Stop time of clipped current file: " + str(et))
         return clipped_df
 
+    def _run_on_arrays(self, ts, values, data_start_indicator, data_stop_indicator):
+        # same rows as `clip_dataframe`, sorted timestamps are clipped to slices of the arrays without copying them
+        st, et = self._clip_range(data_start_indicator, data_stop_indicator)
+        if ts.shape[0] == 0:
+            return ts, values
+        if st is None:
+            st = ts[0]
+        if et is None:
+            et = ts[-1]
+        if np.all(ts[1:] >= ts[:-1]):
+            start, stop = np.searchsorted(ts, [st, et], side='left')
+            if start < stop:
+                return ts[start:stop], values[start:stop]
+            return ts[0:0], values[0:0]
+        mask = (ts >= st) & (ts < et)
+        return ts[mask], values[mask]
+
+    def output_filepath(self, file):
+        return mhapi.generate_output_filepath(file, self.output_folder, 'sensor', ext=self.output_format)
+
     def _post_process(self, result_data):
-        output_path = mhapi.generate_output_filepath(self.file, self.output_folder, 'sensor')
+        output_path = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_path)):
             os.makedirs(os.path.dirname(output_path))
-        result_data.to_csv(output_path, index=False, float_format='%.9f')
+        mhapi.helpers.exporter.export_sensor_file_mhealth(result_data, output_path, float_format='%.9f')
         if self.verbose:
             logger.info("Saved clipped data frame to " + output_path)
         return pd.DataFrame()
@@ -9,31 +9,50 @@ Usage:
             `mh -r . -p SPADES_1 process --par --pattern MasterSynced/**/*.sensor.csv SensorResampler --new_sr 80`
     Debug: 
         `mh -r . -p SPADES_1 process --verbose --pattern MasterSynced/**/*.sensor.csv SensorFilter --setname test_filtering --high_cutoff 20`
+
+    Only the last and first few seconds of the previous and next hourly files are loaded as the filter margin, long enough for the transient of the filter to decay (see `filter_margin`). Use `--context <seconds>` to change it.
 """
 
 import os
+import numpy as np
 import pandas as pd
 from ..api import filter as mf 
 from ..api import utils as mu
+from ..api.helpers import exporter
 from .BaseProcessor import SensorProcessor
 from ..utility import logger
 def build(**kwargs):
     return SensorFilter(**kwargs).run_on_file
 
 class SensorFilter(SensorProcessor):
-    def __init__(self, verbose=True, independent=False, order=4, ftype='butter', btype='lowpass', low_cutoff=None, high_cutoff=None, setname='Filtered'):
-        SensorProcessor.__init__(self, verbose=verbose, independent=independent)
+    def __init__(self, verbose=True, independent=False, order=4, ftype='butter', btype='lowpass', low_cutoff=None, high_cutoff=None, setname='Filtered', output_format=None, context=None):
+        SensorProcessor.__init__(self, verbose=verbose, independent=independent, context=context)
         self.name = 'SensorFilter'
         self.ftype = ftype
         self.btype = btype
         self.setname = setname
+        self.output_format = output_format
         self.order = order
         self.low_cutoff = low_cutoff
         self.high_cutoff = high_cutoff
+        if self.context is None:
+            self.context = self.filter_margin()
+
+    def filter_margin(self):
+        """Seconds of data needed before and after the filtered data for the transient of the filter to decay"""
+        cutoffs = [float(cutoff) for cutoff in [self.low_cutoff, self.high_cutoff] if cutoff is not None]
+        if len(cutoffs) == 0:
+            return 0
+        # the slowest pole of a butterworth filter of order N decays with the time constant 1 / (2 pi fc sin(pi / 2N)), 20 time constants are below the saved precision
+        tau = 1.0 / (2 * np.pi * min(cutoffs) * np.sin(np.pi / (2 * int(self.order))))
+        return float(np.ceil(20 * tau))
 
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
-        ftype = self.ftype
         sr = mu._sampling_rate(combined_data)
+        return self._filter(combined_data, sr, data_start_indicator, data_stop_indicator)
+
+    def _filter(self, combined_data, sr, data_start_indicator, data_stop_indicator):
+        ftype = self.ftype
         if self.verbose:
             logger.info('sampling rate is: ' + str(sr))
         if self.low_cutoff is None and self.high_cutoff is None:
@@ -55,11 +74,14 @@ class SensorFilter(SensorProcessor):
             result_data = result_data.loc[mask,:]
         return result_data
 
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.setname, 'sensor', ext=self.output_format)
+
     def _post_process(self, result_data):
-        output_file = mu.generate_output_filepath(self.file, self.setname, 'sensor')
+        output_file = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_file)):
             os.makedirs(os.path.dirname(output_file))
-        result_data.to_csv(output_file, index=False, float_format='%.3f')
+        exporter.export_sensor_file_mhealth(result_data, output_file, float_format='%.3f')
         if self.verbose:
             logger.info('Saved filtered data to ' + output_file)
         return pd.DataFrame()
\ No newline at end of file
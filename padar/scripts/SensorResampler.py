@@ -9,24 +9,31 @@ Usage:
             `mh -r . -p SPADES_1 process --par --pattern MasterSynced/**/*.sensor.csv SensorResampler --new_sr 80`
     Debug: 
         `mh -r . -p SPADES_1 process --verbose --pattern MasterSynced/**/*.sensor.csv SensorResampler --new_sr 80`
+
+    Only the last and first `gap_threshold` plus one seconds of the previous and next hourly files are loaded as the interpolation margin. Use `--context <seconds>` to change it.
 """
 
 import os
 import pandas as pd
 from ..api.interpolate import interpolate
 from ..api import utils as mu
+from ..api.helpers import exporter
 from .BaseProcessor import SensorProcessor
 
 def build(**kwargs):
     return SensorResampler(**kwargs).run_on_file
 
 class SensorResampler(SensorProcessor):
-    def __init__(self, verbose=True, independent=False, new_sr=None, gap_threshold=1, setname='Resampled'):
-        SensorProcessor.__init__(self, verbose=verbose, independent=independent)
+    def __init__(self, verbose=True, independent=False, new_sr=None, gap_threshold=1, setname='Resampled', output_format=None, context=None):
+        SensorProcessor.__init__(self, verbose=verbose, independent=independent, context=context)
         self.name = 'SensorResampler'
         self.gap_threshold = gap_threshold
         self.new_sr = new_sr
         self.setname = setname
+        self.output_format = output_format
+        if self.context is None:
+            # samples closer than the gap threshold are interpolated across the file boundary, the spline barely depends on samples further away
+            self.context = float(self.gap_threshold) + 1
 
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
         if self.new_sr is None:
@@ -44,11 +51,14 @@ class SensorResampler(SensorProcessor):
             result_data = interpolate(data, verbose=self.verbose, prev_df=prev_data, next_df=next_data, sr=self.new_sr, start_time=data_start_indicator, stop_time=data_stop_indicator, gap_threshold=self.gap_threshold)
         return result_data
 
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.setname, 'sensor', ext=self.output_format)
+
     def _post_process(self, result_data):
-        output_file = mu.generate_output_filepath(self.file, self.setname, 'sensor')
+        output_file = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_file)):
             os.makedirs(os.path.dirname(output_file))
-        result_data.to_csv(output_file, index=False, float_format='%.3f')
+        exporter.export_sensor_file_mhealth(result_data, output_file, float_format='%.3f')
         if self.verbose:
             print('Saved interpolated data to ' + output_file)
         return pd.DataFrame()
\ No newline at end of file
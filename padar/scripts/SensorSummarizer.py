@@ -6,7 +6,7 @@ import os
 import pandas as pd
 from ..api import filter as mf 
 from ..api import utils as mu
-from ..api.helpers import summarizer
+from ..api.helpers import summarizer, exporter
 from .BaseProcessor import SensorProcessor
 
 def build(**kwargs):
@@ -25,11 +25,14 @@ class SensorSummarizer(SensorProcessor):
         result_data = summarizer.summarize_sensor(combined_data, method=self.method, window=self.window_size)
         return result_data
 
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.setname, 'feature', self.method)
+
     def _post_process(self, result_data):
-        output_file = mu.generate_output_filepath(self.file, self.setname, 'feature', self.method)
+        output_file = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_file)):
             os.makedirs(os.path.dirname(output_file))
-        result_data.to_csv(output_file, index=False, float_format='%.3f')
+        exporter.export_csv(result_data, output_file, float_format='%.3f')
         if self.verbose:
             print('Saved summarization data to ' + output_file)
         result_data['pid'] = self.meta['pid']
@@ -3,6 +3,8 @@
 
   If your dataset has annotation files, use annotation files to extract sessions. Otherwise, use sensor files to extract sessions.
 
+  Files indexed with `pad index` are not read, their first and last timestamps are taken from their metadata sidecars.
+
   Usage:
     pad -p <PID> -r <root> process -p <PATTERN> --par -o <OUTPUT_FILEPATH> SessionExtractor
 
@@ -32,10 +34,14 @@ import os
 import pandas as pd
 import numpy as np
 from .BaseProcessor import AnnotationProcessor, SensorProcessor, Processor
+from ..api import sidecar
 
 def build(**kwargs):
   return SessionExtractor(**kwargs).run_on_file
 
+def output_columns(**kwargs):
+  return ['START_TIME', 'STOP_TIME', 'pid', 'date', 'hour', 'annotator']
+
 class SessionExtractor(Processor):
   def __init__(self, verbose=True, independent=True, violate=False):
     Processor.__init__(self, verbose=verbose, independent=independent, violate=violate)
@@ -44,11 +50,28 @@ class SessionExtractor(Processor):
     self.name = 'SessionExtractor'
 
   def _load_file(self, file, prev_file=None, next_file=None):
+    if prev_file is None and next_file is None:
+      bounds = self._load_bounds(file)
+      if bounds is not None:
+        return bounds, pd.DataFrame(), pd.DataFrame()
     if self.meta['file_type'] == 'sensor':
       return self.sensorProcessor._load_file(file, prev_file=prev_file, next_file=next_file)
     elif self.meta['file_type'] == 'annotation':
       return self.annotationProcessor._load_file(file, prev_file=prev_file, next_file=next_file)
 
+  def _load_bounds(self, file):
+    # first and last rows of the timestamp columns from a fresh sidecar
+    meta = sidecar.read(file)
+    if meta is None or meta.get('rows', 0) == 0 or 'first_times' not in meta or None in meta['first_times'] + meta['last_times']:
+      return None
+    n_cols = len(meta['first_times'])
+    if self.meta['file_type'] == 'annotation' and n_cols < 3:
+      return None
+    data = {}
+    for i in range(n_cols):
+      data[i] = [sidecar.parse_time(meta['first_times'][i]), sidecar.parse_time(meta['last_times'][i])]
+    return pd.DataFrame(data=data, columns=list(range(n_cols)))
+
   def _merge_data(self, data, prev_data=None, next_data=None):
     if self.meta['file_type'] == 'sensor':
       return self.sensorProcessor._merge_data(data, prev_data=prev_data, next_data=next_data)
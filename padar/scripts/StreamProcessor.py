@@ -0,0 +1,113 @@
+"""
+
+Run a sensor processor on live batches of samples
+
+The samples of every sensor are kept in a fixed-size `RingBuffer` of `padar.api.streaming` and each window is passed to `_run_on_data` of the processor as soon as its samples have arrived, so a stream produces the same rows as the batch scripts while the cost of a window does not grow with the length of the stream.
+
+"""
+
+import os
+import pandas as pd
+import numpy as np
+from .. import api as mhapi
+from ..utility import logger
+
+class StreamProcessor:
+	"""Run a sensor processor on live batches of samples of one or more sensors
+
+	The samples of each sensor are kept in a fixed-size `RingBuffer`. Whenever the samples of a window of `ws` milliseconds and `margin` seconds after it have arrived, the data of the window with `margin` seconds around it is passed to `_run_on_data` of the processor, which returns the row of the window, so the cost of a window does not depend on how long the stream has run. Windows start every `ss` milliseconds from `start_time` (the first sample of the sensor if it is None) and only complete windows are returned, as by the batch scripts. Processors should be built without sessions, so that their windows are aligned to the windows of the stream.
+
+	max_sr: highest sampling rate of the sensors, it sizes the buffers
+	"""
+	def __init__(self, processor, ws=12800, ss=12800, margin=0, start_time=None, max_sr=100, columns=None, pid=None):
+		self.processor = processor
+		self.ws = ws
+		self.ss = ss
+		self.margin = margin
+		self.start_time = start_time
+		self.max_sr = max_sr
+		self.columns = columns
+		self.pid = pid
+		self._buffers = {}
+		self._next_starts = {}
+		# samples of a window with its margins, the buffers hold two of them
+		self._window_samples = int(np.ceil((float(ws) / 1000 + 2 * float(margin)) * max_sr)) + 1
+
+	def push(self, ts, values, sid=None):
+		"""Add a batch of samples of sensor `sid` sorted by time, returns the rows of the windows completed by the batch"""
+		ts = mhapi.streaming.to_milliseconds(ts)
+		if ts.shape[0] == 0:
+			return pd.DataFrame()
+		values = np.asarray(values, dtype=np.float64).reshape(ts.shape[0], -1)
+		results = []
+		# large batches are added in pieces so that no sample of a pending window is overwritten
+		for i in range(0, ts.shape[0], self._window_samples):
+			results = results + self._push(sid, ts[i:i + self._window_samples], values[i:i + self._window_samples])
+		return self._concat(results)
+
+	def flush(self, sid=None):
+		"""Run the complete windows of sensor `sid` that still wait for their margin, e.g. at the end of the stream, and forget the sensor"""
+		if sid not in self._buffers:
+			return pd.DataFrame()
+		buffer = self._buffers.pop(sid)
+		next_start = self._next_starts.pop(sid)
+		results = []
+		while len(buffer) > 0 and buffer.last_ms >= next_start + self.ws:
+			results.append(self._run_on_window(buffer, sid, next_start))
+			next_start = next_start + self.ss
+		return self._concat(results)
+
+	def replay(self, file, batch_duration=1, sid=None):
+		"""Push the samples of a sensor file in batches of `batch_duration` seconds as if they arrived live, returns the rows of all windows
+
+		It is used to test a stream against the batch scripts.
+		"""
+		file = os.path.normpath(os.path.abspath(file))
+		data = mhapi.cache.load_sensor_file(file)
+		if data.empty:
+			return pd.DataFrame()
+		if sid is None:
+			sid = mhapi.extract_id(file)
+		if self.columns is None:
+			self.columns = [str(col) for col in data.columns]
+		ts = mhapi.streaming.to_milliseconds(data.iloc[:, 0].values)
+		values = data.iloc[:, 1:].values
+		batches = np.flatnonzero(np.diff((ts - ts[0]) // int(float(batch_duration) * 1000))) + 1
+		results = [self.push(batch_ts, batch_values, sid=sid) for batch_ts, batch_values in zip(np.split(ts, batches), np.split(values, batches))]
+		results.append(self.flush(sid=sid))
+		return self._concat(results)
+
+	def _push(self, sid, ts, values):
+		if ts.shape[0] == 0:
+			return []
+		if sid not in self._buffers:
+			self._buffers[sid] = mhapi.streaming.RingBuffer(2 * self._window_samples, values.shape[1])
+			self._next_starts[sid] = int(ts[0]) if self.start_time is None else pd.Timestamp(self.start_time).value // 1000000
+		buffer = self._buffers[sid]
+		margin = int(float(self.margin) * 1000)
+		overwritten = buffer.push(ts, values)
+		if overwritten.shape[0] > 0 and overwritten[-1] >= self._next_starts[sid] - margin:
+			logger.warn('Samples of sensor ' + str(sid) + ' are dropped before their window is complete, max_sr is lower than the sampling rate')
+		results = []
+		while buffer.last_ms >= self._next_starts[sid] + self.ws + margin:
+			results.append(self._run_on_window(buffer, sid, self._next_starts[sid]))
+			self._next_starts[sid] = self._next_starts[sid] + self.ss
+		return results
+
+	def _run_on_window(self, buffer, sid, window_start):
+		margin = int(float(self.margin) * 1000)
+		ts, values = buffer.read(window_start - margin, window_start + self.ws + margin)
+		if ts.shape[0] == 0:
+			return pd.DataFrame()
+		columns = self.columns if self.columns is not None else ['HEADER_TIME_STAMP', 'X', 'Y', 'Z'][:values.shape[1] + 1]
+		data = pd.DataFrame(values, columns=columns[1:])
+		data.insert(0, columns[0], ts.astype('datetime64[ms]'))
+		window_start = np.datetime64(window_start, 'ms')
+		self.processor.set_meta(dict(pid=self.pid, sid=sid, stream_range=(window_start, window_start + np.timedelta64(self.ws, 'ms'))))
+		return self.processor._run_on_data(data, window_start, window_start + np.timedelta64(self.ss, 'ms'))
+
+	def _concat(self, results):
+		results = [result for result in results if result is not None and not result.empty]
+		if len(results) == 0:
+			return pd.DataFrame()
+		return pd.concat(results, axis=0, ignore_index=True)
@@ -30,8 +30,23 @@ import numpy as np
 from ..api import numeric_feature as mnf
 from ..api import windowing as mw
 from ..api import utils as mu
+from ..api.helpers import exporter
 from .BaseProcessor import SensorProcessor
 
+# the columns of the results are these names suffixed by the value columns of the input files, so they are only known from the data
+FEATURE_NAMES = [
+    "MEAN",
+    'STD',
+    'MAX',
+    'DOM_FREQ',
+    'DOM_FREQ_POWER_RATIO',
+    'HIGHEND_FREQ_POWER_RATIO',
+    'RANGE',
+    'ACTIVE_SAMPLE_PERC',
+    'NUMBER_OF_ACTIVATIONS',
+    'ACTIVATION_INTERVAL_VAR'
+]
+
 def build(**kwargs):
     return TimeFreqFeatureComputer(**kwargs).run_on_file
 
@@ -46,16 +61,26 @@ class TimeFreqFeatureComputer(SensorProcessor):
         self.threshold = threshold
     
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
-        st, et = mu.get_st_et(combined_data, self.meta['pid'], self.sessions, st_col=0, et_col=0)
-        ws = self.ws
-        ss = self.ss
-        col_names = combined_data.columns[1:]
+        st, et = mu.get_st_et(self._session_data(combined_data), self.meta['pid'], self.sessions, st_col=0, et_col=0)
         if self.verbose:
             print('Session start time: ' + str(st))
             print('Session stop time: ' + str(et))
 
         sr = mu._sampling_rate(combined_data)
-        
+        chunk_windows = self._windows(st, et, data_start_indicator, data_stop_indicator)
+        if len(chunk_windows) == 0:
+            return pd.DataFrame()
+        return self._compute_features(combined_data, chunk_windows, sr)
+
+    def _windows(self, st, et, data_start_indicator, data_stop_indicator):
+        """The windows of the session that start in [data_start_indicator, data_stop_indicator)"""
+        windows = mw.get_sliding_window_boundaries(start_time=st, stop_time=et, window_duration=self.ws, step_size=self.ss)
+        chunk_windows_mask = (windows[:,0] >= data_start_indicator) & (windows[:,0] < data_stop_indicator)
+        return windows[chunk_windows_mask,:]
+
+    def _compute_features(self, combined_data, chunk_windows, sr):
+        col_names = combined_data.columns[1:]
+
         def freq_features(X):
             ncols = X.shape[1]
             result = mnf.frequency_features(X, sr, freq_range=None, top_n_dominant = 1)
@@ -83,35 +108,24 @@ class TimeFreqFeatureComputer(SensorProcessor):
             lambda x: mnf.activation_std(x, self.threshold)
         ]
 
-        feature_names = [
-            "MEAN",
-            'STD',
-            'MAX',
-            'DOM_FREQ',
-            'DOM_FREQ_POWER_RATIO',
-            'HIGHEND_FREQ_POWER_RATIO',
-            'RANGE',
-            'ACTIVE_SAMPLE_PERC',
-            'NUMBER_OF_ACTIVATIONS',
-            'ACTIVATION_INTERVAL_VAR'
-        ]
+        all_feature_names = [feature_name + "_" + col_name for feature_name in FEATURE_NAMES for col_name in col_names]
 
-        all_feature_names = [feature_name + "_" + col_name for feature_name in feature_names for col_name in col_names]
-
-        windows = mw.get_sliding_window_boundaries(start_time=st, stop_time=et, window_duration=ws, step_size=ss)
-        chunk_windows_mask = (windows[:,0] >= data_start_indicator) & (windows[:,0] < data_stop_indicator)
-        chunk_windows = windows[chunk_windows_mask,:]
-        if len(chunk_windows) == 0:
-            return pd.DataFrame()
         result_data = mw.apply_to_sliding_windows(df=combined_data, sliding_windows=chunk_windows, window_operations=features, operation_names=all_feature_names, return_dataframe=True)
         return result_data
 
+    def stream_overlap(self):
+        # windows starting in a block need one window of data after it
+        return float(self.ws) / 1000
+
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.setname, 'feature', 'TimeFreq')
+
     def _post_process(self, result_data):
-        output_path = mu.generate_output_filepath(self.file, self.setname, 'feature', 'TimeFreq')
+        output_path = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_path)):
             os.makedirs(os.path.dirname(output_path))
             
-        result_data.to_csv(output_path, index=False, float_format='%.6f')
+        exporter.export_csv(result_data, output_path, float_format='%.6f')
         if self.verbose:
             print('Saved feature data to ' + output_path)
 
@@ -15,6 +15,8 @@ import os
 import pandas as pd
 import numpy as np
 from ..api import utils as mu
+from ..api import side_tables
+from ..api.helpers import exporter
 from .BaseProcessor import SensorProcessor
 from ..utility import logger
 
@@ -22,14 +24,17 @@ def build(**kwargs):
     return TimestampSyncer(**kwargs).run_on_file
 
 class TimestampSyncer(SensorProcessor):
-    def __init__(self, verbose=True, independent=True, violate=False, offsets=None, output_folder=None):
+    def __init__(self, verbose=True, independent=True, violate=False, offsets=None, output_folder=None, output_format=None):
         SensorProcessor.__init__(self, verbose=verbose, independent=independent)
         self.name = "TimestampSyncer"
         self.offsets = offsets
         self.output_folder = output_folder
+        self.output_format = output_format
 
-    def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
-        result_data = combined_data.copy(deep=True)
+    # shifted timestamps are written to the arrays of the pipeline, see `Pipeline`
+    IN_PLACE = True
+
+    def _offset(self):
         pid = self.meta['pid']
         offsets = self.offsets
         if pid is None:
@@ -38,23 +43,38 @@ class TimestampSyncer(SensorProcessor):
         
         if offsets is not None:
             offsets = os.path.abspath(offsets)
-            offset_mapping = pd.read_csv(offsets)
-            selected_offset = offset_mapping.loc[offset_mapping['PID'] == pid,:]
+            selected_offset = side_tables.select(offsets, {'PID': pid})
             offset = selected_offset.iloc[0,1]
             if self.verbose:
                 logger.info("Offset is: " + str(offset) + " seconds")
         else:
             offset = 0
             logger.warn("offset_mapping file is not provided, skip timestamp syncing")
-        
-        result_data.iloc[:,0] = result_data.iloc[:,0] + pd.to_timedelta(offset, unit='s')
+        return offset
+
+    def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
+        result_data = combined_data.copy(deep=True)
+        offset = self._offset()
+        # the column is replaced so that offsets finer than its precision are kept
+        result_data[result_data.columns[0]] = result_data.iloc[:,0] + pd.to_timedelta(offset, unit='s')
         return result_data
 
+    def _run_on_arrays(self, ts, values, data_start_indicator, data_stop_indicator):
+        offset = self._offset()
+        if offset != 0:
+            # nanoseconds like `_run_on_data`, so that offsets finer than a millisecond are not truncated
+            ts = ts.astype('datetime64[ns]', copy=False)
+            ts += pd.to_timedelta(offset, unit='s').to_timedelta64()
+        return ts, values
+
+    def output_filepath(self, file):
+        return mu.generate_output_filepath(file, self.output_folder, 'sensor', ext=self.output_format)
+
     def _post_process(self, result_data):
-        output_file = mu.generate_output_filepath(self.file, self.output_folder, 'sensor')
+        output_file = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_file)):
             os.makedirs(os.path.dirname(output_file))
-        result_data.to_csv(output_file, index=False, float_format='%.9f')
+        exporter.export_sensor_file_mhealth(result_data, output_file, float_format='%.9f')
         if self.verbose:
             logger.info('Saved synced data to ' + output_file)
         return pd.DataFrame()
@@ -50,6 +50,8 @@ Usage:
         --subwins <number>: the number of sub windows in a feature window, which is used to compute location features (also used in orientation feature computation). Default is 4.
 
         --high_cutoff <number>: the lowpass butterworth filter cutoff frequency applied before computing features. Default is 20Hz. This value should be smaller than half of the sampling rate.
+
+        --context <number>: the length in seconds of data to be loaded from the end of the previous hourly file and the start of the next hourly file. It should be at least the window size plus the filter margin, which is the default when `--sessions` is provided. Without `--sessions` the feature windows are aligned to the start of the loaded data, so the adjacent files are loaded as a whole by default.
 		
 		--output_folder <folder name>: the folder name that the script will save feature set data to in a participant's Derived folder. User must provide this information in order to use the script.
 		
@@ -76,23 +78,34 @@ from ...api import numeric_transformation as mnt
 from ...api import filter as mf
 from ...api import windowing as mw
 from ...api import utils as mu
+from ...api.helpers import exporter
 from ..BaseProcessor import SensorProcessor
+from ..Dataflow import Dataflow
 from ..ManualOrientationNormalizer import ManualOrientationNormalizer
 from ..SensorFilter import SensorFilter
 from ..TimeFreqFeatureComputer import TimeFreqFeatureComputer
 from ..OrientationFeatureComputer import OrientationFeatureComputer
+from .. import TimeFreqFeatureComputer as timefreq_features
+from .. import OrientationFeatureComputer as orientation_features
 from ...utility import logger
 
 def build(**kwargs):
     return FeatureSetPreparer(**kwargs).run_on_file
 
+def output_columns(output_folder=None, **kwargs):
+    columns = ['START_TIME', 'STOP_TIME'] + [feature_name + '_VM' for feature_name in timefreq_features.FEATURE_NAMES] + orientation_features.FEATURE_NAMES
+    # the participant, sensor and location are only added when the features are saved
+    if output_folder is not None:
+        columns = columns + ['pid', 'sid', 'location']
+    return columns
+
 class FeatureSetPreparer(SensorProcessor):
     def __init__(self, verbose=True, independent=False, violate=False, output_folder=None, 
     sessions=None, 
     location_mapping =None, 
     orientation_fixes=None, 
-    ws=12800, ss=12800, threshold=0.2, subwins=4, high_cutoff=20):
-        SensorProcessor.__init__(self, verbose=verbose, independent=independent, violate=violate)
+    ws=12800, ss=12800, threshold=0.2, subwins=4, high_cutoff=20, context=None):
+        SensorProcessor.__init__(self, verbose=verbose, independent=independent, violate=violate, context=context)
         self.name = 'AccelerometerFeatureComputer'
         self.output_folder = output_folder
         self.sessions = sessions
@@ -107,6 +120,9 @@ class FeatureSetPreparer(SensorProcessor):
         self.orientationFeatureComputer = OrientationFeatureComputer(verbose=verbose, independent=independent, sessions=sessions, ws=ws, ss=ss, subwins=subwins)
         
         self.location_mapping = location_mapping
+        if self.context is None and sessions is not None:
+            # a window plus the margin of the filter
+            self.context = float(ws) / 1000 + self.sensorFilter.context
     
     def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
         if combined_data.empty:
@@ -116,43 +132,68 @@ class FeatureSetPreparer(SensorProcessor):
         self.manualOrientationNormalizer.set_meta(self.meta)
         self.timeFreqFeatureComputer.set_meta(self.meta)
         self.orientationFeatureComputer.set_meta(self.meta)
-        st, et = mu.get_st_et(combined_data, self.meta['pid'], self.sessions, st_col=0, et_col=0)
+        flow = self._dataflow(combined_data, data_start_indicator, data_stop_indicator)
+        st, et = flow['session']
         if self.verbose:
             logger.debug('Session start time: ' + str(st))
             logger.debug('Session stop time: ' + str(et))
             logger.debug('File start time: ' + str(data_start_indicator))
             logger.debug('File stop time: ' + str(data_stop_indicator))
 
-        sr = mu._sampling_rate(combined_data)
+        if len(flow['windows']) == 0:
+            return pd.DataFrame()
+        timefreq_feature_df = self.timeFreqFeatureComputer._compute_features(flow['vm_filtered'], flow['windows'], flow['sr'])
+        orientation_feature_df = self.orientationFeatureComputer._compute_features(flow['xyz_prepared'], flow['windows'], flow['sr'])
+        # both feature sets have one row per window in the same order
+        feature_df = pd.concat([timefreq_feature_df, orientation_feature_df.iloc[:, 2:]], axis=1)
+        return feature_df
+
+    def _dataflow(self, combined_data, data_start_indicator, data_stop_indicator):
+        """Intermediates shared by the feature computers, each is computed once"""
+        flow = Dataflow()
+        flow.set('data', combined_data)
+        flow.define('sr', lambda flow: mu._sampling_rate(flow['data']))
+        # without sessions, windows are aligned to the start of the filtered data
+        flow.define('session', lambda flow: mu.get_st_et(self._session_data(flow['vm_filtered']), self.meta['pid'], self.sessions, st_col=0, et_col=0))
+        flow.define('windows', lambda flow: self.timeFreqFeatureComputer._windows(flow['session'][0], flow['session'][1], data_start_indicator, data_stop_indicator))
 
         # 20 Hz lowpass filter on vector magnitude data and original data
-        vm_data = mnt.vector_magnitude(combined_data.values[:,1:4]).ravel()
-        vm_data = pd.DataFrame(vm_data, columns=['VM'])
-        vm_data.insert(0, 'HEADER_TIME_STAMP', combined_data.iloc[:, 0].values)
-        vm_data_filtered = self.sensorFilter._run_on_data(vm_data, data_start_indicator, data_stop_indicator)
-        combined_data_filtered = self.sensorFilter._run_on_data(combined_data, data_start_indicator, data_stop_indicator)
+        def vm(flow):
+            vm_data = pd.DataFrame(mnt.vector_magnitude(flow['data'].values[:,1:4]).ravel(), columns=['VM'])
+            vm_data.insert(0, 'HEADER_TIME_STAMP', flow['data'].iloc[:, 0].values)
+            return vm_data
+        flow.define('vm', vm)
+        flow.define('vm_filtered', lambda flow: self.sensorFilter._filter(flow['vm'], flow['sr'], data_start_indicator, data_stop_indicator))
+        # the filter changes the values of its input, the data is shared by other intermediates
+        flow.define('xyz_filtered', lambda flow: self.sensorFilter._filter(flow['data'].copy(), flow['sr'], data_start_indicator, data_stop_indicator))
 
         # manual fix orientation
-        if self.orientation_fixes is not None and os.path.exists(self.orientation_fixes):
-            combined_data_prepared = self.manualOrientationNormalizer._run_on_data(combined_data_filtered, data_start_indicator, data_stop_indicator)
-        else:
-            combined_data_prepared = combined_data_filtered.copy()
-
-        timefreq_feature_df = self.timeFreqFeatureComputer._run_on_data(vm_data_filtered, data_start_indicator, data_stop_indicator)
-        orientation_feature_df = self.orientationFeatureComputer._run_on_data(combined_data_prepared, data_start_indicator, data_stop_indicator)
-        if timefreq_feature_df.empty and orientation_feature_df.empty:
-            return pd.DataFrame()
-        feature_df = timefreq_feature_df.merge(orientation_feature_df)
-        return feature_df
-    
+        def xyz_prepared(flow):
+            if self.orientation_fixes is not None and os.path.exists(self.orientation_fixes):
+                return self.manualOrientationNormalizer._run_on_data(flow['xyz_filtered'], data_start_indicator, data_stop_indicator)
+            return flow['xyz_filtered']
+        flow.define('xyz_prepared', xyz_prepared)
+        return flow
+
+    def stream_overlap(self):
+        # a window plus the margin of the filter
+        if self.context is not None:
+            return self.context
+        return 2 * float(self.timeFreqFeatureComputer.ws) / 1000
+
+    def output_filepath(self, file):
+        if self.output_folder is None:
+            return None
+        return mu.generate_output_filepath(file, self.output_folder, 'feature', 'PostureAndActivity')
+
     def _post_process(self, result_data):
         if self.output_folder is None:
             return result_data
-        output_path = mu.generate_output_filepath(self.file, self.output_folder, 'feature', 'PostureAndActivity')
+        output_path = self.output_filepath(self.file)
         if not os.path.exists(os.path.dirname(output_path)):
             os.makedirs(os.path.dirname(output_path))
         location = mu.get_location_from_sid(self.meta['pid'], self.meta['sid'], self.location_mapping)
-        result_data.to_csv(output_path, index=False, float_format='%.9f')
+        exporter.export_csv(result_data, output_path, float_format='%.9f')
         if self.verbose:
             logger.info('Saved feature data to ' + output_path)
 
@@ -1,6 +1,8 @@
 """Helper functions to get information about the package itself
 """
 
+import os
+import sys
 import pkgutil
 import importlib
 from . import logger
@@ -23,3 +25,14 @@ def get_doc(module_name):
         logger.error("Module is not found: " + module_name)
         exit(1)
     return module_obj.__doc__
+
+def load_script(script):
+    """Import a built-in script by its name or a python script by its path"""
+    if script.endswith('.py'):
+        script_path = os.path.abspath(script)
+        if os.path.dirname(script_path) not in sys.path:
+            sys.path.insert(0, os.path.dirname(script_path))
+        module_name = os.path.splitext(os.path.basename(script))[0]
+    else:
+        module_name = 'padar.scripts.' + script
+    return importlib.import_module(module_name)
@@ -0,0 +1,89 @@
+import os
+import re
+import glob
+import pytest
+import pandas as pd
+from padar.api import catalog as mcatalog
+from padar.api.catalog import Catalog
+
+FILES = [
+    'P1/MasterSynced/2016/01/01/00/ActigraphGT9X-AccelerationCalibrated-NA.TAS1E23150066-AccelerationCalibrated.2016-01-01-00-00-00-000-M0500.sensor.csv',
+    'P1/MasterSynced/2016/01/01/01/ActigraphGT9X-AccelerationCalibrated-NA.TAS1E23150066-AccelerationCalibrated.2016-01-01-01-00-00-000-M0500.sensor.csv.gz',
+    'P1/MasterSynced/2016/01/01/01/SPADESInLab.alvin-SPADESInLab.2016-01-01-01-00-00-000-M0500.annotation.csv',
+    'P2/MasterSynced/2016/01/02/10/ActigraphGT9X-AccelerationCalibrated-NA.TAS1E23150067-AccelerationCalibrated.2016-01-02-10-00-00-000-M0500.sensor.csv',
+    'P2/Derived/preprocessed/ActigraphGT9X-AccelerationCalibrated-NA.TAS1E23150067-AccelerationCalibrated.2016-01-02-10-00-00-000-M0500.sensor.csv',
+    'P2/Derived/sessions[1].csv',
+    'P2/notes.txt',
+    'DerivedCrossParticipants/sessions.csv'
+]
+
+PATTERNS = [
+    '**/*.csv',
+    '**/*.csv*',
+    '*/MasterSynced/**/*.sensor.csv*',
+    'P1/MasterSynced/**/Actigraph*.sensor.csv',
+    'P?/MasterSynced/2016/01/0[12]/*/*.csv',
+    'P[!1]/**/*.sensor.csv',
+    'P2/Derived/sessions[[]1].csv',
+    '*/*/*',
+    '**',
+    'P1/**',
+    '**/01/**/*.annotation.csv',
+    'P3/**/*.csv'
+]
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = str(tmp_path / 'dataset')
+    for rel_path in FILES:
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write('')
+    return root
+
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_query_matches_glob(dataset, pattern):
+    pattern = os.path.join(dataset, pattern)
+    # glob returns a file once for every way the pattern matches it
+    expected = sorted(set([path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)]))
+    assert sorted(Catalog.load(dataset).query(pattern)['path'].tolist()) == expected
+
+def test_glob_to_regex_edge_cases():
+    regex = mcatalog.glob_to_regex(os.sep.join(['a', '**', 'b', '*.csv']))
+    assert re.match(regex, os.sep.join(['a', 'b', 'x.csv']))
+    assert re.match(regex, os.sep.join(['a', 'x', 'y', 'b', 'x.csv']))
+    assert not re.match(regex, os.sep.join(['a', 'x', 'b', 'y', 'x.csv']))
+    assert not re.match(mcatalog.glob_to_regex('a*'), os.sep.join(['ab', 'c']))
+
+def test_filenames_are_parsed(dataset):
+    table = Catalog.load(dataset).table.set_index('path')
+    row = table.loc[os.path.join(dataset, FILES[1])]
+    assert (row['pid'], row['sid'], row['sensortype'], row['file_type'], row['date'], row['hour']) == ('P1', 'TAS1E23150066', 'ActigraphGT9X', 'sensor', '2016-01-01', '01')
+    assert table.loc[os.path.join(dataset, FILES[2]), 'sid'] == 'ALVIN'
+    assert pd.isnull(table.loc[os.path.join(dataset, FILES[6]), 'sid'])
+
+def test_catalog_is_only_saved_in_the_catalog_folder(dataset, tmp_path):
+    Catalog.load(dataset)
+    assert not any([name.endswith('.pkl') for _, _, names in os.walk(dataset) for name in names])
+    catalog_dir = str(tmp_path / 'catalogs')
+    Catalog.load(dataset, catalog_dir=catalog_dir)
+    assert os.path.exists(mcatalog.catalog_path(catalog_dir, dataset))
+    assert not any([name.endswith('.pkl') for _, _, names in os.walk(dataset) for name in names])
+
+def test_saved_catalog_only_scans_changed_folders(dataset, tmp_path, monkeypatch):
+    catalog_dir = str(tmp_path / 'catalogs')
+    Catalog.load(dataset, catalog_dir=catalog_dir)
+    new_file = os.path.join(dataset, 'P2', 'MasterSynced', '2016', '01', '02', '10', 'SPADESInLab.alvin-SPADESInLab.2016-01-02-10-00-00-000-M0500.annotation.csv')
+    with open(new_file, 'w') as f:
+        f.write('')
+    scanned = []
+    scan_folder = Catalog._scan_folder
+    def record(self, abs_path):
+        scanned.append(abs_path)
+        return scan_folder(self, abs_path)
+    monkeypatch.setattr(Catalog, '_scan_folder', record)
+    catalog = Catalog.load(dataset, catalog_dir=catalog_dir)
+    assert scanned == [os.path.dirname(new_file)]
+    assert new_file in catalog.table['path'].tolist()
+    assert len(catalog.table) == len(FILES) + 1
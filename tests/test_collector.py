@@ -0,0 +1,29 @@
+import os
+import resource
+import numpy as np
+import pandas as pd
+from padar.api import collector
+
+def test_merge_more_spills_than_open_file_limit(tmp_path):
+    n_spills = 300
+    paths = []
+    for i in range(n_spills):
+        ts = pd.to_datetime(np.arange(i, i + 3 * n_spills, n_spills) * 1000, unit='ms')
+        df = pd.DataFrame({'HEADER_TIME_STAMP': ts, 'VALUE': np.full(3, float(i))})
+        path = str(tmp_path / ('%06d.pkl' % i))
+        collector.spill(df, path)
+        paths.append(path)
+    output = str(tmp_path / 'output.csv')
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (128, hard))
+    try:
+        n_rows = collector.merge(paths, output, ['HEADER_TIME_STAMP', 'VALUE'])
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+    result = pd.read_csv(output, parse_dates=[0])
+    assert n_rows == 3 * n_spills
+    assert result.shape[0] == 3 * n_spills
+    assert result['HEADER_TIME_STAMP'].is_monotonic_increasing
+    assert list(result['VALUE'].values[:n_spills]) == list(range(n_spills))
+    # intermediate spills are removed
+    assert sorted(os.listdir(str(tmp_path))) == sorted([os.path.basename(path) for path in paths] + ['output.csv'])
@@ -0,0 +1,75 @@
+import gzip
+import numpy as np
+import pandas as pd
+import pytest
+from padar.api.helpers import exporter
+
+def _assert_same_as_to_csv(df, tmp_path, float_format=None, **kwargs):
+    expected = str(tmp_path / 'expected.csv')
+    result = str(tmp_path / 'result.csv')
+    df.to_csv(expected, index=False, float_format=float_format)
+    exporter.export_csv(df, result, float_format=float_format, **kwargs)
+    with open(expected, 'rb') as f:
+        expected_bytes = f.read()
+    with open(result, 'rb') as f:
+        assert f.read() == expected_bytes
+
+def _sensor_frame(n, seed=0):
+    rng = np.random.RandomState(seed)
+    ts = np.datetime64('2016-01-01T00:00:00', 'ms') + np.cumsum(rng.randint(1, 30, size=n)).astype('timedelta64[ms]')
+    df = pd.DataFrame(rng.normal(scale=4, size=(n, 3)), columns=['X', 'Y', 'Z'])
+    df.insert(0, 'HEADER_TIME_STAMP', ts)
+    return df
+
+@pytest.mark.parametrize('float_format', ['%.3f', '%.6f', '%.9f', '%.0f'])
+def test_sensor_frame_is_identical(tmp_path, float_format):
+    _assert_same_as_to_csv(_sensor_frame(5000), tmp_path, float_format=float_format, chunk_rows=777)
+
+def test_floats_near_rounding_ties_and_special_values(tmp_path):
+    ties = np.arange(-2000, 2000) / 1000.0 + 0.0005
+    special = [np.nan, np.inf, -np.inf, -0.0, 0.0, 1e300, -1e17, 2.0 ** 53 + 1, 5e-324, 0.0004999999999999999, -0.0005]
+    values = np.concatenate([ties, special])
+    df = pd.DataFrame({'A': values, 'B': values[::-1] * 3.3})
+    for float_format in ['%.3f', '%.1f', '%.15f']:
+        _assert_same_as_to_csv(df, tmp_path, float_format=float_format)
+
+@pytest.mark.parametrize('start, step', [
+    ('2016-01-01T00:00:00', np.timedelta64(1, 'D')),
+    ('2016-01-01T00:00:00', np.timedelta64(1, 's')),
+    ('2016-01-01T00:00:00', np.timedelta64(12, 'ms')),
+    ('2016-01-01T00:00:00', np.timedelta64(7, 'us')),
+    ('1969-12-31T23:59:59', np.timedelta64(250, 'ms'))
+])
+def test_timestamp_precision_follows_the_column(tmp_path, start, step):
+    ts = np.datetime64(start, 'ns') + np.arange(20) * step
+    ts[3] = np.datetime64('NaT')
+    df = pd.DataFrame({'HEADER_TIME_STAMP': ts, 'VALUE': np.arange(20, dtype=np.float64)})
+    _assert_same_as_to_csv(df, tmp_path, float_format='%.3f')
+
+def test_integer_boolean_and_string_columns(tmp_path):
+    df = pd.DataFrame({
+        'INT': np.array([0, -1, 7, np.iinfo(np.int64).max, -123456789012], dtype=np.int64),
+        'UINT': np.array([0, 1, 2, 3, 2 ** 32], dtype=np.uint64),
+        'BOOL': [True, False, True, True, False],
+        'STR': ['a', '', 'SPADES_1', 'TAS1E23150066', 'café']
+    })
+    _assert_same_as_to_csv(df, tmp_path)
+
+def test_frames_the_bulk_writer_does_not_support(tmp_path):
+    # quoted strings, missing strings, categories and other float formats go through to_csv
+    df = pd.DataFrame({
+        'A': ['a,b', 'c"d', 'e'],
+        'B': [1.5, 2.25, np.nan],
+        'C': pd.Categorical(['x', 'y', 'x']),
+        'D': ['p', None, 'q']
+    })
+    _assert_same_as_to_csv(df, tmp_path, float_format='%.3e')
+    _assert_same_as_to_csv(df[['A', 'B']], tmp_path)
+
+def test_appended_parts_and_compressed_files(tmp_path):
+    df = _sensor_frame(3000, seed=1)
+    result = str(tmp_path / 'result.csv.gz')
+    exporter.export_csv(df.iloc[:1000], result, float_format='%.3f', datetime_unit='ms')
+    exporter.export_csv(df.iloc[1000:], result, float_format='%.3f', mode='a', header=False, datetime_unit='ms')
+    with gzip.open(result, 'rb') as f:
+        assert f.read() == df.to_csv(index=False, float_format='%.3f').encode('ascii')
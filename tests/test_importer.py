@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+from padar.api.helpers import importer
+
+def _write_sensor_file(path, rows):
+    with open(path, 'w') as f:
+        f.write('HEADER_TIME_STAMP,X_ACCELATION_METERS_PER_SECOND_SQUARED,Y_ACCELATION_METERS_PER_SECOND_SQUARED,Z_ACCELATION_METERS_PER_SECOND_SQUARED\n')
+        for row in rows:
+            f.write(row + '\n')
+
+def test_mhealth_timestamps_to_milliseconds_matches_pandas():
+    values = np.array([
+        '2016-01-01 00:00:00.000',
+        '2016-02-29 23:59:59.999',
+        '1999-12-31 12:30:45.123',
+        '2100-03-01 01:02:03.004'
+    ], dtype=object)
+    ms, valid = importer.mhealth_timestamps_to_milliseconds(values)
+    expected = pd.to_datetime(values, format='%Y-%m-%d %H:%M:%S.%f').values.astype('datetime64[ms]').astype(np.int64)
+    assert valid.all()
+    assert list(ms) == list(expected)
+
+def test_mhealth_timestamps_to_milliseconds_rejects_malformed_rows():
+    values = np.array([
+        '2016-01-01 00:00:00.000',
+        '2016-01-01 00:00:00',
+        '2016-01-01T00:00:00.000',
+        '2016-01-01 00:00:00.0000',
+        '2015-02-29 00:00:00.000',
+        '2016-13-01 00:00:00.000',
+        '2016-01-01 24:00:00.000',
+        'nan'
+    ], dtype=object)
+    ms, valid = importer.mhealth_timestamps_to_milliseconds(values)
+    assert list(valid) == [True] + [False] * 7
+    assert (ms[~valid] == 0).all()
+
+def test_sensor_csv_matches_pandas_parser(tmp_path):
+    path = str(tmp_path / 'sensor.csv')
+    rows = ['2016-01-01 00:00:00.%03d,%.3f,%.3f,%.3f' % (i * 12, i * 0.1, -i * 0.2, 1.0) for i in range(50)]
+    _write_sensor_file(path, rows)
+    df, dropped_rows = importer._import_sensor_file_mhealth_csv(path)
+    expected = pd.read_csv(path)
+    assert dropped_rows == 0
+    assert list(df.iloc[:, 0].values.astype('datetime64[ms]')) == list(pd.to_datetime(expected.iloc[:, 0]).values.astype('datetime64[ms]'))
+    np.testing.assert_array_equal(df.iloc[:, 1:].values, expected.iloc[:, 1:].values)
+
+def test_sensor_csv_drops_only_na_rows(tmp_path):
+    path = str(tmp_path / 'sensor.csv')
+    _write_sensor_file(path, [
+        '2016-01-01 00:00:00.000,1.0,2.0,3.0',
+        '2016-01-01 00:00:00.012,,2.0,3.0',
+        '2016-01-01 00:00:00.025,inf,2.0,3.0',
+        '2016-01-01 00:00:00.037,abc,2.0,3.0',
+        '2016-01-01 00:00:00.050,1.0,2.0,-inf'
+    ])
+    df, dropped_rows = importer._import_sensor_file_mhealth_csv(path)
+    assert dropped_rows == 2
+    assert df.shape[0] == 3
+    assert np.isinf(df.iloc[1, 1]) and np.isinf(df.iloc[2, 3])
+
+def test_sensor_csv_fixes_rows_in_other_timestamp_formats(tmp_path):
+    path = str(tmp_path / 'sensor.csv')
+    _write_sensor_file(path, [
+        '2016-01-01 00:00:00.000,1.0,2.0,3.0',
+        '2016-01-01 00:00:00.5,1.0,2.0,3.0',
+        'not a timestamp,1.0,2.0,3.0'
+    ])
+    df, dropped_rows = importer._import_sensor_file_mhealth_csv(path)
+    assert dropped_rows == 1
+    assert list(df.iloc[:, 0].values.astype('datetime64[ms]').astype(np.int64) - 1451606400000) == [0, 500]
+
+def test_sensor_csv_falls_back_to_tolerant_parser(tmp_path, monkeypatch):
+    calls = []
+    def tolerant(filepath):
+        calls.append(filepath)
+        return pd.DataFrame(), 0
+    monkeypatch.setattr(importer, '_import_sensor_file_mhealth_tolerant', tolerant)
+    path = str(tmp_path / 'sensor.csv')
+    # a row with more fields than the header can not be parsed by the typed pass
+    _write_sensor_file(path, ['2016-01-01 00:00:00.000,1.0,2.0,3.0', '2016-01-01 00:00:00.012,1.0,2.0,3.0,4.0,5.0'])
+    importer._import_sensor_file_mhealth_csv(path)
+    _write_sensor_file(path, ['2016-01-01 00:00:00.000,1.0,2.0,3.0'])
+    importer._import_sensor_file_mhealth_csv(path)
+    assert calls == [path]
@@ -0,0 +1,113 @@
+import os
+import time
+import multiprocessing
+import pandas as pd
+import pytest
+from padar.api import jobqueue
+from padar.api.dataset import M
+
+SCRIPT = '''
+import os
+import time
+import pandas as pd
+
+def build(verbose=False, violate=False, **kwargs):
+    def run(file, prev_file=None, next_file=None, **run_kwargs):
+        # a file waits while the block file of the test exists, so that its worker can be killed
+        block_path = os.path.join(kwargs['workdir'], 'block')
+        while os.path.basename(file).startswith(kwargs['block']) and os.path.exists(block_path):
+            time.sleep(0.05)
+        time.sleep(0.02)
+        with open(os.path.join(kwargs['workdir'], 'processed.txt'), 'a') as f:
+            f.write(file + '\\n')
+        return pd.DataFrame({'FILE': [os.path.basename(file)], 'SIZE': [os.path.getsize(file)]})
+    return run
+'''
+
+N_HOURS = 12
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    # the logger writes its files to the current folder
+    monkeypatch.chdir(tmp_path)
+    root = str(tmp_path / 'dataset')
+    for hour in range(N_HOURS):
+        folder = os.path.join(root, 'P1', 'MasterSynced', '2016', '01', '01', '%02d' % hour)
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'ActigraphGT9X-AccelerationCalibrated-NA.TAS1E23150066-AccelerationCalibrated.2016-01-01-%02d-00-00-000-M0500.sensor.csv' % hour), 'w') as f:
+            f.write('x' * (hour + 1))
+    script = str(tmp_path / 'queue_script.py')
+    with open(script, 'w') as f:
+        f.write(SCRIPT)
+    return root, script
+
+def _work(root, queue_dir):
+    M(root).work(queue_dir, poll=0.05)
+
+def _start_workers(root, queue_dir, n):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_work, args=(root, queue_dir)) for _ in range(n)]
+    for process in processes:
+        process.start()
+    return processes
+
+def _processed(tmp_path):
+    with open(str(tmp_path / 'processed.txt'), 'r') as f:
+        return [os.path.basename(line.strip()) for line in f]
+
+def _submit(root, script, queue_dir, block='none', **kwargs):
+    # the script is imported once per process, the folder of the test is passed as an argument
+    return M(root).submit(os.path.join(root, '**', '*.sensor.csv'), queue_dir, script, block=block, workdir=os.path.dirname(queue_dir), **kwargs)
+
+def test_racing_workers_process_every_task_once(dataset, tmp_path):
+    root, script = dataset
+    queue_dir = _submit(root, script, str(tmp_path / 'queue'))
+    processes = _start_workers(root, queue_dir, 4)
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    processed = _processed(tmp_path)
+    assert len(processed) == N_HOURS
+    assert len(set(processed)) == N_HOURS
+    assert jobqueue.counts(queue_dir) == dict(pending=0, claimed=0, done=N_HOURS, failed=0)
+
+    result = M(root).collect(queue_dir)
+    assert result['FILE'].tolist() == sorted(processed)
+    assert result['SIZE'].tolist() == list(range(1, N_HOURS + 1))
+    output = M(root).collect(queue_dir, output=str(tmp_path / 'out' / 'result.csv'))
+    pd.testing.assert_frame_equal(pd.read_csv(output), result.reset_index(drop=True))
+
+@pytest.mark.parametrize('max_attempts, state', [(3, 'done'), (1, 'failed')])
+def test_claim_of_a_killed_worker_expires(dataset, tmp_path, max_attempts, state):
+    root, script = dataset
+    queue_dir = _submit(root, script, str(tmp_path / 'queue'), block='ActigraphGT9X', lease=1, max_attempts=max_attempts)
+    with open(str(tmp_path / 'block'), 'w') as f:
+        f.write('')
+    processes = _start_workers(root, queue_dir, 1)
+    started = time.time()
+    while jobqueue.counts(queue_dir)['claimed'] == 0 and time.time() - started < 30:
+        time.sleep(0.05)
+    processes[0].kill()
+    processes[0].join()
+    os.remove(str(tmp_path / 'block'))
+    claimed_task = [name.split('@')[0] for name in os.listdir(os.path.join(queue_dir, 'claimed'))]
+    assert len(claimed_task) == 1
+
+    # the claim is taken over once it was not renewed for the lease
+    time.sleep(1.5)
+    M(root).work(queue_dir, poll=0.05)
+    counts = jobqueue.counts(queue_dir)
+    assert counts['claimed'] == 0 and counts['pending'] == 0
+    assert jobqueue.read_status(queue_dir, claimed_task[0])['state'] == state
+    if state == 'done':
+        assert counts['done'] == N_HOURS
+        assert sorted(_processed(tmp_path)) == sorted(M(root).collect(queue_dir)['FILE'].tolist())
+    else:
+        assert counts == dict(pending=0, claimed=0, done=N_HOURS - 1, failed=1)
+        assert len(M(root).collect(queue_dir)) == N_HOURS - 1
+
+def test_collect_refuses_unfinished_queues(dataset, tmp_path):
+    root, script = dataset
+    queue_dir = _submit(root, script, str(tmp_path / 'queue'))
+    with pytest.raises(ValueError):
+        M(root).collect(queue_dir)
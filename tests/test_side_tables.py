@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from padar.api import side_tables
+from padar.api import utils
+
+MAPPING = pd.DataFrame({
+    'PID': ['P1', 'P1', 'P2', 'P2', 'P3', 'P1', np.nan],
+    'SENSOR_ID': ['TAS1', 'TAS2', 'TAS1', 'TAS3', 'TAS4', 'TAS1', 'TAS5'],
+    'LOCATION': ['DW', 'DA', 'NDW', 'DW', 'DT', 'DH', 'DW'],
+    'N': [1, 2, 3, 4, 5, 6, 7]
+})
+
+@pytest.fixture
+def mapping_file(tmp_path):
+    side_tables.clear()
+    path = str(tmp_path / 'location_mapping.csv')
+    MAPPING.to_csv(path, index=False)
+    yield path
+    side_tables.clear()
+
+def _masked(table, by):
+    mask = np.ones(table.shape[0], dtype=bool)
+    for column, value in by.items():
+        mask &= (table.iloc[:, column] if isinstance(column, int) else table[column]) == value
+    return table.loc[mask, :]
+
+@pytest.mark.parametrize('by', [
+    {'PID': 'P1'},
+    {'PID': 'P1', 'SENSOR_ID': 'TAS1'},
+    {'SENSOR_ID': 'TAS1', 'PID': 'P2'},
+    {0: 'P2', 1: 'TAS3'},
+    {'N': 4},
+    {'PID': 'P9'},
+    {'PID': 'P1', 'LOCATION': 'NDW'}
+])
+def test_select_matches_boolean_mask(mapping_file, by):
+    table = pd.read_csv(mapping_file)
+    result = side_tables.select(mapping_file, by)
+    expected = _masked(table, by)
+    assert list(result.columns) == list(table.columns)
+    assert result.values.tolist() == expected.values.tolist()
+
+def test_table_is_parsed_once_while_unchanged(mapping_file):
+    first = side_tables.load(mapping_file)
+    assert side_tables.load(os.path.join(os.path.dirname(mapping_file), '.', os.path.basename(mapping_file))) is first
+    side_tables.select(mapping_file, {'PID': 'P1'})
+    assert side_tables.load(mapping_file) is first
+
+    changed = MAPPING.copy()
+    changed.loc[0, 'LOCATION'] = 'NDA'
+    changed.to_csv(mapping_file, index=False)
+    stat = os.stat(mapping_file)
+    os.utime(mapping_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert side_tables.load(mapping_file) is not first
+    assert side_tables.select(mapping_file, {'PID': 'P1', 'SENSOR_ID': 'TAS2'})['LOCATION'].tolist() == ['DA']
+    assert side_tables.select(mapping_file, {'PID': 'P1'})['LOCATION'].tolist() == ['NDA', 'DA', 'DH']
+
+def test_location_lookups(mapping_file):
+    assert utils.get_sid_from_location('P2', 'NDW', mapping_file) == 'TAS1'
+    assert utils.get_sid_from_location('P2', 'DA', mapping_file) is None
+    # the first matching row is used
+    assert utils.get_location_from_sid('P1', 'TAS1', mapping_file) == 'DW'
+    assert utils.get_location_from_sid('P3', 'TAS1', mapping_file) == 'unknown'
+    assert utils.get_location_from_sid('P1', 'TAS1', 'None') is None
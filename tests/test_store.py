@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+from padar.api.store import SensorStore
+from padar.api.helpers import exporter
+
+def _sensor_frame(start, n, step_ms):
+    ts = np.datetime64(start, 'ms') + np.arange(n) * np.timedelta64(step_ms, 'ms')
+    values = np.arange(n * 3, dtype=np.float64).reshape(n, 3) / 8.0
+    df = pd.DataFrame(values, columns=['X', 'Y', 'Z'])
+    df.insert(0, 'HEADER_TIME_STAMP', ts)
+    return df
+
+def _build_store(tmp_path):
+    # two hours with data and an hour without data in between
+    frames = [_sensor_frame('2016-01-01T00:00:00', 14400, 250), _sensor_frame('2016-01-01T02:30:00', 1800, 500)]
+    files = []
+    for i, df in enumerate(frames):
+        path = str(tmp_path / ('%d.sensor.csv' % i))
+        exporter.export_sensor_file_mhealth(df, path, float_format='%.3f')
+        files.append(path)
+    store = SensorStore.build(files, str(tmp_path / 'store'))
+    return store, pd.concat(frames, axis=0, ignore_index=True)
+
+def _expected(df, start_time, stop_time):
+    ts = df.iloc[:, 0].values
+    mask = np.ones(len(ts), dtype=bool)
+    if start_time is not None:
+        mask &= ts >= np.datetime64(start_time, 'ms')
+    if stop_time is not None:
+        mask &= ts < np.datetime64(stop_time, 'ms')
+    return df.loc[mask, :].reset_index(drop=True)
+
+def test_slice_matches_boolean_mask(tmp_path):
+    store, df = _build_store(tmp_path)
+    bounds = [
+        (None, None),
+        ('2016-01-01T00:00:00', '2016-01-01T01:00:00'),
+        ('2016-01-01T00:10:00.500', '2016-01-01T00:10:03.250'),
+        ('2016-01-01T00:59:59', '2016-01-01T02:30:00.500'),
+        # starts in the hour without data
+        ('2016-01-01T01:30:00', '2016-01-01T02:31:00'),
+        ('2016-01-01T02:45:00', None),
+        (None, '2015-12-31T23:00:00'),
+        ('2016-01-01T04:00:00', None),
+        ('2016-01-01T00:30:00', '2016-01-01T00:20:00')
+    ]
+    for start_time, stop_time in bounds:
+        result = store.slice(start_time, stop_time).to_dataframe()
+        expected = _expected(df, start_time, stop_time)
+        assert result.shape == expected.shape
+        assert (result.iloc[:, 0].values == expected.iloc[:, 0].values).all()
+        np.testing.assert_array_equal(result.iloc[:, 1:].values, expected.iloc[:, 1:].values)
+
+def test_slice_of_a_slice(tmp_path):
+    store, df = _build_store(tmp_path)
+    part = store.slice('2016-01-01T00:30:00', '2016-01-01T02:40:00')
+    result = part.slice('2016-01-01T00:59:30', '2016-01-01T02:30:10').to_dataframe()
+    expected = _expected(df, '2016-01-01T00:59:30', '2016-01-01T02:30:10')
+    assert (result.iloc[:, 0].values == expected.iloc[:, 0].values).all()
+    np.testing.assert_array_equal(result.iloc[:, 1:].values, expected.iloc[:, 1:].values)
+
+def test_open_keeps_the_files_and_the_index(tmp_path):
+    store, df = _build_store(tmp_path)
+    reopened = SensorStore.open(str(tmp_path / 'store'))
+    assert reopened.shape == df.shape
+    assert [file_range[1:] for file_range in reopened.files] == [(1451606400000, 1451609999750), (1451615400000, 1451616299500)]
+    result = reopened.slice('2016-01-01T02:30:00', '2016-01-01T02:30:01').to_dataframe()
+    assert list(result.iloc[:, 0].values.astype('datetime64[ms]').astype(np.int64)) == [1451615400000, 1451615400500]
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+from padar.api import utils as mu
+from padar.api import windowing as mw
+from padar.api.helpers import exporter
+from padar.scripts.BaseProcessor import SensorProcessor
+from padar.scripts.StreamProcessor import StreamProcessor
+
+WS = 5000
+SS = 2500
+
+class WindowStats(SensorProcessor):
+    # one row per window with data that starts in the data range, like the feature scripts
+    def _run_on_data(self, combined_data, data_start_indicator, data_stop_indicator):
+        st, et = mu.get_st_et(self._session_data(combined_data), self.meta['pid'], None)
+        windows = mw.get_sliding_window_boundaries(st, et, WS, SS)
+        windows = windows[(windows[:, 0] >= data_start_indicator) & (windows[:, 0] < data_stop_indicator)]
+        ts = combined_data.iloc[:, 0].values
+        rows = []
+        for start, stop in windows:
+            mask = (ts >= start) & (ts < stop)
+            if not mask.any():
+                continue
+            values = combined_data.iloc[mask, 1:].values
+            rows.append((start, stop, int(mask.sum())) + tuple(values.mean(axis=0)) + tuple(values.max(axis=0)))
+        return pd.DataFrame(rows, columns=['START_TIME', 'STOP_TIME', 'N', 'MEAN_X', 'MEAN_Y', 'MEAN_Z', 'MAX_X', 'MAX_Y', 'MAX_Z'])
+
+@pytest.fixture
+def sensor_file(tmp_path):
+    # two minutes at 50 Hz with a gap of ten seconds
+    rng = np.random.RandomState(0)
+    ts = np.datetime64('2016-01-01T00:00:00.020', 'ms') + np.arange(6000) * np.timedelta64(20, 'ms')
+    ts = ts[(ts < np.datetime64('2016-01-01T00:01:00', 'ms')) | (ts >= np.datetime64('2016-01-01T00:01:10', 'ms'))]
+    df = pd.DataFrame(rng.normal(size=(ts.shape[0], 3)), columns=['X', 'Y', 'Z'])
+    df.insert(0, 'HEADER_TIME_STAMP', ts)
+    path = str(tmp_path / 'ActigraphGT9X-AccelerationCalibrated-NA.TAS1E23150066-AccelerationCalibrated.2016-01-01-00-00-00-000-M0500.sensor.csv')
+    exporter.export_sensor_file_mhealth(df, path, float_format='%.6f')
+    return path
+
+def _assert_same_rows(result, expected):
+    assert list(result.columns) == list(expected.columns)
+    assert result.shape == expected.shape
+    assert (result.iloc[:, :2].values == expected.iloc[:, :2].values).all()
+    np.testing.assert_allclose(result.iloc[:, 2:].values.astype(np.float64), expected.iloc[:, 2:].values.astype(np.float64), rtol=1e-12)
+
+@pytest.mark.parametrize('batch_duration, margin', [(1, 0), (0.3, 0), (7, 2), (60, 0.5)])
+def test_replay_matches_batch(sensor_file, batch_duration, margin):
+    expected = WindowStats(verbose=False).compute_on_file(sensor_file)
+    stream = StreamProcessor(WindowStats(verbose=False), ws=WS, ss=SS, margin=margin, max_sr=50, pid='P1')
+    result = stream.replay(sensor_file, batch_duration=batch_duration)
+    assert expected.shape[0] > 40
+    _assert_same_rows(result, expected)
+
+def test_sensors_are_streamed_separately(sensor_file):
+    expected = WindowStats(verbose=False).compute_on_file(sensor_file)
+    data = pd.read_csv(sensor_file, parse_dates=[0])
+    ts = data.iloc[:, 0].values
+    values = data.iloc[:, 1:].values
+    stream = StreamProcessor(WindowStats(verbose=False), ws=WS, ss=SS, max_sr=50, columns=list(data.columns), pid='P1')
+    results = {'A': [], 'B': []}
+    # batches of two sensors arrive interleaved, one large batch is split by the stream
+    for start in range(0, ts.shape[0], 700):
+        for sid in ['A', 'B']:
+            results[sid].append(stream.push(ts[start:start + 700], values[start:start + 700] * (2 if sid == 'B' else 1), sid=sid))
+    for sid in ['A', 'B']:
+        results[sid].append(stream.flush(sid=sid))
+        result = pd.concat([part for part in results[sid] if not part.empty], ignore_index=True)
+        scaled = expected.copy()
+        if sid == 'B':
+            scaled.iloc[:, 3:] = scaled.iloc[:, 3:] * 2
+        _assert_same_rows(result, scaled)
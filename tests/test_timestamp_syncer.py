@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from padar.api import side_tables
+from padar.scripts.Pipeline import Pipeline
+from padar.scripts.TimestampSyncer import TimestampSyncer
+
+def _sensor_frame(n):
+    ts = np.datetime64('2016-01-01T00:00:00', 'ms') + np.arange(n) * np.timedelta64(12, 'ms')
+    df = pd.DataFrame(np.arange(n * 3, dtype=np.float64).reshape(n, 3), columns=['X', 'Y', 'Z'])
+    df.insert(0, 'HEADER_TIME_STAMP', ts)
+    return df
+
+def _syncer(tmp_path, offset):
+    side_tables.clear()
+    offsets = str(tmp_path / 'offset_mapping.csv')
+    pd.DataFrame({'PID': ['P1'], 'OFFSET': [offset]}).to_csv(offsets, index=False)
+    syncer = TimestampSyncer(verbose=False, offsets=offsets)
+    syncer.set_meta({'pid': 'P1'})
+    return syncer
+
+def _ns(df):
+    return df.iloc[:, 0].values.astype('datetime64[ns]').astype(np.int64)
+
+@pytest.mark.parametrize('offset', [0.0016, -0.0004, 2.5, 0])
+def test_fused_stage_matches_dataframe_run(tmp_path, offset):
+    data = _sensor_frame(100)
+    syncer = _syncer(tmp_path, offset)
+    start = np.datetime64('2016-01-01T00', 'h')
+    expected = syncer._run_on_data(data, start, start + np.timedelta64(1, 'h'))
+    result = Pipeline([syncer], verbose=False).run(data, {'pid': 'P1'}, start, start + np.timedelta64(1, 'h'))
+    assert list(_ns(result)) == list(_ns(expected))
+    assert list(_ns(result) - _ns(data)) == [int(round(offset * 1e9))] * data.shape[0]
+    np.testing.assert_array_equal(result.iloc[:, 1:].values, data.iloc[:, 1:].values)
+    # the input data is not changed
+    assert list(_ns(data)) == list(_ns(_sensor_frame(100)))